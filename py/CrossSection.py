@@ -0,0 +1,150 @@
+#---------------------------------------------------------------------------------------------------
+# Vertical cross-section along a polyline through the profile store.
+#
+# Instead of collecting all profiles within a buffer around the line (DWithin) and sorting them,
+# the cells which are crossed by the line are calculated exactly: per segment the intersections
+# with the vertical and horizontal grid lines are merged, every piece between two intersections
+# lies in one cell. The profiles of the cells are read with one fancy index from the memory-mapped
+# arrays of the profile store. The result is a compact 2D section (cells along the line x z-levels)
+# with the distance along the line.
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import numpy as np
+
+from ProfileStore import ProfileStore,fieldNames
+from VoxelCube import VoxelCube
+
+#---------------------------------------------------------------------------------------------------
+# Returns the cells crossed by the line (a list of (x,y) coordinates) on the grid with the extent
+# and cell size, ordered along the line: the arrays rows, cols and the distance along the line
+# where the line enters and leaves the cell. Cells outside the grid are skipped.
+def calcLineCells(coords,extent,cellSize,nrRows: int,nrCols: int) -> tuple:
+  coords = np.asarray(coords,dtype=np.float64)
+  rowList = []
+  colList = []
+  fromList = []
+  toList = []
+  lineLength = 0.0
+  for i in range(len(coords) - 1):
+    x1,y1 = coords[i]
+    x2,y2 = coords[i + 1]
+    dx = x2 - x1
+    dy = y2 - y1
+    length = np.hypot(dx,dy)
+    if length == 0:
+      continue
+
+    # Parameters (0..1) of the intersections with the grid lines.
+    ts = [np.array([0.0,1.0])]
+    if dx != 0:
+      gx1 = (min(x1,x2) - extent[0]) / cellSize
+      gx2 = (max(x1,x2) - extent[0]) / cellSize
+      gridX = extent[0] + np.arange(np.ceil(gx1),np.floor(gx2) + 1) * cellSize
+      ts.append((gridX - x1) / dx)
+    if dy != 0:
+      gy1 = (extent[3] - max(y1,y2)) / cellSize
+      gy2 = (extent[3] - min(y1,y2)) / cellSize
+      gridY = extent[3] - np.arange(np.ceil(gy1),np.floor(gy2) + 1) * cellSize
+      ts.append((gridY - y1) / dy)
+    ts = np.unique(np.clip(np.concatenate(ts),0.0,1.0))
+
+    # The midpoint of every piece is in the cell of the piece.
+    tMid = (ts[:-1] + ts[1:]) / 2
+    cols = np.floor((x1 + tMid * dx - extent[0]) / cellSize).astype(np.int64)
+    rows = np.floor((extent[3] - (y1 + tMid * dy)) / cellSize).astype(np.int64)
+    rowList.append(rows)
+    colList.append(cols)
+    fromList.append(lineLength + ts[:-1] * length)
+    toList.append(lineLength + ts[1:] * length)
+    lineLength += length
+
+  if len(rowList) == 0:
+    empty = np.zeros(0,dtype=np.int64)
+    return (empty,empty,empty.astype(np.float64),empty.astype(np.float64))
+
+  rows = np.concatenate(rowList)
+  cols = np.concatenate(colList)
+  distFrom = np.concatenate(fromList)
+  distTo = np.concatenate(toList)
+
+  # Skip pieces of zero length and pieces outside the grid.
+  mask = (distTo > distFrom) & (rows >= 0) & (rows < nrRows) & (cols >= 0) & (cols < nrCols)
+  rows = rows[mask]
+  cols = cols[mask]
+  distFrom = distFrom[mask]
+  distTo = distTo[mask]
+
+  # Merge consecutive pieces in the same cell (i.e. at a vertex of the line).
+  if len(rows) > 0:
+    newCell = np.ones(len(rows),dtype=bool)
+    newCell[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+    starts = np.nonzero(newCell)[0]
+    ends = np.append(starts[1:],len(rows)) - 1
+    rows = rows[starts]
+    cols = cols[starts]
+    distTo = distTo[ends]
+    distFrom = distFrom[starts]
+  return (rows,cols,distFrom,distTo)
+
+#---------------------------------------------------------------------------------------------------
+# Returns the cross-section of the store along the line as a dict with:
+#   distance (n)         : distance along the line of the middle of the line piece in the cell.
+#   from, to (n)         : distance along the line where the line enters and leaves the cell.
+#   x, y (n)             : cell centres.
+#   z (nrZ)              : z values (low to high).
+#   <fieldName> (n,nrZ)  : values per field of chloride.profielen_v2, nan is no data.
+# If dropEmpty, the cells without data are not included.
+def getCrossSection(store: ProfileStore,coords,dropEmpty: bool = True) -> dict:
+  rows,cols,distFrom,distTo = calcLineCells(coords,store.extent,store.cellSize,store.nrRows,store.nrCols)
+  columns = np.asarray(store.index[rows,cols])
+  if dropEmpty:
+    hasData = columns >= 0
+    rows = rows[hasData]
+    cols = cols[hasData]
+    distFrom = distFrom[hasData]
+    distTo = distTo[hasData]
+    columns = columns[hasData]
+
+  xs,ys = store.getXY()
+  section = dict()
+  section["distance"] = (distFrom + distTo) / 2
+  section["from"] = distFrom
+  section["to"] = distTo
+  section["x"] = xs[cols].astype(np.float64)
+  section["y"] = ys[rows].astype(np.float64)
+  section["z"] = np.array(store.zValues)
+
+  # One fancy index per value, cells without data get nan. A voxel without suit_extraction is 0
+  # (as in the profile store).
+  nrZ = len(store.zValues)
+  hasData = columns >= 0
+  valid = np.zeros((len(columns),nrZ),dtype=bool)
+  valid[hasData] = store.data["laag"][columns[hasData]] != store.encodings["laag"].noDataCode
+  for valueName,fieldName in fieldNames.items():
+    values = np.full((len(columns),nrZ),np.nan)
+    values[hasData] = store.encodings[valueName].decode(store.data[valueName][columns[hasData]],VoxelCube.outputNoDataValue)
+    values[~valid] = np.nan
+    section[fieldName] = values
+  return section
+
+#---------------------------------------------------------------------------------------------------
+# Returns the cross-section as a compact json-able dict (lists, None for no data), with the
+# distances and coordinates rounded to decimals.
+def sectionToJson(section: dict,decimals: int = 1) -> dict:
+  result = dict()
+  for key in ["distance","from","to","x","y"]:
+    result[key] = np.round(section[key],decimals).tolist()
+  result["z"] = section["z"].tolist()
+  if "cellSize" in section:
+    result["cellSize"] = section["cellSize"]
+  for fieldName in fieldNames.values():
+    values = section[fieldName]
+    if fieldName == "suit_extraction":
+      values = np.round(values,3)
+    result[fieldName] = [[None if np.isnan(v) else v for v in row] for row in values.tolist()]
+  return result
@@ -0,0 +1,259 @@
+#---------------------------------------------------------------------------------------------------
+# Instrumentation of the conversion scripts: timing spans, counters, memory sampling, progress
+# with ETA and an optional trace file.
+#
+# Usage:
+#   import Instrumentation as IN
+#   IN.start("trace.json")              # or IN.start() without trace file, .csv for a csv trace.
+#   with IN.span("read",file=fileName):
+#     ...
+#   IN.count("bytes",raster.nbytes)
+#   IN.progress("rasters",i+1,nrRasters)
+#   IN.stop()                           # Shows the summary and writes the trace file.
+#
+# As long as start is not called, all functions do nothing (and cost almost nothing). The spans
+# and counters are kept per process, so the work done in worker processes is not included.
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import csv
+import json
+import os
+import sys
+import threading
+import time
+
+# Not available on Windows.
+try:
+  import resource
+except ImportError:
+  resource = None
+
+# Optional, used for the memory on Windows.
+try:
+  import psutil
+except ImportError:
+  psutil = None
+
+#---------------------------------------------------------------------------------------------------
+# Returns the current memory (RSS) of the process in bytes or None.
+def getRss() -> any:
+  if os.path.isfile("/proc/self/statm"):
+    with open("/proc/self/statm") as f:
+      return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+  if psutil is not None:
+    return psutil.Process().memory_info().rss
+  if resource is not None:
+    # Only the peak is available.
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxRss if sys.platform == "darwin" else maxRss * 1024
+  return None
+
+#---------------------------------------------------------------------------------------------------
+def formatSeconds(seconds: float) -> str:
+  seconds = int(round(seconds))
+  return "%d:%02d:%02d" % (seconds // 3600,(seconds // 60) % 60,seconds % 60)
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+class Instrumentation():
+
+  #---------------------------------------------------------------------------------------------------
+  # The memory is sampled every sampleInterval seconds. Progress is shown at most every
+  # progressInterval seconds (and when ready).
+  def __init__(self,traceFileName: str = None,sampleInterval: float = 1.0,progressInterval: float = 10.0):
+    self.traceFileName = traceFileName
+    self.sampleInterval = sampleInterval
+    self.progressInterval = progressInterval
+    self.lock = threading.Lock()
+    self.startTime = time.perf_counter()
+    self.events = []
+    self.spanStats = dict()
+    self.counters = dict()
+    self.memorySamples = []
+    self.peakRss = 0
+    self.progressStart = dict()
+    self.progressShown = dict()
+    self.stopEvent = threading.Event()
+    self.sampler = threading.Thread(target=self.sampleMemory,daemon=True)
+    self.sampler.start()
+
+  #---------------------------------------------------------------------------------------------------
+  def getTime(self) -> float:
+    return time.perf_counter() - self.startTime
+
+  #---------------------------------------------------------------------------------------------------
+  def updatePeakRss(self) -> any:
+    rss = getRss()
+    if rss is not None:
+      with self.lock:
+        self.peakRss = max(self.peakRss,rss)
+    return rss
+
+  #---------------------------------------------------------------------------------------------------
+  def sampleMemory(self):
+    while not self.stopEvent.is_set():
+      rss = self.updatePeakRss()
+      if rss is not None:
+        with self.lock:
+          self.memorySamples.append((round(self.getTime(),3),rss))
+      self.stopEvent.wait(self.sampleInterval)
+
+  #---------------------------------------------------------------------------------------------------
+  def addSpan(self,name: str,start: float,duration: float,attrs: dict):
+    rss = self.updatePeakRss()
+    event = {"name": name,"start": round(start,6),"duration": round(duration,6),
+             "thread": threading.current_thread().name,"rss": rss}
+    if attrs:
+      event["attrs"] = attrs
+    with self.lock:
+      if self.traceFileName is not None:
+        self.events.append(event)
+      stats = self.spanStats.get(name)
+      if stats is None:
+        stats = {"count": 0,"total": 0.0,"max": 0.0}
+        self.spanStats[name] = stats
+      stats["count"] += 1
+      stats["total"] += duration
+      stats["max"] = max(stats["max"],duration)
+
+  #---------------------------------------------------------------------------------------------------
+  def count(self,name: str,value=1):
+    with self.lock:
+      self.counters[name] = self.counters.get(name,0) + value
+
+  #---------------------------------------------------------------------------------------------------
+  # Shows the progress of a task with done of total items ready and the expected time left.
+  def progress(self,name: str,done: int,total: int):
+    now = self.getTime()
+    with self.lock:
+      if name not in self.progressStart:
+        self.progressStart[name] = now
+        self.progressShown[name] = now
+      elif (done < total) and (now - self.progressShown[name] < self.progressInterval):
+        return
+      self.progressShown[name] = now
+      elapsed = now - self.progressStart[name]
+    if done > 0:
+      eta = formatSeconds(elapsed / done * (total - done))
+    else:
+      eta = "?"
+    rss = getRss()
+    rssText = "" if rss is None else ", %.0f MB" % (rss / 1024 / 1024)
+    print("  %s: %s/%s (%.1f%%), elapsed %s, ETA %s%s" % (name,done,total,done / max(total,1) * 100,
+                                                          formatSeconds(elapsed),eta,rssText))
+
+  #---------------------------------------------------------------------------------------------------
+  def getSummary(self) -> dict:
+    with self.lock:
+      summary = dict()
+      summary["wallTime"] = round(self.getTime(),3)
+      summary["peakRssMb"] = round(self.peakRss / 1024 / 1024,1)
+      summary["spans"] = dict([(name,{"count": stats["count"],"total": round(stats["total"],3),
+                                      "max": round(stats["max"],3)})
+                               for name,stats in self.spanStats.items()])
+      summary["counters"] = dict(self.counters)
+    # Throughput of the counters per second of wall time.
+    wallTime = max(summary["wallTime"],1e-9)
+    summary["perSecond"] = dict([(name,round(value / wallTime,1)) for name,value in summary["counters"].items()])
+    return summary
+
+  #---------------------------------------------------------------------------------------------------
+  def showSummary(self):
+    summary = self.getSummary()
+    print("Wall time: %s, peak memory: %s MB" % (formatSeconds(summary["wallTime"]),summary["peakRssMb"]))
+    for name,stats in summary["spans"].items():
+      print("  %-24s %8s x %10.3f s (max %.3f s)" % (name,stats["count"],stats["total"],stats["max"]))
+    for name,value in summary["counters"].items():
+      print("  %-24s %14s (%s/s)" % (name,value,summary["perSecond"][name]))
+
+  #---------------------------------------------------------------------------------------------------
+  # Writes the spans, memory samples and summary to a .json file or the spans to a .csv file.
+  def writeTrace(self):
+    if self.traceFileName is None:
+      return
+    summary = self.getSummary()
+    with self.lock:
+      events = list(self.events)
+      memorySamples = list(self.memorySamples)
+    if self.traceFileName.lower().endswith(".csv"):
+      with open(self.traceFileName,"w",newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name","start","duration","thread","rss","attrs"])
+        for event in events:
+          writer.writerow([event["name"],event["start"],event["duration"],event["thread"],event["rss"],
+                           json.dumps(event.get("attrs",{}))])
+    else:
+      with open(self.traceFileName,"w") as f:
+        json.dump({"summary": summary,"spans": events,"memory": memorySamples},f)
+
+  #---------------------------------------------------------------------------------------------------
+  def stop(self):
+    self.stopEvent.set()
+    self.sampler.join()
+    self.updatePeakRss()
+    self.showSummary()
+    self.writeTrace()
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+# Timing span, used as context manager. Does nothing if the instrumentation is not started.
+class Span():
+
+  #---------------------------------------------------------------------------------------------------
+  def __init__(self,name: str,attrs: dict):
+    self.name = name
+    self.attrs = attrs
+    self.start = None
+
+  #---------------------------------------------------------------------------------------------------
+  def __enter__(self):
+    if instrumentation is not None:
+      self.start = instrumentation.getTime()
+    return self
+
+  #---------------------------------------------------------------------------------------------------
+  def __exit__(self,excType,excValue,tb):
+    if (instrumentation is not None) and (self.start is not None):
+      instrumentation.addSpan(self.name,self.start,instrumentation.getTime() - self.start,self.attrs)
+    return False
+
+# The instrumentation of the process (None if not started).
+instrumentation = None
+
+#---------------------------------------------------------------------------------------------------
+def start(traceFileName: str = None,sampleInterval: float = 1.0,progressInterval: float = 10.0):
+  global instrumentation
+  if instrumentation is not None:
+    instrumentation.stop()
+  instrumentation = Instrumentation(traceFileName,sampleInterval,progressInterval)
+
+#---------------------------------------------------------------------------------------------------
+def stop():
+  global instrumentation
+  if instrumentation is None:
+    return
+  instrumentation.stop()
+  instrumentation = None
+
+#---------------------------------------------------------------------------------------------------
+def isEnabled() -> bool:
+  return instrumentation is not None
+
+#---------------------------------------------------------------------------------------------------
+def span(name: str,**attrs) -> Span:
+  return Span(name,attrs)
+
+#---------------------------------------------------------------------------------------------------
+def count(name: str,value=1):
+  if instrumentation is not None:
+    instrumentation.count(name,value)
+
+#---------------------------------------------------------------------------------------------------
+def progress(name: str,done: int,total: int):
+  if instrumentation is not None:
+    instrumentation.progress(name,done,total)
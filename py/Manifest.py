@@ -0,0 +1,105 @@
+#---------------------------------------------------------------------------------------------------
+# Manifest of a pipeline stage, used for incremental and resumable runs.
+#
+# Per unit of work (key) the manifest keeps the input files (path, size, mtime and optionally a
+# content hash), the output files and the parameters. A unit is up to date when the inputs and
+# parameters are unchanged and the outputs still exist. The manifest is saved after every
+# recorded unit, so a crashed run can be resumed.
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import threading
+
+#---------------------------------------------------------------------------------------------------
+class Manifest():
+
+  version = 1
+
+  #---------------------------------------------------------------------------------------------------
+  # If useHash, the inputs are compared by content hash (sha1) instead of mtime.
+  def __init__(self,fileName: str,useHash: bool = False):
+    self.fileName = fileName
+    self.useHash = useHash
+    self.lock = threading.Lock()
+    self.entries = dict()
+    if os.path.isfile(fileName):
+      with open(fileName) as f:
+        data = json.load(f)
+      if data.get("version") == self.version:
+        self.entries = data["entries"]
+
+  #---------------------------------------------------------------------------------------------------
+  def calcHash(self,fileName: str) -> str:
+    sha1 = hashlib.sha1()
+    with open(fileName,"rb") as f:
+      while True:
+        data = f.read(1024 * 1024)
+        if not data:
+          break
+        sha1.update(data)
+    return sha1.hexdigest()
+
+  #---------------------------------------------------------------------------------------------------
+  def getFileInfo(self,fileName: str) -> dict:
+    info = dict()
+    info["path"] = os.path.abspath(fileName)
+    info["size"] = os.path.getsize(fileName)
+    if self.useHash:
+      info["hash"] = self.calcHash(fileName)
+    else:
+      info["mtime"] = os.path.getmtime(fileName)
+    return info
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns True if the unit is recorded with the same inputs and parameters and all outputs exist.
+  def isUpToDate(self,key: str,inputs: list,outputs: list,params: dict) -> bool:
+    with self.lock:
+      entry = self.entries.get(key)
+    if entry is None:
+      return False
+    if entry["params"] != json.loads(json.dumps(params)):
+      return False
+    if entry["outputs"] != [os.path.abspath(fileName) for fileName in outputs]:
+      return False
+    for fileName in outputs:
+      if not os.path.exists(fileName):
+        return False
+    for fileName in inputs:
+      if not os.path.isfile(fileName):
+        return False
+    return entry["inputs"] == [self.getFileInfo(fileName) for fileName in inputs]
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the extra info of the unit (or None).
+  def getInfo(self,key: str) -> any:
+    with self.lock:
+      entry = self.entries.get(key)
+    if entry is None:
+      return None
+    return entry.get("info")
+
+  #---------------------------------------------------------------------------------------------------
+  # Records the unit as ready and saves the manifest.
+  def record(self,key: str,inputs: list,outputs: list,params: dict,info=None):
+    entry = dict()
+    entry["inputs"] = [self.getFileInfo(fileName) for fileName in inputs]
+    entry["outputs"] = [os.path.abspath(fileName) for fileName in outputs]
+    entry["params"] = json.loads(json.dumps(params))
+    entry["info"] = info
+    with self.lock:
+      self.entries[key] = entry
+      self.save()
+
+  #---------------------------------------------------------------------------------------------------
+  def save(self):
+    tmpFileName = self.fileName + ".tmp"
+    with open(tmpFileName,"w") as f:
+      json.dump({"version": self.version,"entries": self.entries},f,indent=1)
+    os.replace(tmpFileName,self.fileName)
@@ -0,0 +1,375 @@
+#---------------------------------------------------------------------------------------------------
+# Writers for the chloride and suit_extraction points.
+#
+# The points are passed as columns, i.e. a dict with the arrays x,y,z,laag,midden,hoog and
+# suit_extraction (see VoxelCube.getColumns).
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import gzip
+import io
+import sqlite3
+
+import numpy as np
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+try:
+  import pyarrow as pa
+  import pyarrow.parquet as pq
+except ImportError:
+  pa = None
+  pq = None
+
+# Coordinate system of the points.
+SRID = 28992
+
+# Output formats and their file extensions.
+outputFormats = {"csv": ".csv","parquet": ".parquet","gpkg": ".gpkg","pgcopy": ".pgcopy"}
+
+# Value columns of the binary formats (same names as in the table chloride.klassen_v2).
+valueNames = ["z","laag","midden","hoog","suit_extraction"]
+
+#---------------------------------------------------------------------------------------------------
+def createPointWriter(fileName: str,outputFormat: str,compression=None) -> any:
+  if outputFormat == "csv":
+    return CsvPointWriter(fileName,compression)
+  elif outputFormat == "parquet":
+    return ParquetPointWriter(fileName,compression)
+  elif outputFormat == "gpkg":
+    return GpkgPointWriter(fileName)
+  elif outputFormat == "pgcopy":
+    return PgCopyPointWriter(fileName)
+  else:
+    raise Exception("Invalid output format: %s" % outputFormat)
+
+#---------------------------------------------------------------------------------------------------
+# Returns the columns as float64, rounded to the same precision as in the csv.
+def roundColumns(columns: dict) -> dict:
+  decimals = {"x": 0,"y": 0,"z": 2,"laag": 0,"midden": 0,"hoog": 0,"suit_extraction": 3}
+  rounded = dict()
+  for columnName,nrDecimals in decimals.items():
+    rounded[columnName] = np.round(columns[columnName].astype(np.float64),nrDecimals)
+  return rounded
+
+#---------------------------------------------------------------------------------------------------
+class PointWriter():
+
+  #---------------------------------------------------------------------------------------------------
+  def __enter__(self):
+    self.open()
+    return self
+
+  #---------------------------------------------------------------------------------------------------
+  def __exit__(self,excType,excValue,excTraceback):
+    self.close()
+
+  #---------------------------------------------------------------------------------------------------
+  def open(self):
+    pass
+
+  #---------------------------------------------------------------------------------------------------
+  def close(self):
+    pass
+
+  #---------------------------------------------------------------------------------------------------
+  def write(self,columns: dict):
+    pass
+
+#---------------------------------------------------------------------------------------------------
+class CsvPointWriter(PointWriter):
+
+  columnNames = ["x","y","z","laag","midden","hoog","suit_extraction"]
+  header = "x,y,z,chloride_laag,chloride_midden,chloride_hoog,suit_extraction"
+  formats = ["%.0f","%.0f","%.2f","%.0f","%.0f","%.0f","%.3f"]
+
+  # Nr. of rows which are formatted at once.
+  chunkSize = 500000
+
+  #---------------------------------------------------------------------------------------------------
+  # Compression is None, "gzip" or "zstd". If not writeHeader, the file gets no header line (used
+  # for parts which are concatenated later).
+  def __init__(self,fileName: str,compression=None,compressLevel=None,writeHeader=True):
+    self.fileName = fileName
+    self.compression = compression
+    self.compressLevel = compressLevel
+    self.writeHeader = writeHeader
+    self.f = None
+
+  #---------------------------------------------------------------------------------------------------
+  def open(self):
+    if self.compression is None:
+      self.f = open(self.fileName,"w")
+    elif self.compression == "gzip":
+      compressLevel = 6 if self.compressLevel is None else self.compressLevel
+      self.f = gzip.open(self.fileName,"wt",compresslevel=compressLevel)
+    elif self.compression == "zstd":
+      if zstandard is None:
+        raise Exception("Package zstandard is needed for zstd compression.")
+      compressLevel = 3 if self.compressLevel is None else self.compressLevel
+      compressor = zstandard.ZstdCompressor(level=compressLevel)
+      self.f = io.TextIOWrapper(compressor.stream_writer(open(self.fileName,"wb")))
+    else:
+      raise Exception("Invalid compression: %s" % self.compression)
+    if self.writeHeader:
+      self.f.write(self.header + "\n")
+
+  #---------------------------------------------------------------------------------------------------
+  def close(self):
+    if self.f is not None:
+      self.f.close()
+      self.f = None
+
+  #---------------------------------------------------------------------------------------------------
+  # Formats the column. Every distinct value is formatted only once.
+  def formatColumn(self,values: np.ndarray,columnFormat: str) -> list:
+    uniqueValues,indices = np.unique(values,return_inverse=True)
+    texts = np.array([columnFormat % v for v in uniqueValues.tolist()],dtype=object)
+    return texts[indices.reshape(-1)].tolist()
+
+  #---------------------------------------------------------------------------------------------------
+  def write(self,columns: dict):
+    nrRows = len(columns["x"])
+    for start in range(0,nrRows,self.chunkSize):
+      end = min(start + self.chunkSize,nrRows)
+      texts = []
+      for columnName,columnFormat in zip(self.columnNames,self.formats):
+        texts.append(self.formatColumn(columns[columnName][start:end],columnFormat))
+      self.f.write("\n".join(map(",".join,zip(*texts))))
+      self.f.write("\n")
+
+#---------------------------------------------------------------------------------------------------
+# Csv file with one row per cell column. The z values and the values of the column are written as
+# json arrays, ordered from low to high z (like json_agg(... ORDER BY z) in PostgreSQL).
+# The profiles are passed as a dict (see VoxelCube.getProfiles).
+class CsvProfileWriter(CsvPointWriter):
+
+  header = "x,y,z,chloride_laag,chloride_midden,chloride_hoog,suit_extraction"
+  decimals = [2,0,0,0,3]
+  valueNames = ["z","laag","midden","hoog","suit_extraction"]
+
+  #---------------------------------------------------------------------------------------------------
+  def formatJsonNumber(self,value: float,nrDecimals: int) -> str:
+    text = "%.*f" % (nrDecimals,value)
+    if "." in text:
+      text = text.rstrip("0").rstrip(".")
+    if text == "-0":
+      text = "0"
+    return text
+
+  #---------------------------------------------------------------------------------------------------
+  # Formats the values with data as json arrays. Every distinct value is formatted only once.
+  def formatProfiles(self,values: np.ndarray,valid: np.ndarray,nrDecimals: int) -> list:
+    uniqueValues,indices = np.unique(values[valid],return_inverse=True)
+    texts = np.array([self.formatJsonNumber(v,nrDecimals) for v in uniqueValues.tolist()],dtype=object)
+    texts = texts[indices.reshape(-1)].tolist()
+    ends = np.cumsum(np.count_nonzero(valid,axis=1)).tolist()
+    profiles = []
+    start = 0
+    for end in ends:
+      profiles.append('"[' + ", ".join(texts[start:end]) + ']"')
+      start = end
+    return profiles
+
+  #---------------------------------------------------------------------------------------------------
+  def write(self,profiles: dict):
+    if len(profiles["x"]) == 0:
+      return
+    texts = [self.formatColumn(profiles["x"],"%.0f"),self.formatColumn(profiles["y"],"%.0f")]
+    for valueName,nrDecimals in zip(self.valueNames,self.decimals):
+      texts.append(self.formatProfiles(profiles[valueName],profiles["valid"],nrDecimals))
+    self.f.write("\n".join(map(",".join,zip(*texts))))
+    self.f.write("\n")
+
+#---------------------------------------------------------------------------------------------------
+# Columnar Parquet file. Needs the package pyarrow.
+class ParquetPointWriter(PointWriter):
+
+  #---------------------------------------------------------------------------------------------------
+  # Compression is None (snappy), "gzip" or "zstd".
+  def __init__(self,fileName: str,compression=None):
+    self.fileName = fileName
+    self.compression = "snappy" if compression is None else compression
+    self.writer = None
+
+  #---------------------------------------------------------------------------------------------------
+  def open(self):
+    if pa is None:
+      raise Exception("Package pyarrow is needed for the parquet format.")
+    fields = [pa.field("x",pa.float64()),pa.field("y",pa.float64())]
+    for valueName in valueNames:
+      fields.append(pa.field(valueName,pa.float64()))
+    self.schema = pa.schema(fields,metadata={"srid": str(SRID)})
+    self.writer = pq.ParquetWriter(self.fileName,self.schema,compression=self.compression)
+
+  #---------------------------------------------------------------------------------------------------
+  def close(self):
+    if self.writer is not None:
+      self.writer.close()
+      self.writer = None
+
+  #---------------------------------------------------------------------------------------------------
+  def write(self,columns: dict):
+    if len(columns["x"]) == 0:
+      return
+    columns = roundColumns(columns)
+    arrays = [pa.array(columns[name]) for name in self.schema.names]
+    self.writer.write_table(pa.Table.from_arrays(arrays,schema=self.schema))
+
+#---------------------------------------------------------------------------------------------------
+# GeoPackage with a point layer. The GeoPackage is written directly with sqlite3, so the point
+# geometries can be encoded for all points at once.
+class GpkgPointWriter(PointWriter):
+
+  layerName = "point_data"
+
+  # GeoPackage geometry: header ("GP", version 0, flags little-endian/no envelope, srs_id)
+  # followed by a little-endian WKB point.
+  geometryType = np.dtype([("magic","S2"),("version","u1"),("flags","u1"),("srsId","<i4"),
+                           ("byteOrder","u1"),("wkbType","<u4"),("x","<f8"),("y","<f8")])
+
+  #---------------------------------------------------------------------------------------------------
+  def __init__(self,fileName: str):
+    self.fileName = fileName
+    self.db = None
+    self.extent = None
+
+  #---------------------------------------------------------------------------------------------------
+  def getSrsDefinition(self,epsg: int) -> str:
+    import osgeo.osr as osr
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    return srs.ExportToWkt()
+
+  #---------------------------------------------------------------------------------------------------
+  def open(self):
+    self.db = sqlite3.connect(self.fileName)
+    self.db.execute("PRAGMA application_id = 1196444487")
+    self.db.execute("PRAGMA user_version = 10200")
+    self.db.execute("""CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT NOT NULL,srs_id INTEGER PRIMARY KEY,
+                       organization TEXT NOT NULL,organization_coordsys_id INTEGER NOT NULL,
+                       definition TEXT NOT NULL,description TEXT)""")
+    self.db.execute("""CREATE TABLE gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY,data_type TEXT NOT NULL,
+                       identifier TEXT UNIQUE,description TEXT DEFAULT '',
+                       last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+                       min_x DOUBLE,min_y DOUBLE,max_x DOUBLE,max_y DOUBLE,srs_id INTEGER,
+                       CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id))""")
+    self.db.execute("""CREATE TABLE gpkg_geometry_columns (table_name TEXT NOT NULL,column_name TEXT NOT NULL,
+                       geometry_type_name TEXT NOT NULL,srs_id INTEGER NOT NULL,z TINYINT NOT NULL,m TINYINT NOT NULL,
+                       CONSTRAINT pk_geom_cols PRIMARY KEY (table_name,column_name),
+                       CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name),
+                       CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id))""")
+    srsRows = [("Undefined cartesian SRS",-1,"NONE",-1,"undefined"),
+               ("Undefined geographic SRS",0,"NONE",0,"undefined"),
+               ("WGS 84 geodetic",4326,"EPSG",4326,self.getSrsDefinition(4326)),
+               ("Amersfoort / RD New",SRID,"EPSG",SRID,self.getSrsDefinition(SRID))]
+    self.db.executemany("INSERT INTO gpkg_spatial_ref_sys (srs_name,srs_id,organization,organization_coordsys_id,definition) "
+                        "VALUES (?,?,?,?,?)",srsRows)
+    fields = ",".join(["%s DOUBLE" % valueName for valueName in valueNames])
+    self.db.execute("CREATE TABLE %s (fid INTEGER PRIMARY KEY AUTOINCREMENT,geom POINT,%s)" % (self.layerName,fields))
+    self.db.execute("INSERT INTO gpkg_contents (table_name,data_type,identifier,srs_id) VALUES (?,'features',?,?)",
+                    (self.layerName,self.layerName,SRID))
+    self.db.execute("INSERT INTO gpkg_geometry_columns VALUES (?,'geom','POINT',?,0,0)",(self.layerName,SRID))
+
+  #---------------------------------------------------------------------------------------------------
+  def close(self):
+    if self.db is not None:
+      if self.extent is not None:
+        self.db.execute("UPDATE gpkg_contents SET min_x=?,min_y=?,max_x=?,max_y=? WHERE table_name=?",
+                        tuple(self.extent) + (self.layerName,))
+      self.db.commit()
+      self.db.close()
+      self.db = None
+
+  #---------------------------------------------------------------------------------------------------
+  def write(self,columns: dict):
+    nrRows = len(columns["x"])
+    if nrRows == 0:
+      return
+    columns = roundColumns(columns)
+
+    # Encode the geometries.
+    geometries = np.zeros(nrRows,dtype=self.geometryType)
+    geometries["magic"] = b"GP"
+    geometries["flags"] = 1
+    geometries["srsId"] = SRID
+    geometries["byteOrder"] = 1
+    geometries["wkbType"] = 1
+    geometries["x"] = columns["x"]
+    geometries["y"] = columns["y"]
+    blobs = geometries.view(np.dtype((np.void,self.geometryType.itemsize))).tolist()
+
+    values = [columns[valueName].tolist() for valueName in valueNames]
+    sql = "INSERT INTO %s (geom,%s) VALUES (?,%s)" % (self.layerName,",".join(valueNames),",".join(["?"] * len(valueNames)))
+    self.db.executemany(sql,zip(blobs,*values))
+
+    # Update extent.
+    extent = [columns["x"].min(),columns["y"].min(),columns["x"].max(),columns["y"].max()]
+    if self.extent is None:
+      self.extent = extent
+    else:
+      self.extent = [min(self.extent[0],extent[0]),min(self.extent[1],extent[1]),
+                     max(self.extent[2],extent[2]),max(self.extent[3],extent[3])]
+
+#---------------------------------------------------------------------------------------------------
+# PostgreSQL binary COPY file with the columns wkb_geometry,z,laag,midden,hoog,suit_extraction.
+# The geometries are EWKB multipoints (as created by ogr2ogr -nlt PROMOTE_TO_MULTI). Load with:
+#   COPY chloride.klassen_v2 (wkb_geometry,z,laag,midden,hoog,suit_extraction)
+#     FROM '/path/point_data.pgcopy' WITH (FORMAT binary);
+class PgCopyPointWriter(PointWriter):
+
+  signature = b"PGCOPY\n\xff\r\n\x00"
+
+  # Tuple: nr. of fields, EWKB multipoint (SRID, 1 point) and the values (big-endian float8).
+  tupleType = np.dtype([("nrFields",">i2"),("geomLength",">i4"),
+                        ("byteOrder","u1"),("wkbType","<u4"),("srid","<u4"),("nrPoints","<u4"),
+                        ("pointByteOrder","u1"),("pointWkbType","<u4"),("x","<f8"),("y","<f8")] +
+                       [field for valueName in valueNames
+                              for field in (("%sLength" % valueName,">i4"),(valueName,">f8"))])
+
+  #---------------------------------------------------------------------------------------------------
+  def __init__(self,fileName: str):
+    self.fileName = fileName
+    self.f = None
+
+  #---------------------------------------------------------------------------------------------------
+  def open(self):
+    self.f = open(self.fileName,"wb")
+    self.f.write(self.signature)
+    self.f.write(np.array([0,0],dtype=">i4").tobytes())
+
+  #---------------------------------------------------------------------------------------------------
+  def close(self):
+    if self.f is not None:
+      self.f.write(np.array([-1],dtype=">i2").tobytes())
+      self.f.close()
+      self.f = None
+
+  #---------------------------------------------------------------------------------------------------
+  def write(self,columns: dict):
+    nrRows = len(columns["x"])
+    if nrRows == 0:
+      return
+    columns = roundColumns(columns)
+    tuples = np.zeros(nrRows,dtype=self.tupleType)
+    tuples["nrFields"] = 1 + len(valueNames)
+    tuples["geomLength"] = 34
+    tuples["byteOrder"] = 1
+    tuples["wkbType"] = 0x20000004
+    tuples["srid"] = SRID
+    tuples["nrPoints"] = 1
+    tuples["pointByteOrder"] = 1
+    tuples["pointWkbType"] = 1
+    tuples["x"] = columns["x"]
+    tuples["y"] = columns["y"]
+    for valueName in valueNames:
+      tuples["%sLength" % valueName] = 8
+      tuples[valueName] = columns[valueName]
+    self.f.write(tuples.tobytes())
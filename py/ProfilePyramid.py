@@ -0,0 +1,92 @@
+#---------------------------------------------------------------------------------------------------
+# Multi-resolution pyramid of profile stores for long line profiles and zoomed-out views.
+#
+# Next to the base store (50m x 0.5m) coarser levels are written (default 100m x 1m, 200m x 2m
+# and 400m x 2m), aggregated from the base cube (see VoxelCube.aggregate): the maximum (or most
+# frequent) chloride class and the mean suit_extraction. The levels are profile stores in the
+# subdirectories level_<cellSize>m of the base store, pyramid.json lists the levels.
+#
+# A query picks the coarsest level which still has at least one cell per pixel of the chart, so a
+# profile across Zeeland stays small.
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import json
+import os
+
+import numpy as np
+
+from CrossSection import getCrossSection
+from ProfileStore import ProfileStore,writeProfileStore
+from VoxelCube import VoxelCube
+
+# Levels (factor,zFactor) relative to the base level.
+defaultLevels = [(2,2),(4,4),(8,4)]
+
+#---------------------------------------------------------------------------------------------------
+# Writes the levels of the pyramid to the base store directory (which is written by
+# writeProfileStore). The chloride method is "max" or "mode".
+def writeProfilePyramid(dirName: str,cube: VoxelCube,levels: list = defaultLevels,chlorideMethod: str = "max"):
+  if not os.path.isdir(dirName):
+    os.makedirs(dirName)
+  zDelta = float(np.abs(np.diff(cube.zValues)).min()) if len(cube.zValues) > 1 else 0.0
+  infos = [{"dirName": ".","cellSize": float(cube.cellSize),"zDelta": zDelta}]
+  for factor,zFactor in levels:
+    levelDirName = "level_%sm" % int(cube.cellSize * factor)
+    print("Writing pyramid level: %s" % levelDirName)
+    levelCube = cube.aggregate(factor,zFactor,chlorideMethod)
+    writeProfileStore(os.path.join(dirName,levelDirName),levelCube)
+    infos.append({"dirName": levelDirName,"cellSize": float(levelCube.cellSize),"zDelta": zDelta * zFactor})
+    del levelCube
+  with open(os.path.join(dirName,"pyramid.json"),"w") as f:
+    json.dump({"chlorideMethod": chlorideMethod,"levels": infos},f,indent=2)
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+class ProfilePyramid():
+
+  #---------------------------------------------------------------------------------------------------
+  # The levels are ordered from fine to coarse. A store without pyramid.json has only the base level.
+  def __init__(self,dirName: str):
+    self.dirName = dirName
+    fileName = os.path.join(dirName,"pyramid.json")
+    if os.path.isfile(fileName):
+      with open(fileName) as f:
+        levels = json.load(f)["levels"]
+    else:
+      levels = [{"dirName": "."}]
+    stores = [ProfileStore(os.path.normpath(os.path.join(dirName,level["dirName"]))) for level in levels]
+    self.stores = sorted(stores,key=lambda store: store.cellSize)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the length of the line (a list of (x,y) coordinates).
+  @staticmethod
+  def calcLineLength(coords) -> float:
+    coords = np.asarray(coords,dtype=np.float64)
+    if len(coords) < 2:
+      return 0.0
+    return float(np.hypot(np.diff(coords[:,0]),np.diff(coords[:,1])).sum())
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the store of the coarsest level with a cell size of at most the length of the line
+  # per pixel, i.e. with at least one cell per pixel of a chart of pixelWidth pixels.
+  def selectStore(self,lineLength: float,pixelWidth: int) -> ProfileStore:
+    metersPerPixel = lineLength / max(pixelWidth,1)
+    selected = self.stores[0]
+    for store in self.stores[1:]:
+      if store.cellSize <= metersPerPixel:
+        selected = store
+    return selected
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the cross-section along the line (see CrossSection.getCrossSection) from the level
+  # selected for a chart of pixelWidth pixels. The cell size of the level is added as cellSize.
+  def getCrossSection(self,coords,pixelWidth: int,dropEmpty: bool = True) -> dict:
+    store = self.selectStore(self.calcLineLength(coords),pixelWidth)
+    section = getCrossSection(store,coords,dropEmpty)
+    section["cellSize"] = store.cellSize
+    return section
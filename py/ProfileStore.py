@@ -0,0 +1,212 @@
+#---------------------------------------------------------------------------------------------------
+# Compact, memory-mapped store with the chloride and suit_extraction profiles per cell column.
+#
+# The store is a directory with:
+#   profiles.json   : header (extent, cell size, z values, nr. of columns, encodings).
+#   index.bin       : int32 (nrRows,nrCols) grid with the column number of every cell or -1.
+#   <valueName>.bin : (nrColumns,nrZ) arrays with the codes of the values (see VoxelEncoding.py),
+#                     uint8 for chloride and uint16 for suit_extraction. The lookup table of the
+#                     chloride codes and the scale of the suit_extraction codes are in the header.
+#
+# Because the data is on a regular grid the index is a plain grid, so a query only needs some
+# index arithmetic and reads only the profiles it returns.
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import json
+import os
+
+import numpy as np
+
+from VoxelCube import VoxelCube
+from VoxelEncoding import ChlorideEncoding,SuitEncoding
+
+# Value names and data types (codes) in the store.
+valueTypes = {"laag": ChlorideEncoding.codeType,"midden": ChlorideEncoding.codeType,
+              "hoog": ChlorideEncoding.codeType,"suit_extraction": SuitEncoding.codeType}
+
+# Field names in the query result (same as in chloride.profielen_v2).
+fieldNames = {"laag": "chloride_laag","midden": "chloride_midden","hoog": "chloride_hoog",
+              "suit_extraction": "suit_extraction"}
+
+#---------------------------------------------------------------------------------------------------
+# Writes the profiles of the cube to the store directory.
+def writeProfileStore(dirName: str,cube: VoxelCube,nrRowsPerChunk: int = 100):
+  if not os.path.isdir(dirName):
+    os.makedirs(dirName)
+
+  # Create the index, columns are numbered row by row.
+  hasData = cube.valid.any(axis=0)
+  index = np.full((cube.nrRows,cube.nrCols),-1,dtype=np.int32)
+  nrColumns = int(np.count_nonzero(hasData))
+  index[hasData] = np.arange(nrColumns,dtype=np.int32)
+  index.tofile(os.path.join(dirName,"index.bin"))
+
+  # Write the profiles.
+  nrZ = len(cube.zValues)
+  for valueName,valueType in valueTypes.items():
+    fileName = os.path.join(dirName,"%s.bin" % valueName)
+    with open(fileName,"wb") as f:
+      for row1 in range(0,cube.nrRows,nrRowsPerChunk):
+        row2 = min(row1 + nrRowsPerChunk,cube.nrRows)
+        rows,cols = np.nonzero(hasData[row1:row2])
+        rows += row1
+        codes = cube.data[valueName][:,rows,cols].T
+        valid = cube.valid[:,rows,cols].T
+        profiles = np.where(valid,codes,cube.encodings[valueName].noDataCode).astype(valueType)
+        f.write(profiles.reshape(-1,nrZ).tobytes())
+
+  # Write the header.
+  header = dict()
+  header["extent"] = [float(v) for v in cube.extent]
+  header["cellSize"] = float(cube.cellSize)
+  header["nrCols"] = cube.nrCols
+  header["nrRows"] = cube.nrRows
+  header["zValues"] = [float(v) for v in cube.zValues]
+  header["nrColumns"] = nrColumns
+  header["chlorideEncoding"] = cube.encodings["midden"].toDict()
+  header["suitEncoding"] = cube.encodings["suit_extraction"].toDict()
+  with open(os.path.join(dirName,"profiles.json"),"w") as f:
+    json.dump(header,f,indent=2)
+
+#---------------------------------------------------------------------------------------------------
+class ProfileStore():
+
+  #---------------------------------------------------------------------------------------------------
+  def __init__(self,dirName: str):
+    with open(os.path.join(dirName,"profiles.json")) as f:
+      header = json.load(f)
+    self.dirName = dirName
+    self.extent = header["extent"]
+    self.cellSize = header["cellSize"]
+    self.nrCols = header["nrCols"]
+    self.nrRows = header["nrRows"]
+    self.zValues = np.array(header["zValues"])
+    self.nrColumns = header["nrColumns"]
+    chlorideEncoding = ChlorideEncoding.fromDict(header["chlorideEncoding"])
+    self.encodings = {"laag": chlorideEncoding,"midden": chlorideEncoding,"hoog": chlorideEncoding,
+                      "suit_extraction": SuitEncoding.fromDict(header["suitEncoding"])}
+    self.index = np.memmap(os.path.join(dirName,"index.bin"),dtype=np.int32,mode="r",
+                           shape=(self.nrRows,self.nrCols))
+    self.data = dict()
+    for valueName,valueType in valueTypes.items():
+      if self.nrColumns == 0:
+        self.data[valueName] = np.zeros((0,len(self.zValues)),dtype=valueType)
+        continue
+      self.data[valueName] = np.memmap(os.path.join(dirName,"%s.bin" % valueName),dtype=valueType,
+                                       mode="r",shape=(self.nrColumns,len(self.zValues)))
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the x and y (cell centre) coordinates of the columns and rows.
+  def getXY(self) -> tuple:
+    hCellSize = int(self.cellSize / 2)
+    xs = int(self.extent[0]) + hCellSize + np.arange(self.nrCols) * self.cellSize
+    ys = int(self.extent[3]) - hCellSize - np.arange(self.nrRows) * self.cellSize
+    return (xs,ys)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the rows, cols and cell centres of the cells within the extent [minx,miny,maxx,maxy].
+  def getCells(self,extent) -> tuple:
+    col1 = max(int(np.floor((extent[0] - self.extent[0]) / self.cellSize)),0)
+    col2 = min(int(np.floor((extent[2] - self.extent[0]) / self.cellSize)) + 1,self.nrCols)
+    row1 = max(int(np.floor((self.extent[3] - extent[3]) / self.cellSize)),0)
+    row2 = min(int(np.floor((self.extent[3] - extent[1]) / self.cellSize)) + 1,self.nrRows)
+    if (col1 >= col2) or (row1 >= row2):
+      empty = np.zeros(0,dtype=np.int64)
+      return (empty,empty,empty.astype(np.float64),empty.astype(np.float64))
+    xs,ys = self.getXY()
+    rows,cols = np.meshgrid(np.arange(row1,row2),np.arange(col1,col2),indexing="ij")
+    rows = rows.reshape(-1)
+    cols = cols.reshape(-1)
+    return (rows,cols,xs[cols].astype(np.float64),ys[rows].astype(np.float64))
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the profiles of the cells as a list of features (dicts with x, y and the fields of
+  # chloride.profielen_v2 as lists).
+  def getFeatures(self,rows: np.ndarray,cols: np.ndarray) -> list:
+    columns = self.index[rows,cols]
+    hasData = columns >= 0
+    rows = rows[hasData]
+    cols = cols[hasData]
+    columns = columns[hasData]
+    features = []
+    if len(columns) == 0:
+      return features
+    xs,ys = self.getXY()
+    valid = self.data["laag"][columns] != self.encodings["laag"].noDataCode
+    values = dict()
+    for valueName in valueTypes:
+      values[valueName] = self.encodings[valueName].decode(self.data[valueName][columns],VoxelCube.outputNoDataValue)
+    for i in range(len(columns)):
+      mask = valid[i]
+      feature = dict()
+      feature["x"] = float(xs[cols[i]])
+      feature["y"] = float(ys[rows[i]])
+      feature["z"] = self.zValues[mask].tolist()
+      for valueName,fieldName in fieldNames.items():
+        if valueName == "suit_extraction":
+          feature[fieldName] = np.round(values[valueName][i][mask].astype(np.float64),3).tolist()
+        else:
+          feature[fieldName] = values[valueName][i][mask].astype(np.int64).tolist()
+      features.append(feature)
+    return features
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the profiles with a cell centre within radius of the point (x,y).
+  def queryPoint(self,x: float,y: float,radius: float) -> list:
+    rows,cols,xs,ys = self.getCells([x - radius,y - radius,x + radius,y + radius])
+    mask = (xs - x) ** 2 + (ys - y) ** 2 <= radius ** 2
+    return self.getFeatures(rows[mask],cols[mask])
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the profiles with a cell centre within distance of the line, ordered along the line.
+  # The line is a list of (x,y) coordinates. A line within one cell (i.e. a single point or a line
+  # of zero length) without cell centres within distance returns the profile of that cell, as
+  # queryPoint would for the cell which contains the point.
+  def queryLine(self,coords: list,distance: float) -> list:
+    coords = np.asarray(coords,dtype=np.float64).reshape(-1,2)
+    if len(coords) == 0:
+      return []
+    if len(coords) == 1:
+      # A single point is a line of zero length.
+      coords = np.concatenate([coords,coords])
+    extent = [coords[:,0].min() - distance,coords[:,1].min() - distance,
+              coords[:,0].max() + distance,coords[:,1].max() + distance]
+    rows,cols,xs,ys = self.getCells(extent)
+
+    # Calculate the distance to the line and the position along the line per cell.
+    minDistance = np.full(len(rows),np.inf)
+    position = np.zeros(len(rows))
+    lineLength = 0.0
+    for i in range(len(coords) - 1):
+      x1,y1 = coords[i]
+      x2,y2 = coords[i + 1]
+      dx = x2 - x1
+      dy = y2 - y1
+      length2 = dx * dx + dy * dy
+      if length2 > 0:
+        t = np.clip(((xs - x1) * dx + (ys - y1) * dy) / length2,0.0,1.0)
+      else:
+        t = np.zeros(len(rows))
+      d = np.hypot(xs - (x1 + t * dx),ys - (y1 + t * dy))
+      closer = d < minDistance
+      minDistance[closer] = d[closer]
+      position[closer] = lineLength + t[closer] * np.sqrt(length2)
+      lineLength += np.sqrt(length2)
+
+    mask = minDistance <= distance
+    if not mask.any():
+      cells = set()
+      for x,y in coords:
+        cellRows,cellCols,_,_ = self.getCells([x,y,x,y])
+        cells.update(zip(cellRows.tolist(),cellCols.tolist()))
+      if len(cells) == 1:
+        row,col = cells.pop()
+        return self.getFeatures(np.array([row]),np.array([col]))
+      return []
+    order = np.argsort(position[mask],kind="stable")
+    return self.getFeatures(rows[mask][order],cols[mask][order])
@@ -0,0 +1,177 @@
+#---------------------------------------------------------------------------------------------------
+# Catalog of the chloride and suit_extraction rasters in a directory.
+#
+# The directory is scanned once. The filenames are parsed into (family,scenario,z) keys and the
+# header of every raster (extent, cell size, data type, nodata) is cached in a sidecar index
+# (raster_catalog.json). Only new or changed files (size or mtime) are opened on a next scan.
+#
+# Filename conventions:
+#   chloride_<laag|midden|hoog>_<z in cm>.asc          -> ("chloride",<type>,z)
+#   ASC_Suitability_extraction_<boven|onder>_<n>cm.tif -> ("suit_extraction","",+/-n/100)
+#   suit_extracttion_<z in cm>.tif                     -> ("suit_extraction","",z)
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import json
+import os
+import re
+
+import numpy as np
+
+import RasterUtils as RU
+
+# Patterns in order of preference (if a directory has more files with the same key).
+filePatterns = [
+  ("chloride",re.compile(r"^chloride_(laag|midden|hoog)_(-?\d+)\.asc$",re.IGNORECASE)),
+  ("suit_extraction",re.compile(r"^ASC_Suitability_extraction_(boven|onder)_(\d+)cm\.(tif|asc)$",re.IGNORECASE)),
+  ("suit_extraction",re.compile(r"^suit_extracttion_(-?\d+)\.tif$",re.IGNORECASE)),
+]
+
+indexFileName = "raster_catalog.json"
+
+#---------------------------------------------------------------------------------------------------
+# Returns the (family,scenario,z in cm,priority) of the filename or None. The z value is kept in
+# whole cm to avoid float rounding in the keys.
+def parseFileName(fileName: str) -> any:
+  baseName = os.path.basename(fileName)
+  for priority,(family,pattern) in enumerate(filePatterns):
+    match = pattern.match(baseName)
+    if match is None:
+      continue
+    if family == "chloride":
+      return (family,match.group(1).lower(),int(match.group(2)),priority)
+    if match.group(1).lower() in ["boven","onder"]:
+      zCm = int(match.group(2))
+      if match.group(1).lower() == "onder":
+        zCm = -zCm
+      return (family,"",zCm,priority)
+    return (family,"",int(match.group(1)),priority)
+  return None
+
+#---------------------------------------------------------------------------------------------------
+def zToCm(zValue) -> int:
+  return int(round(zValue * 100))
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+class RasterCatalog():
+
+  version = 1
+
+  #---------------------------------------------------------------------------------------------------
+  # If indexFile is None, the index is stored in the directory. The directory is scanned directly.
+  def __init__(self,dirName: str,indexFile: str = None):
+    self.dirName = dirName
+    self.indexFile = indexFile
+    if self.indexFile is None:
+      self.indexFile = os.path.join(dirName,indexFileName)
+    self.entries = dict()
+    self.scan()
+
+  #---------------------------------------------------------------------------------------------------
+  def loadIndex(self) -> dict:
+    if not os.path.isfile(self.indexFile):
+      return dict()
+    try:
+      with open(self.indexFile) as f:
+        data = json.load(f)
+    except (OSError,ValueError):
+      return dict()
+    if data.get("version") != self.version:
+      return dict()
+    return data["files"]
+
+  #---------------------------------------------------------------------------------------------------
+  def saveIndex(self):
+    data = {"version": self.version,"files": self.entries}
+    tmpFileName = self.indexFile + ".tmp"
+    try:
+      with open(tmpFileName,"w") as f:
+        json.dump(data,f,indent=1)
+      os.replace(tmpFileName,self.indexFile)
+    except OSError as ex:
+      print("Raster catalog not saved: %s" % ex)
+
+  #---------------------------------------------------------------------------------------------------
+  # Scans the directory, reads the header of new and changed rasters and saves the index.
+  def scan(self):
+    cached = self.loadIndex()
+    self.entries = dict()
+    changed = False
+    if os.path.isdir(self.dirName):
+      for dirEntry in os.scandir(self.dirName):
+        if not dirEntry.is_file():
+          continue
+        key = parseFileName(dirEntry.name)
+        if key is None:
+          continue
+        stat = dirEntry.stat()
+        entry = cached.get(dirEntry.name)
+        if (entry is None) or (entry["size"] != stat.st_size) or (entry["mtime"] != stat.st_mtime):
+          info = RU.readRasterInfo(dirEntry.path)
+          if info is None:
+            continue
+          entry = dict()
+          entry["size"] = stat.st_size
+          entry["mtime"] = stat.st_mtime
+          entry["cellSize"] = info.cellSize
+          entry["nrCols"] = info.nrCols
+          entry["nrRows"] = info.nrRows
+          entry["extent"] = list(info.extent)
+          entry["dataType"] = np.dtype(info.dataType).name
+          entry["noDataValue"] = info.noDataValue
+          changed = True
+        entry["family"],entry["scenario"],entry["zCm"],entry["priority"] = key
+        self.entries[dirEntry.name] = entry
+    if changed or (set(cached.keys()) != set(self.entries.keys())):
+      self.saveIndex()
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the full filename of the raster (or None).
+  def find(self,family: str,scenario: str,zValue) -> any:
+    zCm = zToCm(zValue)
+    found = None
+    for baseName,entry in self.entries.items():
+      if (entry["family"] == family) and (entry["scenario"] == scenario) and (entry["zCm"] == zCm):
+        if (found is None) or (entry["priority"] < self.entries[found]["priority"]):
+          found = baseName
+    if found is None:
+      return None
+    return os.path.join(self.dirName,found)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the sorted z values of the family (and scenario).
+  def getZValues(self,family: str,scenario: str = None) -> list:
+    zCms = set([entry["zCm"] for entry in self.entries.values()
+                if (entry["family"] == family) and ((scenario is None) or (entry["scenario"] == scenario))])
+    return [zCm / 100 for zCm in sorted(zCms)]
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the header (a raster without data) of the raster in the catalog or None.
+  def getInfo(self,fileName: str) -> any:
+    entry = self.entries.get(os.path.basename(fileName))
+    if entry is None:
+      return None
+    return RU.Raster(None,entry["cellSize"],entry["nrCols"],entry["nrRows"],list(entry["extent"]),
+                     np.dtype(entry["dataType"]).type,entry["noDataValue"])
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the filenames of the rasters of the family which are not on the grid with the cell
+  # size (default the cell size of the first raster), i.e. a different cell size or an origin
+  # which is not a multiple of the cell size.
+  def checkAlignment(self,family: str,cellSize=None) -> list:
+    misaligned = []
+    for baseName in sorted(self.entries.keys()):
+      entry = self.entries[baseName]
+      if entry["family"] != family:
+        continue
+      if cellSize is None:
+        cellSize = entry["cellSize"]
+      extent = entry["extent"]
+      if (entry["cellSize"] != cellSize) or not np.allclose(RU.alignExtent(extent,cellSize),extent):
+        misaligned.append(os.path.join(self.dirName,baseName))
+    return misaligned
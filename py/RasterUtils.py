@@ -7,10 +7,15 @@
 # Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
 #---------------------------------------------------------------------------------------------------
 
+import os
+
 import numpy as np
 from typing import Union
 
 import osgeo.gdal as gd
+import osgeo.osr as osr
+
+import Instrumentation as IN
 
 #-------------------------------------------------------------------------------
 def strAfter(s,after):
@@ -32,6 +37,30 @@ class Raster():
     self.dataType = dataType
     self.noDataValue = noDataValue
 
+#---------------------------------------------------------------------------------------------------
+# Raster which reads the data on first access of raster.
+class LazyRaster(Raster):
+  #---------------------------------------------------------------------------------------------------
+  def __init__(self,fileName,cellSize,nrCols,nrRows,extent,dataType,noDataValue):
+    self.fileName = fileName
+    self._raster = None
+    Raster.__init__(self,None,cellSize,nrCols,nrRows,extent,dataType,noDataValue)
+
+  #---------------------------------------------------------------------------------------------------
+  @property
+  def raster(self):
+    if self._raster is None:
+      raster = readRasterWindow(self.fileName,0,0,self.nrCols,self.nrRows)
+      if raster is None:
+        raise Exception("Raster not readable: %s" % self.fileName)
+      self._raster = raster.raster
+    return self._raster
+
+  #---------------------------------------------------------------------------------------------------
+  @raster.setter
+  def raster(self,value):
+    self._raster = value
+
 #-------------------------------------------------------------------------------
 # Align the extent with lower-left as origin (i.e. a multiple of cellsize).
 def alignExtent(extent,cellSize):
@@ -97,6 +126,26 @@ def dataTypeGdalToNumpy(dataType):
   else:
     raise Exception("Invalid GDAL type.")
 
+#-------------------------------------------------------------------------------
+def dataTypeNumpyToGdal(dataType):
+  dataType = np.dtype(dataType)
+  if dataType==np.uint8:
+    return gd.GDT_Byte
+  elif dataType==np.int16:
+    return gd.GDT_Int16
+  elif dataType==np.int32:
+    return gd.GDT_Int32
+  elif dataType==np.uint16:
+    return gd.GDT_UInt16
+  elif dataType==np.uint32:
+    return gd.GDT_UInt32
+  elif dataType==np.float32:
+    return gd.GDT_Float32
+  elif dataType==np.float64:
+    return gd.GDT_Float64
+  else:
+    raise Exception("Invalid numpy type: %s" % dataType)
+
 #-------------------------------------------------------------------------------
 def dataTypeGdalToString(dataType):
   if dataType==gd.GDT_Byte:
@@ -125,7 +174,14 @@ def dataTypeGdalToString(dataType):
     return "unknown"
 
 #---------------------------------------------------------------------------------------------------
-def readRaster(fileName: str) -> Union[Raster,None]:
+# If lazy, the data is read on first access of raster.raster.
+def readRaster(fileName: str,lazy: bool = False) -> Union[Raster,None]:
+
+  if lazy:
+    info = readRasterInfo(fileName)
+    if info is None:
+      return None
+    return LazyRaster(fileName,info.cellSize,info.nrCols,info.nrRows,info.extent,info.dataType,info.noDataValue)
 
   dataset = gd.Open(fileName,gd.GA_ReadOnly)
   if dataset is None:
@@ -139,7 +195,10 @@ def readRaster(fileName: str) -> Union[Raster,None]:
   extent = calcExtentFromGT(dataset.GetGeoTransform(),nrCols,nrRows)
   dataType = dataTypeGdalToNumpy(band.DataType)
   noDataValue = band.GetNoDataValue()
-  rasterData = band.ReadAsArray()
+  with IN.span("readRaster"):
+    rasterData = band.ReadAsArray()
+  IN.count("readCells",rasterData.size)
+  IN.count("readBytes",rasterData.nbytes)
 
   del band
   gd.Dataset.__swig_destroy__(dataset)
@@ -148,6 +207,345 @@ def readRaster(fileName: str) -> Union[Raster,None]:
   raster = Raster(rasterData,cellSize,nrCols,nrRows,extent,dataType,noDataValue)
   return raster
 
+#---------------------------------------------------------------------------------------------------
+# Reads only the header of the raster, i.e. the returned raster has no data.
+def readRasterInfo(fileName: str) -> Union[Raster,None]:
+
+  dataset = gd.Open(fileName,gd.GA_ReadOnly)
+  if dataset is None:
+    print("Raster not found: %s" % fileName)
+    return None
+
+  band = dataset.GetRasterBand(1)
+  cellSize = dataset.GetGeoTransform()[1]
+  nrCols = dataset.RasterXSize
+  nrRows = dataset.RasterYSize
+  extent = calcExtentFromGT(dataset.GetGeoTransform(),nrCols,nrRows)
+  dataType = dataTypeGdalToNumpy(band.DataType)
+  noDataValue = band.GetNoDataValue()
+
+  del band
+  gd.Dataset.__swig_destroy__(dataset)
+  del dataset
+
+  raster = Raster(None,cellSize,nrCols,nrRows,extent,dataType,noDataValue)
+  return raster
+
+#---------------------------------------------------------------------------------------------------
+# Returns the x and y coordinates (int) of the cell centres of the columns and rows of the grid,
+# i.e. the coordinates of the points in the output.
+def calcCellCentres(extent,cellSize,nrCols: int,nrRows: int) -> tuple:
+  hCellSize = int(cellSize / 2)
+  xs = int(extent[0]) + hCellSize + np.arange(nrCols) * cellSize
+  ys = int(extent[3]) - hCellSize - np.arange(nrRows) * cellSize
+  return (xs,ys)
+
+#---------------------------------------------------------------------------------------------------
+# Returns the cells with data. Nan is always no data (also for a raster with nan as no data
+# value or without a no data value).
+def getDataMask(values: np.ndarray,noDataValue) -> np.ndarray:
+  if noDataValue is None:
+    mask = np.ones(values.shape,dtype=bool)
+  else:
+    mask = values != noDataValue
+  if values.dtype.kind == "f":
+    mask &= ~np.isnan(values)
+  return mask
+
+#---------------------------------------------------------------------------------------------------
+# Returns the x, y (cell centre) and value arrays of all cells with data, in row order.
+def rasterToArrays(raster: Raster) -> tuple:
+  xs,ys = calcCellCentres(raster.extent,raster.cellSize,raster.nrCols,raster.nrRows)
+  rows,cols = np.nonzero(getDataMask(raster.raster,raster.noDataValue))
+  return (xs[cols],ys[rows],raster.raster[rows,cols])
+
+#---------------------------------------------------------------------------------------------------
+# Returns the window (col,row,nrCols,nrRows) of the raster which overlaps with the extent. Cells
+# which partly overlap are included (i.e. for a 50m extent on a 100m raster).
+def calcWindowFromExtent(raster: Raster,extent) -> tuple:
+  precision = 1e-6
+  col1 = max(int(np.floor((extent[0] - raster.extent[0]) / raster.cellSize + precision)),0)
+  row1 = max(int(np.floor((raster.extent[3] - extent[3]) / raster.cellSize + precision)),0)
+  col2 = min(int(np.ceil((extent[2] - raster.extent[0]) / raster.cellSize - precision)),raster.nrCols)
+  row2 = min(int(np.ceil((raster.extent[3] - extent[1]) / raster.cellSize - precision)),raster.nrRows)
+  return (col1,row1,max(col2 - col1,0),max(row2 - row1,0))
+
+#---------------------------------------------------------------------------------------------------
+# Reads the data of the band within the window. The window is clipped to the raster.
+def readBandWindow(dataset,band,col: int,row: int,nrCols: int,nrRows: int) -> Union[Raster,None]:
+  cellSize = dataset.GetGeoTransform()[1]
+  rasterExtent = calcExtentFromGT(dataset.GetGeoTransform(),dataset.RasterXSize,dataset.RasterYSize)
+  col1 = max(col,0)
+  row1 = max(row,0)
+  col2 = min(col + nrCols,dataset.RasterXSize)
+  row2 = min(row + nrRows,dataset.RasterYSize)
+  if (col1 >= col2) or (row1 >= row2):
+    return None
+  with IN.span("readRaster"):
+    rasterData = band.ReadAsArray(col1,row1,col2 - col1,row2 - row1)
+  IN.count("readCells",rasterData.size)
+  IN.count("readBytes",rasterData.nbytes)
+  windowExtent = [rasterExtent[0] + col1 * cellSize,rasterExtent[3] - row2 * cellSize,
+                  rasterExtent[0] + col2 * cellSize,rasterExtent[3] - row1 * cellSize]
+  return Raster(rasterData,cellSize,col2 - col1,row2 - row1,windowExtent,
+                dataTypeGdalToNumpy(band.DataType),band.GetNoDataValue())
+
+#---------------------------------------------------------------------------------------------------
+# Reads only the window (col,row,nrCols,nrRows) of the raster. Returns None if the window does
+# not overlap with the raster.
+def readRasterWindow(fileName: str,col: int,row: int,nrCols: int,nrRows: int) -> Union[Raster,None]:
+
+  dataset = gd.Open(fileName,gd.GA_ReadOnly)
+  if dataset is None:
+    print("Raster not found: %s" % fileName)
+    return None
+
+  band = dataset.GetRasterBand(1)
+  raster = readBandWindow(dataset,band,col,row,nrCols,nrRows)
+
+  del band
+  gd.Dataset.__swig_destroy__(dataset)
+  del dataset
+
+  return raster
+
+#---------------------------------------------------------------------------------------------------
+# Reads only the part of the raster which overlaps with the extent. Returns None if the raster
+# does not overlap.
+def readRasterExtent(fileName: str,extent) -> Union[Raster,None]:
+
+  dataset = gd.Open(fileName,gd.GA_ReadOnly)
+  if dataset is None:
+    print("Raster not found: %s" % fileName)
+    return None
+
+  band = dataset.GetRasterBand(1)
+  nrCols = dataset.RasterXSize
+  nrRows = dataset.RasterYSize
+  info = Raster(None,dataset.GetGeoTransform()[1],nrCols,nrRows,
+                calcExtentFromGT(dataset.GetGeoTransform(),nrCols,nrRows),None,None)
+  col,row,nrCols,nrRows = calcWindowFromExtent(info,extent)
+  raster = readBandWindow(dataset,band,col,row,nrCols,nrRows)
+
+  del band
+  gd.Dataset.__swig_destroy__(dataset)
+  del dataset
+
+  return raster
+
+#---------------------------------------------------------------------------------------------------
+# Iterates over the raster in windows which are aligned with the blocks (tiles) of the raster,
+# i.e. 512x512 for the tiled GeoTIFFs. The windows are a multiple of the block size of at least
+# minSize cells. Yields (col,row,values) per window. The band and dataset are also released when
+# the caller stops early.
+#
+#   for col,row,values in RU.iterRasterBlocks(fileName):
+#     ...
+def iterRasterBlocks(fileName: str,minSize: int = 0):
+
+  dataset = gd.Open(fileName,gd.GA_ReadOnly)
+  if dataset is None:
+    raise Exception("Raster not found: %s" % fileName)
+
+  band = None
+  try:
+    band = dataset.GetRasterBand(1)
+    blockCols,blockRows = band.GetBlockSize()
+    if minSize > 0:
+      blockCols *= max(int(np.ceil(minSize / blockCols)),1)
+      blockRows *= max(int(np.ceil(minSize / blockRows)),1)
+    for row in range(0,dataset.RasterYSize,blockRows):
+      for col in range(0,dataset.RasterXSize,blockCols):
+        nrCols = min(blockCols,dataset.RasterXSize - col)
+        nrRows = min(blockRows,dataset.RasterYSize - row)
+        with IN.span("readRaster"):
+          values = band.ReadAsArray(col,row,nrCols,nrRows)
+        if values is None:
+          raise Exception("Raster not readable: %s" % fileName)
+        IN.count("readCells",values.size)
+        IN.count("readBytes",values.nbytes)
+        yield (col,row,values)
+  finally:
+    del band
+    gd.Dataset.__swig_destroy__(dataset)
+    del dataset
+
+#---------------------------------------------------------------------------------------------------
+# Reads a raster (job is a tuple of rasterName and extent, None is the whole raster). Used by the
+# worker processes of data_to_csv.py and grensvlak.py.
+def readRasterJob(job: tuple) -> Union[Raster,None]:
+  rasterName,extent = job
+  if extent is None:
+    return readRaster(rasterName)
+  else:
+    return readRasterExtent(rasterName,extent)
+
+# Default overview levels of the written rasters.
+defaultOverviewLevels = [2,4,8,16,32,64,128]
+
+#---------------------------------------------------------------------------------------------------
+# Returns the creation options of a tiled GeoTIFF (driver "GTiff") or a Cloud-Optimized GeoTIFF
+# (driver "COG"). Compress is "DEFLATE", "ZSTD", "LZW" or "NONE", predictor None, 2 (horizontal
+# differencing, for integers) or 3 (floating point) and nrThreads the number of compression
+# threads ("ALL_CPUS", a number or None).
+def getCreationOptions(driverName: str = "GTiff",compress: str = "DEFLATE",predictor: int = None,
+                       compressLevel: int = None,nrThreads="ALL_CPUS",blockSize: int = 512) -> list:
+  if driverName == "COG":
+    options = ["BLOCKSIZE=%s" % blockSize,"COMPRESS=%s" % compress]
+    if predictor is not None:
+      options.append("PREDICTOR=%s" % {2: "STANDARD",3: "FLOATING_POINT"}[predictor])
+    if compressLevel is not None:
+      options.append("LEVEL=%s" % compressLevel)
+  else:
+    options = ["TILED=YES","BLOCKXSIZE=%s" % blockSize,"BLOCKYSIZE=%s" % blockSize,"COMPRESS=%s" % compress]
+    if predictor is not None:
+      options.append("PREDICTOR=%s" % predictor)
+    if compressLevel is not None:
+      if compress == "ZSTD":
+        options.append("ZSTD_LEVEL=%s" % compressLevel)
+      else:
+        options.append("ZLEVEL=%s" % compressLevel)
+  if nrThreads is not None:
+    options.append("NUM_THREADS=%s" % nrThreads)
+  options.append("BIGTIFF=IF_SAFER")
+  return options
+
+#---------------------------------------------------------------------------------------------------
+# Writes a single band raster as a tiled GeoTIFF with internal overviews or, if cog, as a
+# Cloud-Optimized GeoTIFF (with overviews, ready for GeoServer and range requests). The data can
+# be written block by block (write) or as rasters (writeRaster). A COG can only be created as a
+# copy, so the blocks are first written to a temporary uncompressed GeoTIFF (<fileName>.tmp.tif),
+# which gets the overviews and is converted when the writer is closed. After an error (abort, or
+# an exception within the with block) the raster is not finished and the files are removed.
+#
+#   with RU.RasterWriter(fileName,extent,cellSize,np.float32,-9999.0) as writer:
+#     writer.write(values,col,row)
+class RasterWriter():
+
+  #---------------------------------------------------------------------------------------------------
+  # See getCreationOptions for compress, predictor, compressLevel, nrThreads and blockSize.
+  # If overviewLevels is None or empty, no overviews are added.
+  def __init__(self,fileName: str,extent,cellSize,dataType=np.float32,noDataValue=None,
+               compress: str = "DEFLATE",predictor: int = None,compressLevel: int = None,
+               nrThreads="ALL_CPUS",blockSize: int = 512,overviewLevels: list = defaultOverviewLevels,
+               resampling: str = "NEAREST",cog: bool = False,epsg: int = 28992):
+    self.fileName = fileName
+    self.extent = extent
+    self.cellSize = cellSize
+    self.nrCols,self.nrRows = calcNrColsRowsFromExtent(extent,cellSize)
+    self.dataType = dataType
+    self.noDataValue = noDataValue
+    self.compress = compress
+    self.predictor = predictor
+    self.compressLevel = compressLevel
+    self.nrThreads = nrThreads
+    self.blockSize = blockSize
+    self.overviewLevels = overviewLevels
+    self.resampling = resampling
+    self.cog = cog
+    self.epsg = epsg
+    self.dataset = None
+
+  #---------------------------------------------------------------------------------------------------
+  def __enter__(self):
+    self.open()
+    return self
+
+  #---------------------------------------------------------------------------------------------------
+  def __exit__(self,excType,excValue,excTraceback):
+    if excType is None:
+      self.close()
+    else:
+      self.abort()
+
+  #---------------------------------------------------------------------------------------------------
+  def getTempFileName(self) -> str:
+    return self.fileName + ".tmp.tif"
+
+  #---------------------------------------------------------------------------------------------------
+  def open(self):
+    if os.path.isfile(self.fileName):
+      os.remove(self.fileName)
+    dirName = os.path.dirname(self.fileName)
+    if (dirName != "") and not os.path.isdir(dirName):
+      os.makedirs(dirName)
+    if self.cog:
+      fileName = self.getTempFileName()
+      options = getCreationOptions("GTiff","NONE",None,None,None,self.blockSize)
+    else:
+      fileName = self.fileName
+      options = getCreationOptions("GTiff",self.compress,self.predictor,self.compressLevel,self.nrThreads,self.blockSize)
+    self.dataset = gd.GetDriverByName("GTiff").Create(fileName,self.nrCols,self.nrRows,1,
+                                                       dataTypeNumpyToGdal(self.dataType),options)
+    self.dataset.SetGeoTransform([self.extent[0],self.cellSize,0,self.extent[3],0,-self.cellSize])
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(self.epsg)
+    self.dataset.SetProjection(srs.ExportToWkt())
+    if self.noDataValue is not None:
+      self.dataset.GetRasterBand(1).SetNoDataValue(self.noDataValue)
+
+  #---------------------------------------------------------------------------------------------------
+  # Writes the values (rows,cols) at the column and row (of the upper-left cell).
+  def write(self,values: np.ndarray,col: int = 0,row: int = 0):
+    with IN.span("writeRaster"):
+      self.dataset.GetRasterBand(1).WriteArray(np.asarray(values,dtype=self.dataType),col,row)
+    IN.count("writeCells",values.size)
+
+  #---------------------------------------------------------------------------------------------------
+  # Writes the raster (with the same cell size) at the position of its extent.
+  def writeRaster(self,raster: Raster):
+    if abs(raster.cellSize - self.cellSize) > 1e-6:
+      raise Exception("Invalid cell size: %s (expected %s)" % (raster.cellSize,self.cellSize))
+    col = int(round((raster.extent[0] - self.extent[0]) / self.cellSize,0))
+    row = int(round((self.extent[3] - raster.extent[3]) / self.cellSize,0))
+    self.write(raster.raster,col,row)
+
+  #---------------------------------------------------------------------------------------------------
+  # Adds the overviews (or converts to a COG) and closes the raster. The COG gets the overviews
+  # of the temporary GeoTIFF.
+  def close(self):
+    if self.dataset is None:
+      return
+    if self.overviewLevels:
+      with IN.span("addOverview"):
+        if self.dataset.BuildOverviews(self.resampling,self.overviewLevels) != 0:
+          raise Exception("Overviews not created: %s" % self.fileName)
+    if self.cog:
+      options = getCreationOptions("COG",self.compress,self.predictor,self.compressLevel,self.nrThreads,self.blockSize)
+      options.append("OVERVIEWS=%s" % ("FORCE_USE_EXISTING" if self.overviewLevels else "NONE"))
+      with IN.span("writeCOG"):
+        dataset = gd.GetDriverByName("COG").CreateCopy(self.fileName,self.dataset,options=options)
+      if dataset is None:
+        raise Exception("COG not created: %s" % self.fileName)
+      dataset.FlushCache()
+      gd.Dataset.__swig_destroy__(dataset)
+      del dataset
+      gd.Dataset.__swig_destroy__(self.dataset)
+      self.dataset = None
+      gd.GetDriverByName("GTiff").Delete(self.getTempFileName())
+    else:
+      self.dataset.FlushCache()
+      gd.Dataset.__swig_destroy__(self.dataset)
+      self.dataset = None
+
+  #---------------------------------------------------------------------------------------------------
+  # Closes the raster without adding the overviews (or converting to a COG) and removes the output
+  # and temporary file, i.e. after an error. Does nothing if the raster is closed.
+  def abort(self):
+    if self.dataset is None:
+      return
+    gd.Dataset.__swig_destroy__(self.dataset)
+    self.dataset = None
+    for fileName in [self.fileName,self.getTempFileName()]:
+      if os.path.isfile(fileName):
+        gd.GetDriverByName("GTiff").Delete(fileName)
+
+#---------------------------------------------------------------------------------------------------
+# Writes the raster to a tiled GeoTIFF or COG. See RasterWriter for the options.
+def writeRaster(fileName: str,raster: Raster,**options):
+  with RasterWriter(fileName,raster.extent,raster.cellSize,raster.raster.dtype,raster.noDataValue,**options) as writer:
+    writer.write(raster.raster)
+
 #---------------------------------------------------------------------------------------------------
 def showRasterInfo(fileName: str):
   raster = readRaster(fileName)
@@ -0,0 +1,298 @@
+#---------------------------------------------------------------------------------------------------
+# Voxel cube with the chloride and suit_extraction data on a common grid.
+#
+# Every attribute is stored as a pre-allocated (z,row,col) array of codes (see VoxelEncoding.py):
+# uint8 for chloride and uint16 for suit_extraction. The values are encoded when the rasters are
+# merged and decoded only when the voxels are written (getValues, getColumns, getProfiles). A
+# validity mask keeps track of the voxels which have chloride data, i.e. the voxels which are
+# written to the output. The suit_extraction of a voxel is no data (noDataCode) until a
+# suit_extraction raster is joined; getColumns and getProfiles write it as 0, as in the original csv.
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import numpy as np
+
+import RasterUtils as RU
+from VoxelEncoding import ChlorideEncoding,SuitEncoding
+
+#---------------------------------------------------------------------------------------------------
+class VoxelCube():
+
+  valueNames = ["laag","midden","hoog","suit_extraction"]
+
+  # Value of no data in the output of getColumns and getProfiles (and the profile store).
+  outputNoDataValue = 0.0
+
+  #---------------------------------------------------------------------------------------------------
+  # If valueNames is given, only the arrays of these value names are allocated (i.e. one chloride
+  # scenario), otherwise those of all value names.
+  def __init__(self,extent,cellSize,zValues,valueNames: list = None):
+    self.extent = extent
+    self.cellSize = cellSize
+    self.zValues = list(zValues)
+    self.nrCols,self.nrRows = RU.calcNrColsRowsFromExtent(extent,cellSize)
+    shape = (len(self.zValues),self.nrRows,self.nrCols)
+    self.valid = np.zeros(shape,dtype=bool)
+    if valueNames is not None:
+      for valueName in valueNames:
+        if valueName not in VoxelCube.valueNames:
+          raise Exception("Invalid value name: %s" % valueName)
+      self.valueNames = list(valueNames)
+
+    # The chloride scenarios share one encoding. Code 0 is value 0.
+    chlorideEncoding = ChlorideEncoding()
+    self.encodings = {"laag": chlorideEncoding,"midden": chlorideEncoding,"hoog": chlorideEncoding,
+                      "suit_extraction": SuitEncoding()}
+    # Chloride is 0 and suit_extraction no data until a raster is merged or joined.
+    self.data = dict()
+    for valueName in self.valueNames:
+      encoding = self.encodings[valueName]
+      fillCode = encoding.noDataCode if valueName == "suit_extraction" else 0
+      self.data[valueName] = np.full(shape,fillCode,dtype=encoding.codeType)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the union of the extents and the cell size of the given rasters.
+  @staticmethod
+  def calcExtent(rasters: list) -> tuple:
+    if len(rasters) == 0:
+      raise Exception("No rasters found.")
+    cellSize = rasters[0].cellSize
+    extent = list(rasters[0].extent)
+    for raster in rasters:
+      if raster.cellSize != cellSize:
+        raise Exception("Invalid cell size: %s (expected %s)" % (raster.cellSize,cellSize))
+      extent[0] = min(extent[0],raster.extent[0])
+      extent[1] = min(extent[1],raster.extent[1])
+      extent[2] = max(extent[2],raster.extent[2])
+      extent[3] = max(extent[3],raster.extent[3])
+    return (extent,cellSize)
+
+  #---------------------------------------------------------------------------------------------------
+  # Creates a cube with the union of the extents of the given rasters.
+  @staticmethod
+  def fromRasters(rasters: list,zValues: list):
+    extent,cellSize = VoxelCube.calcExtent(rasters)
+    return VoxelCube(extent,cellSize,zValues)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the extents of bands of (at most) nrRows rows, from top to bottom.
+  @staticmethod
+  def calcBandExtents(extent,cellSize,nrRows: int) -> list:
+    bandExtents = []
+    maxy = extent[3]
+    while maxy > extent[1]:
+      miny = max(maxy - nrRows * cellSize,extent[1])
+      bandExtents.append([extent[0],miny,extent[2],maxy])
+      maxy = miny
+    return bandExtents
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the overlapping (cube,raster) rows and columns or None. The cell size of the raster is
+  # the cell size of the cube or a multiple of it (i.e. the 100m suit_extraction rasters with the
+  # 50m chloride cube). In the last case every cube cell gets the value of its parent raster cell
+  # (as with a nearest neighbour resample) and the raster rows and columns are index arrays which
+  # select a (rows,cols) block.
+  def calcWindow(self,raster: RU.Raster) -> any:
+    factor = int(round(raster.cellSize / self.cellSize,0))
+    if (factor < 1) or (abs(factor * self.cellSize - raster.cellSize) > 1e-6):
+      raise Exception("Invalid cell size: %s (expected %s or a multiple)" % (raster.cellSize,self.cellSize))
+    colOff = (raster.extent[0] - self.extent[0]) / self.cellSize
+    rowOff = (self.extent[3] - raster.extent[3]) / self.cellSize
+    if (factor > 1) and ((abs(colOff - round(colOff,0)) > 1e-6) or (abs(rowOff - round(rowOff,0)) > 1e-6)):
+      raise Exception("Raster not aligned with the %sm grid: %s" % (self.cellSize,raster.extent))
+    colOff = int(round(colOff,0))
+    rowOff = int(round(rowOff,0))
+    c1 = max(colOff,0)
+    r1 = max(rowOff,0)
+    c2 = min(colOff + raster.nrCols * factor,self.nrCols)
+    r2 = min(rowOff + raster.nrRows * factor,self.nrRows)
+    if (c1 >= c2) or (r1 >= r2):
+      return None
+    if factor == 1:
+      return (slice(r1,r2),slice(c1,c2),slice(r1-rowOff,r2-rowOff),slice(c1-colOff,c2-colOff))
+    rasterRows = (np.arange(r1,r2) - rowOff) // factor
+    rasterCols = (np.arange(c1,c2) - colOff) // factor
+    return (slice(r1,r2),slice(c1,c2),rasterRows[:,np.newaxis],rasterCols[np.newaxis,:])
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the cells with data (see RU.getDataMask). Nan is always no data, so it is encoded as
+  # noDataCode.
+  def getRasterMask(self,values: np.ndarray,noDataValue) -> np.ndarray:
+    return RU.getDataMask(values,noDataValue)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the codes of the raster within the cube as a tuple (rows,cols,codes,encoding) or None:
+  # the rows and columns of the cube (slices), the codes (noDataCode where the raster has no data)
+  # and the encoding as a dict. This is all that is needed to merge or join the raster (see
+  # mergeCodes and joinCodes), so worker processes can return it instead of the raster. For this a
+  # cube without z-levels can be used, which only has the grid and the encodings.
+  def encodeRaster(self,raster: RU.Raster,valueName: str) -> any:
+    window = self.calcWindow(raster)
+    if window is None:
+      return None
+    rows,cols,rasterRows,rasterCols = window
+    values = raster.raster[rasterRows,rasterCols]
+    mask = self.getRasterMask(values,raster.noDataValue)
+    encoding = self.encodings[valueName]
+    codes = np.full(values.shape,encoding.noDataCode,dtype=encoding.codeType)
+    codes[mask] = encoding.encode(values[mask])
+    return (rows,cols,codes,encoding.toDict())
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the rows, columns, codes (of the encoding of the cube) and mask of the encoded raster.
+  def recodeItem(self,item: tuple,valueName: str) -> tuple:
+    rows,cols,codes,info = item
+    encoding = self.encodings[valueName]
+    codes = encoding.recode(codes,info)
+    return (rows,cols,codes,codes != encoding.noDataCode)
+
+  #---------------------------------------------------------------------------------------------------
+  # Voegt ook nieuwe punten toe.
+  def mergeCodes(self,item: tuple,zIndex: int,valueName: str):
+    if item is None:
+      return
+    rows,cols,codes,mask = self.recodeItem(item,valueName)
+    self.data[valueName][zIndex,rows,cols][mask] = codes[mask]
+    self.valid[zIndex,rows,cols] |= mask
+
+  #---------------------------------------------------------------------------------------------------
+  # Voegt geen nieuwe punten toe.
+  def joinCodes(self,item: tuple,zIndex: int,valueName: str):
+    if item is None:
+      return
+    rows,cols,codes,mask = self.recodeItem(item,valueName)
+    mask &= self.valid[zIndex,rows,cols]
+    self.data[valueName][zIndex,rows,cols][mask] = codes[mask]
+
+  #---------------------------------------------------------------------------------------------------
+  # Voegt ook nieuwe punten toe.
+  def mergeRasterData(self,raster: RU.Raster,zIndex: int,valueName: str):
+    self.mergeCodes(self.encodeRaster(raster,valueName),zIndex,valueName)
+
+  #---------------------------------------------------------------------------------------------------
+  # Voegt geen nieuwe punten toe.
+  def joinRasterData(self,raster: RU.Raster,zIndex: int,valueName: str):
+    self.joinCodes(self.encodeRaster(raster,valueName),zIndex,valueName)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the (float32) values of the codes of the value name, no data is noDataValue.
+  def decode(self,valueName: str,codes: np.ndarray,noDataValue: float = np.nan) -> np.ndarray:
+    return self.encodings[valueName].decode(codes,noDataValue)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the (float32) values (z,row,col) of the value name.
+  def getValues(self,valueName: str) -> np.ndarray:
+    return self.decode(valueName,self.data[valueName])
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the values as (nrZ,nrRows,nrCols,factor*factor*zFactor) blocks of zFactor z-levels and
+  # factor x factor cells. The values are padded with fillValue.
+  @staticmethod
+  def toBlocks(values: np.ndarray,factor: int,zFactor: int,fillValue) -> np.ndarray:
+    nrZ = -(-values.shape[0] // zFactor)
+    nrRows = -(-values.shape[1] // factor)
+    nrCols = -(-values.shape[2] // factor)
+    padded = np.full((nrZ * zFactor,nrRows * factor,nrCols * factor),fillValue,dtype=values.dtype)
+    padded[:values.shape[0],:values.shape[1],:values.shape[2]] = values
+    blocks = padded.reshape(nrZ,zFactor,nrRows,factor,nrCols,factor).transpose(0,2,4,1,3,5)
+    return blocks.reshape(nrZ,nrRows,nrCols,-1)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the aggregate of the last axis of the values (i.e. the blocks of toBlocks) over the
+  # values which are valid: the maximum ("max"), the most frequent value ("mode", the highest
+  # value if equal) or the mean ("mean"). Nan where no value is valid.
+  @staticmethod
+  def aggregateValues(values: np.ndarray,valid: np.ndarray,method: str) -> np.ndarray:
+    hasData = valid.any(axis=-1)
+    if method == "max":
+      result = np.where(valid,values,-np.inf).max(axis=-1).astype(np.float64)
+    elif method == "mode":
+      result = np.zeros(hasData.shape,dtype=np.float64)
+      maxCount = np.zeros(hasData.shape,dtype=np.int64)
+      for value in np.unique(values[valid]):
+        count = np.count_nonzero(valid & (values == value),axis=-1)
+        better = (count > 0) & (count >= maxCount)
+        result[better] = value
+        maxCount[better] = count[better]
+    elif method == "mean":
+      nrValid = np.maximum(np.count_nonzero(valid,axis=-1),1)
+      result = np.where(valid,values,0).sum(axis=-1,dtype=np.float64) / nrValid
+    else:
+      raise Exception("Invalid aggregation method: %s" % method)
+    result[~hasData] = np.nan
+    return result
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns a coarser cube with a cell size of factor times the cell size and a z-level per zFactor
+  # z-levels (the mean z value). Chloride is the maximum ("max") or the most frequent class
+  # ("mode", the highest class if equal) of the voxels with data, suit_extraction the mean of the
+  # voxels with a joined suit_extraction (no data if there are none). The cube is aggregated per
+  # nrRowsPerChunk (coarse) rows to limit the memory.
+  def aggregate(self,factor: int,zFactor: int,chlorideMethod: str = "max",nrRowsPerChunk: int = 64):
+    if chlorideMethod not in ["max","mode"]:
+      raise Exception("Invalid chloride method: %s" % chlorideMethod)
+    nrRows = -(-self.nrRows // factor)
+    nrCols = -(-self.nrCols // factor)
+    cellSize = self.cellSize * factor
+    extent = [self.extent[0],self.extent[3] - nrRows * cellSize,self.extent[0] + nrCols * cellSize,self.extent[3]]
+    zValues = [float(np.mean(self.zValues[i:i + zFactor])) for i in range(0,len(self.zValues),zFactor)]
+    cube = VoxelCube(extent,cellSize,zValues,self.valueNames)
+
+    for row1 in range(0,nrRows,nrRowsPerChunk):
+      row2 = min(row1 + nrRowsPerChunk,nrRows)
+      rows = slice(row1 * factor,row2 * factor)
+      valid = self.toBlocks(self.valid[:,rows],factor,zFactor,False)
+      hasData = valid.any(axis=3)
+      cube.valid[:,row1:row2] = hasData
+      for valueName in self.valueNames:
+        codes = self.data[valueName][:,rows]
+        values = self.toBlocks(self.decode(valueName,codes),factor,zFactor,0)
+        hasValue = valid & self.toBlocks(codes != self.encodings[valueName].noDataCode,factor,zFactor,False)
+        method = "mean" if valueName == "suit_extraction" else chlorideMethod
+        result = self.aggregateValues(values,hasValue,method)
+        mask = hasData & ~np.isnan(result)
+        cube.data[valueName][:,row1:row2][mask] = cube.encodings[valueName].encode(result[mask])
+    return cube
+
+  #---------------------------------------------------------------------------------------------------
+  def getNrPoints(self) -> int:
+    return int(np.count_nonzero(self.valid))
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the x and y (cell centre) coordinates of the columns and rows.
+  def getXY(self) -> tuple:
+    return RU.calcCellCentres(self.extent,self.cellSize,self.nrCols,self.nrRows)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the columns (x,y,z,laag,midden,hoog,suit_extraction) of the valid voxels of a z-level.
+  def getColumns(self,zIndex: int) -> dict:
+    xs,ys = self.getXY()
+    rows,cols = np.nonzero(self.valid[zIndex])
+    columns = dict()
+    columns["x"] = xs[cols]
+    columns["y"] = ys[rows]
+    columns["z"] = np.full(len(rows),self.zValues[zIndex])
+    for valueName in self.valueNames:
+      columns[valueName] = self.decode(valueName,self.data[valueName][zIndex][rows,cols],self.outputNoDataValue)
+    return columns
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the profiles of the cell columns with data within the rows row1 to row2: the arrays
+  # x and y (n) and the arrays valid, z, laag, midden, hoog and suit_extraction (n,nrZ), ordered
+  # from low to high z.
+  def getProfiles(self,row1: int,row2: int) -> dict:
+    xs,ys = self.getXY()
+    rows,cols = np.nonzero(self.valid[:,row1:row2].any(axis=0))
+    rows += row1
+    profiles = dict()
+    profiles["x"] = xs[cols]
+    profiles["y"] = ys[rows]
+    profiles["valid"] = self.valid[:,rows,cols].T
+    profiles["z"] = np.broadcast_to(np.array(self.zValues),profiles["valid"].shape)
+    for valueName in self.valueNames:
+      profiles[valueName] = self.decode(valueName,self.data[valueName][:,rows,cols].T,self.outputNoDataValue)
+    return profiles
@@ -0,0 +1,139 @@
+#---------------------------------------------------------------------------------------------------
+# Compact encoding of the voxel values.
+#
+# Chloride: the values are a small set of class values (0, 150, 300, ..., 15000), so they are
+#   stored as uint8 codes into a lookup table. The table starts with the classes of the viewer
+#   (js/ColorTable.js); other values are added to the table when they are encoded, so the
+#   encoding is lossless. Code 255 is no data.
+# Suitability: the values (0..1) are quantized to uint16 with 3 decimals (the precision of the
+#   output). Code 65535 is no data.
+#
+# Code 0 is the value 0 for both encodings, so an array of zeros decodes to zeros.
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import numpy as np
+
+# Classes of the viewer (js/ColorTable.js).
+chlorideClasses = [0,150,300,500,750,1000,1250,1500,2000,3000,5000,7500,10000,15000]
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+class ChlorideEncoding():
+
+  codeType = np.uint8
+  noDataCode = 255
+
+  #---------------------------------------------------------------------------------------------------
+  def __init__(self,table: list = None):
+    if table is None:
+      table = chlorideClasses
+    self.table = np.array(table,dtype=np.float32)
+    self.updateIndex()
+
+  #---------------------------------------------------------------------------------------------------
+  def updateIndex(self):
+    self.order = np.argsort(self.table,kind="stable")
+    self.sortedTable = self.table[self.order]
+
+  #---------------------------------------------------------------------------------------------------
+  # Adds the values to the table.
+  def addValues(self,values: np.ndarray):
+    if np.isnan(values).any():
+      raise Exception("Invalid chloride value: nan")
+    if len(self.table) + len(values) > self.noDataCode:
+      raise Exception("Too many distinct chloride values (max. %s)." % self.noDataCode)
+    self.table = np.concatenate([self.table,values.astype(np.float32)])
+    self.updateIndex()
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the positions of the values in the sorted table and whether they are found.
+  def search(self,values: np.ndarray) -> tuple:
+    positions = np.minimum(np.searchsorted(self.sortedTable,values),len(self.sortedTable) - 1)
+    return (positions,self.sortedTable[positions] == values)
+
+  #---------------------------------------------------------------------------------------------------
+  def encode(self,values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values,dtype=np.float32)
+    positions,found = self.search(values)
+    if not found.all():
+      self.addValues(np.unique(values[~found]))
+      positions,found = self.search(values)
+    return self.order[positions].astype(self.codeType)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the values of the codes, no data (noDataCode) is noDataValue.
+  def decode(self,codes: np.ndarray,noDataValue: float = np.nan) -> np.ndarray:
+    table = np.full(self.noDataCode + 1,noDataValue,dtype=np.float32)
+    table[:len(self.table)] = self.table
+    return table[codes]
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the codes of another encoding (a dict, see toDict) as codes of this encoding, i.e. the
+  # codes encoded by a worker process. The codes are unchanged if the table of the other encoding
+  # is the start of the table.
+  def recode(self,codes: np.ndarray,info: dict) -> np.ndarray:
+    table = np.array(info["table"],dtype=np.float32)
+    if (len(table) <= len(self.table)) and (self.table[:len(table)] == table).all():
+      return codes
+    lookup = np.full(self.noDataCode + 1,self.noDataCode,dtype=self.codeType)
+    lookup[:len(table)] = self.encode(table)
+    return lookup[codes]
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the encoding as a json-able dict (see fromDict).
+  def toDict(self) -> dict:
+    return {"table": self.table.tolist()}
+
+  #---------------------------------------------------------------------------------------------------
+  @staticmethod
+  def fromDict(info: dict):
+    return ChlorideEncoding(info["table"])
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+class SuitEncoding():
+
+  codeType = np.uint16
+  noDataCode = 65535
+
+  #---------------------------------------------------------------------------------------------------
+  def __init__(self,scale: int = 1000):
+    self.scale = scale
+
+  #---------------------------------------------------------------------------------------------------
+  def encode(self,values: np.ndarray) -> np.ndarray:
+    codes = np.round(np.asarray(values,dtype=np.float64) * self.scale)
+    if not ((codes >= 0) & (codes < self.noDataCode)).all():
+      raise Exception("Invalid suit_extraction value (range 0 to %s)." % ((self.noDataCode - 1) / self.scale))
+    return codes.astype(self.codeType)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the values of the codes, no data (noDataCode) is noDataValue.
+  def decode(self,codes: np.ndarray,noDataValue: float = np.nan) -> np.ndarray:
+    values = (codes / self.scale).astype(np.float32)
+    values[codes == self.noDataCode] = noDataValue
+    return values
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the codes of another encoding (a dict, see toDict) as codes of this encoding.
+  def recode(self,codes: np.ndarray,info: dict) -> np.ndarray:
+    if info["scale"] == self.scale:
+      return codes
+    mask = codes != self.noDataCode
+    result = np.full(codes.shape,self.noDataCode,dtype=self.codeType)
+    result[mask] = self.encode(SuitEncoding.fromDict(info).decode(codes[mask]))
+    return result
+
+  #---------------------------------------------------------------------------------------------------
+  def toDict(self) -> dict:
+    return {"scale": self.scale}
+
+  #---------------------------------------------------------------------------------------------------
+  @staticmethod
+  def fromDict(info: dict):
+    return SuitEncoding(info["scale"])
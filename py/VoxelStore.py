@@ -0,0 +1,234 @@
+#---------------------------------------------------------------------------------------------------
+# Chunked, compressed 3D store with the chloride and suit_extraction voxels.
+#
+# The store is a Zarr (v2) group, so it can also be read with zarr or xarray:
+#   .zgroup, .zattrs      : group with the extent, cell size, z values and encodings.
+#   <valueName>/.zarray   : (z,y,x) array with the codes of the values (see VoxelEncoding.py), uint8
+#                           for chloride and uint16 for suit_extraction, zlib compressed chunks.
+#                           The fill value is the no data code.
+#   <valueName>/.zattrs   : dimension names (z,y,x) and the encoding of the codes (the lookup table
+#                           of the chloride codes or the scale of the suit_extraction codes).
+#   <valueName>/<i>.<j>.<k> : the chunks, chunks without data are not written.
+#
+# The reader (VoxelStore) decodes the values, nan is no data.
+#
+# The y axis runs from top (north) to bottom, as in the rasters. The default chunk shape (16,64,64)
+# is a compromise between horizontal slices (one z-level) and vertical columns (one xy-location):
+# both only read a small part of the store.
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import json
+import os
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from VoxelCube import VoxelCube
+from VoxelEncoding import ChlorideEncoding,SuitEncoding
+
+valueNames = ["laag","midden","hoog","suit_extraction"]
+
+defaultChunks = (16,64,64)
+
+#---------------------------------------------------------------------------------------------------
+def writeJson(fileName: str,data: dict):
+  with open(fileName,"w") as f:
+    json.dump(data,f,indent=2)
+
+#---------------------------------------------------------------------------------------------------
+# Writes the voxels of the cube to the store directory.
+def writeVoxelStore(dirName: str,cube: VoxelCube,chunks: tuple = defaultChunks,compressLevel: int = 5):
+  if not os.path.isdir(dirName):
+    os.makedirs(dirName)
+  shape = (len(cube.zValues),cube.nrRows,cube.nrCols)
+  chunks = tuple([min(chunks[i],max(shape[i],1)) for i in range(3)])
+
+  writeJson(os.path.join(dirName,".zgroup"),{"zarr_format": 2})
+  attrs = dict()
+  attrs["extent"] = [float(v) for v in cube.extent]
+  attrs["cellSize"] = float(cube.cellSize)
+  attrs["zValues"] = [float(v) for v in cube.zValues]
+  attrs["chlorideEncoding"] = cube.encodings["midden"].toDict()
+  attrs["suitEncoding"] = cube.encodings["suit_extraction"].toDict()
+  writeJson(os.path.join(dirName,".zattrs"),attrs)
+
+  for valueName in valueNames:
+    arrayDir = os.path.join(dirName,valueName)
+    if not os.path.isdir(arrayDir):
+      os.makedirs(arrayDir)
+    encoding = cube.encodings[valueName]
+    header = dict()
+    header["zarr_format"] = 2
+    header["shape"] = list(shape)
+    header["chunks"] = list(chunks)
+    header["dtype"] = np.dtype(encoding.codeType).str
+    header["compressor"] = {"id": "zlib","level": compressLevel}
+    header["fill_value"] = encoding.noDataCode
+    header["order"] = "C"
+    header["filters"] = None
+    header["dimension_separator"] = "."
+    writeJson(os.path.join(arrayDir,".zarray"),header)
+    writeJson(os.path.join(arrayDir,".zattrs"),{"_ARRAY_DIMENSIONS": ["z","y","x"],"encoding": encoding.toDict()})
+
+    codes = cube.data[valueName]
+    for z1 in range(0,shape[0],chunks[0]):
+      for r1 in range(0,shape[1],chunks[1]):
+        for c1 in range(0,shape[2],chunks[2]):
+          window = (slice(z1,z1 + chunks[0]),slice(r1,r1 + chunks[1]),slice(c1,c1 + chunks[2]))
+          valid = cube.valid[window]
+          if not valid.any():
+            continue
+          # Chunks at the edges are padded to the full chunk shape.
+          chunk = np.full(chunks,encoding.noDataCode,dtype=header["dtype"])
+          chunk[:valid.shape[0],:valid.shape[1],:valid.shape[2]] = np.where(valid,codes[window],encoding.noDataCode)
+          chunkName = "%s.%s.%s" % (z1 // chunks[0],r1 // chunks[1],c1 // chunks[2])
+          with open(os.path.join(arrayDir,chunkName),"wb") as f:
+            f.write(zlib.compress(chunk.tobytes(),compressLevel))
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+class VoxelStore():
+
+  #---------------------------------------------------------------------------------------------------
+  # Keeps at most maxCachedChunks decompressed chunks in memory.
+  def __init__(self,dirName: str,maxCachedChunks: int = 256):
+    with open(os.path.join(dirName,".zattrs")) as f:
+      attrs = json.load(f)
+    self.dirName = dirName
+    self.extent = attrs["extent"]
+    self.cellSize = attrs["cellSize"]
+    self.zValues = np.array(attrs["zValues"])
+    chlorideEncoding = ChlorideEncoding.fromDict(attrs["chlorideEncoding"])
+    self.encodings = {"laag": chlorideEncoding,"midden": chlorideEncoding,"hoog": chlorideEncoding,
+                      "suit_extraction": SuitEncoding.fromDict(attrs["suitEncoding"])}
+    self.headers = dict()
+    for valueName in valueNames:
+      with open(os.path.join(dirName,valueName,".zarray")) as f:
+        self.headers[valueName] = json.load(f)
+    header = self.headers[valueNames[0]]
+    self.shape = tuple(header["shape"])
+    self.chunks = tuple(header["chunks"])
+    self.nrZ,self.nrRows,self.nrCols = self.shape
+    self.maxCachedChunks = maxCachedChunks
+    self.cache = OrderedDict()
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the codes of the chunk (index i,j,k) of the array (no data code if not written).
+  def readChunk(self,valueName: str,i: int,j: int,k: int) -> np.ndarray:
+    key = (valueName,i,j,k)
+    chunk = self.cache.get(key)
+    if chunk is not None:
+      self.cache.move_to_end(key)
+      return chunk
+    fileName = os.path.join(self.dirName,valueName,"%s.%s.%s" % (i,j,k))
+    header = self.headers[valueName]
+    if os.path.isfile(fileName):
+      with open(fileName,"rb") as f:
+        chunk = np.frombuffer(zlib.decompress(f.read()),dtype=header["dtype"]).reshape(self.chunks)
+    else:
+      chunk = np.full(self.chunks,header["fill_value"],dtype=header["dtype"])
+    self.cache[key] = chunk
+    if len(self.cache) > self.maxCachedChunks:
+      self.cache.popitem(last=False)
+    return chunk
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the (float32) values (z,row,col) within the index ranges [z1,z2), [row1,row2),
+  # [col1,col2), nan is no data. Only the chunks which overlap are read.
+  def readWindow(self,valueName: str,z1: int,z2: int,row1: int,row2: int,col1: int,col2: int) -> np.ndarray:
+    starts = (max(z1,0),max(row1,0),max(col1,0))
+    stops = (min(z2,self.nrZ),min(row2,self.nrRows),min(col2,self.nrCols))
+    encoding = self.encodings[valueName]
+    result = np.full([max(stops[d] - starts[d],0) for d in range(3)],encoding.noDataCode,dtype=encoding.codeType)
+    if result.size == 0:
+      return encoding.decode(result)
+    chunkRanges = [range(starts[d] // self.chunks[d],(stops[d] - 1) // self.chunks[d] + 1) for d in range(3)]
+    for i in chunkRanges[0]:
+      for j in chunkRanges[1]:
+        for k in chunkRanges[2]:
+          chunk = self.readChunk(valueName,i,j,k)
+          src = []
+          dst = []
+          for d,index in enumerate((i,j,k)):
+            chunkStart = index * self.chunks[d]
+            a = max(starts[d],chunkStart)
+            b = min(stops[d],chunkStart + self.chunks[d])
+            src.append(slice(a - chunkStart,b - chunkStart))
+            dst.append(slice(a - starts[d],b - starts[d]))
+          result[tuple(dst)] = chunk[tuple(src)]
+    return encoding.decode(result)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the index of the z value (or None).
+  def getZIndex(self,zValue) -> any:
+    indices = np.nonzero(np.isclose(self.zValues,zValue))[0]
+    if len(indices) == 0:
+      return None
+    return int(indices[0])
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the row and column of the cell with the point (or None).
+  def getCell(self,x: float,y: float) -> any:
+    col = int(np.floor((x - self.extent[0]) / self.cellSize))
+    row = int(np.floor((self.extent[3] - y) / self.cellSize))
+    if (col < 0) or (col >= self.nrCols) or (row < 0) or (row >= self.nrRows):
+      return None
+    return (row,col)
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the horizontal slice (rows,cols) of the z-level.
+  def getLevel(self,valueName: str,zValue) -> np.ndarray:
+    zIndex = self.getZIndex(zValue)
+    if zIndex is None:
+      raise Exception("Invalid z value: %s" % zValue)
+    return self.readWindow(valueName,zIndex,zIndex + 1,0,self.nrRows,0,self.nrCols)[0]
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the profile at the point as a dict with z and the values per value name (low to high
+  # z, only the voxels with data), or None if the point is outside the store.
+  def getColumn(self,x: float,y: float) -> any:
+    cell = self.getCell(x,y)
+    if cell is None:
+      return None
+    row,col = cell
+    profile = dict()
+    values = dict([(valueName,self.readWindow(valueName,0,self.nrZ,row,row + 1,col,col + 1)[:,0,0])
+                   for valueName in valueNames])
+    valid = ~np.isnan(values["midden"])
+    profile["z"] = self.zValues[valid].tolist()
+    for valueName in valueNames:
+      profile[valueName] = values[valueName][valid].tolist()
+    return profile
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the statistics (count,min,max,mean) per z-level of the value name, read chunk by chunk.
+  def getStatistics(self,valueName: str) -> list:
+    count = np.zeros(self.nrZ,dtype=np.int64)
+    total = np.zeros(self.nrZ)
+    minimum = np.full(self.nrZ,np.inf)
+    maximum = np.full(self.nrZ,-np.inf)
+    for z1 in range(0,self.nrZ,self.chunks[0]):
+      for r1 in range(0,self.nrRows,self.chunks[1]):
+        values = self.readWindow(valueName,z1,z1 + self.chunks[0],r1,r1 + self.chunks[1],0,self.nrCols)
+        values = values.reshape(values.shape[0],-1)
+        valid = ~np.isnan(values)
+        zSlice = slice(z1,z1 + values.shape[0])
+        count[zSlice] += valid.sum(axis=1)
+        total[zSlice] += np.where(valid,values,0).sum(axis=1)
+        minimum[zSlice] = np.minimum(minimum[zSlice],np.where(valid,values,np.inf).min(axis=1))
+        maximum[zSlice] = np.maximum(maximum[zSlice],np.where(valid,values,-np.inf).max(axis=1))
+    statistics = []
+    for zIndex in range(self.nrZ):
+      if count[zIndex] == 0:
+        statistics.append({"z": float(self.zValues[zIndex]),"count": 0,"min": None,"max": None,"mean": None})
+      else:
+        statistics.append({"z": float(self.zValues[zIndex]),"count": int(count[zIndex]),
+                           "min": float(minimum[zIndex]),"max": float(maximum[zIndex]),
+                           "mean": float(total[zIndex] / count[zIndex])})
+    return statistics
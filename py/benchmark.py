@@ -0,0 +1,316 @@
+#---------------------------------------------------------------------------------------------------
+# Benchmark of the conversion of the chloride and suit_extraction rasters (data_to_csv.py).
+#
+# Generates a synthetic stack of chloride (chloride_<type>_<z>.asc) and suit_extraction
+# (ASC_Suitability_extraction_*.tif) rasters of the given size and nodata fraction and times the
+# stages of the conversion separately. As in production the suit_extraction rasters have a cell
+# size of suitFactor times the chloride cell size (100m and 50m), aligned with the chloride grid:
+#   readRaster      : reading the rasters (RU.readRaster).
+#   mergeRasterData : merging the chloride rasters with the voxel cube.
+#   joinRasterData  : joining the suit_extraction rasters with the voxel cube.
+#   getColumns      : conversion of the voxel cube to x, y, z and value columns per z-level.
+#   write_<format>  : writing the voxel cube (DataToCsv.writeToFile).
+#
+# Per stage the wall time, the throughput and the peak memory (RSS) of the process are written to
+# a JSON report. If a baseline report is given, stages which are slower than the baseline (more
+# than the tolerance) are reported as a regression and the exit code is 1.
+#
+# Run:
+#   activate <conda env>
+#   python benchmark.py --cols 2000 --rows 1500 --levels 20 --nodata 0.4 --report bench.json
+#   python benchmark.py ... --baseline bench_old.json
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import osgeo.gdal as gd
+
+# Not available on Windows.
+try:
+  import resource
+except ImportError:
+  resource = None
+
+import RasterUtils as RU
+import PointWriters as PW
+from data_to_csv import DataToCsv
+from VoxelCube import VoxelCube
+
+# Chloride classes (mg/l) as used in the source data.
+chlorideClasses = [0,150,300,500,750,1000,1250,1500,2000,3000,5000,7500,10000,15000]
+
+noDataValue = -9999.0
+
+# Cell size of the suit_extraction rasters relative to the chloride rasters.
+suitFactor = 2
+
+#---------------------------------------------------------------------------------------------------
+# Returns the peak memory (RSS) of the process in MB or None.
+def getPeakRss() -> any:
+  if resource is None:
+    return None
+  maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Bytes on macOS, KB on Linux.
+  if sys.platform == "darwin":
+    return round(maxRss / 1024 / 1024,1)
+  return round(maxRss / 1024,1)
+
+#---------------------------------------------------------------------------------------------------
+# Writes the data as raster with the given GDAL driver (i.e. "AAIGrid" or "GTiff").
+def writeSyntheticRaster(fileName: str,driverName: str,data: np.ndarray,extent,cellSize,options=None):
+  nrRows,nrCols = data.shape
+  memDataset = gd.GetDriverByName("MEM").Create("",nrCols,nrRows,1,gd.GDT_Float32)
+  memDataset.SetGeoTransform([extent[0],cellSize,0,extent[3],0,-cellSize])
+  band = memDataset.GetRasterBand(1)
+  band.SetNoDataValue(noDataValue)
+  band.WriteArray(data)
+  del band
+  dataset = gd.GetDriverByName(driverName).CreateCopy(fileName,memDataset,options=options or [])
+  gd.Dataset.__swig_destroy__(dataset)
+  del dataset
+  del memDataset
+
+#---------------------------------------------------------------------------------------------------
+# Generates the chloride and suit_extraction rasters for the z values in dirName.
+# Returns the chloride and suit_extraction directory.
+def generateData(dirName: str,zValues: list,nrCols: int,nrRows: int,cellSize: float,
+                 noDataFraction: float,seed: int = 0) -> tuple:
+  chlorideDir = os.path.join(dirName,"asc")
+  suitDir = os.path.join(dirName,"SuitExtraction%sm" % int(cellSize * suitFactor))
+  os.makedirs(chlorideDir,exist_ok=True)
+  os.makedirs(suitDir,exist_ok=True)
+
+  # Extent in RD coordinates (Zeeland).
+  minx = 10000.0
+  maxy = 420000.0
+  extent = [minx,maxy - nrRows * cellSize,minx + nrCols * cellSize,maxy]
+
+  # The suit_extraction grid covers the chloride grid, with the same upper left corner.
+  suitCellSize = cellSize * suitFactor
+  nrSuitCols = -(-nrCols // suitFactor)
+  nrSuitRows = -(-nrRows // suitFactor)
+  suitExtent = [minx,maxy - nrSuitRows * suitCellSize,minx + nrSuitCols * suitCellSize,maxy]
+
+  dc = DataToCsv()
+  rng = np.random.default_rng(seed)
+  classes = np.array(chlorideClasses,dtype=np.float32)
+  for zValue in zValues:
+    print("Generating %s..." % zValue)
+
+    # Chloride laag <= midden <= hoog, with the same nodata cells.
+    noData = rng.random((nrRows,nrCols)) < noDataFraction
+    values = np.sort(rng.choice(classes,size=(3,nrRows,nrCols)),axis=0)
+    for i,chlorideType in enumerate(["laag","midden","hoog"]):
+      data = np.where(noData,noDataValue,values[i]).astype(np.float32)
+      fileName = os.path.join(chlorideDir,dc.getChlorideRasterName(chlorideType,zValue))
+      writeSyntheticRaster(fileName,"AAIGrid",data,extent,cellSize)
+
+    # Suit_extraction between 0 and 1.
+    noData = rng.random((nrSuitRows,nrSuitCols)) < noDataFraction
+    data = np.round(rng.random((nrSuitRows,nrSuitCols)),3)
+    data = np.where(noData,noDataValue,data).astype(np.float32)
+    fileName = os.path.join(suitDir,dc.getSuitRasterName(zValue))
+    writeSyntheticRaster(fileName,"GTiff",data,suitExtent,suitCellSize,["TILED=YES","COMPRESS=DEFLATE"])
+
+  return (chlorideDir,suitDir)
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+class Benchmark():
+
+  #---------------------------------------------------------------------------------------------------
+  def __init__(self,repeat: int = 1):
+    self.repeat = repeat
+    self.stages = []
+
+  #---------------------------------------------------------------------------------------------------
+  # Runs func repeat times and records the stage. Func returns a tuple (result,nrItems,nrBytes).
+  # Returns the result of the last run.
+  def runStage(self,name: str,func,itemName: str = "cells") -> any:
+    print("Running %s..." % name)
+    wallTimes = []
+    result = None
+    nrItems = 0
+    nrBytes = 0
+    for _ in range(self.repeat):
+      t0 = time.perf_counter()
+      result,nrItems,nrBytes = func()
+      wallTimes.append(time.perf_counter() - t0)
+
+    wallTime = min(wallTimes)
+    stage = dict()
+    stage["name"] = name
+    stage["wallTime"] = round(wallTime,4)
+    stage["wallTimes"] = [round(t,4) for t in wallTimes]
+    stage["items"] = nrItems
+    stage["itemName"] = itemName
+    stage["itemsPerSecond"] = round(nrItems / wallTime,1) if wallTime > 0 else None
+    stage["bytes"] = nrBytes
+    stage["mbPerSecond"] = round(nrBytes / 1024 / 1024 / wallTime,2) if (wallTime > 0) and (nrBytes > 0) else None
+    stage["peakRssMb"] = getPeakRss()
+    self.stages.append(stage)
+    print("  %.3f s, %s %s/s" % (wallTime,stage["itemsPerSecond"],itemName))
+    return result
+
+  #---------------------------------------------------------------------------------------------------
+  # Runs all stages on the rasters in the chloride and suit_extraction directory.
+  def run(self,chlorideDir,suitDir,zValues,outputFormats,outDir):
+    dc = DataToCsv()
+    chlorideRasters,suitRasters,skipped = dc.findRasters(chlorideDir,suitDir,zValues)
+    if len(skipped) > 0:
+      raise Exception("Rasters not found: %s" % len(skipped))
+    rasterList = chlorideRasters + suitRasters
+
+    # Read.
+    def readRasters():
+      rasters = [RU.readRaster(rasterName) for _,_,rasterName in rasterList]
+      nrCells = sum([raster.nrCols * raster.nrRows for raster in rasters])
+      nrBytes = sum([os.path.getsize(rasterName) for _,_,rasterName in rasterList])
+      return (rasters,nrCells,nrBytes)
+    rasters = self.runStage("readRaster",readRasters)
+    nrChloride = len(chlorideRasters)
+    nrCells = sum([raster.nrCols * raster.nrRows for raster in rasters[:nrChloride]])
+
+    # Merge and join.
+    def mergeRasters():
+      cube = VoxelCube.fromRasters(rasters[:nrChloride],zValues)
+      for i in range(nrChloride):
+        valueName,zIndex,_ = rasterList[i]
+        cube.mergeRasterData(rasters[i],zIndex,valueName)
+      return (cube,nrCells,0)
+    cube = self.runStage("mergeRasterData",mergeRasters)
+
+    def joinRasters():
+      for i in range(nrChloride,len(rasterList)):
+        valueName,zIndex,_ = rasterList[i]
+        cube.joinRasterData(rasters[i],zIndex,valueName)
+      # The cells of the cube, the suit_extraction rasters are coarser.
+      return (None,(len(rasterList) - nrChloride) * cube.nrRows * cube.nrCols,0)
+    self.runStage("joinRasterData",joinRasters)
+    del rasters
+
+    # Convert.
+    nrPoints = cube.getNrPoints()
+    def convertCube():
+      for zIndex in range(len(cube.zValues)):
+        cube.getColumns(zIndex)
+      return (None,nrPoints,0)
+    self.runStage("getColumns",convertCube,"points")
+
+    # Write.
+    for outputFormat in outputFormats:
+      if (outputFormat == "parquet") and (PW.pa is None):
+        print("Skipping parquet, package pyarrow not found.")
+        continue
+      dc.outputFormat = outputFormat
+      fileName = os.path.join(outDir,"point_data" + PW.outputFormats[outputFormat])
+      def writeCube():
+        if os.path.exists(fileName):
+          os.remove(fileName)
+        dc.writeToFile(fileName,cube)
+        return (None,nrPoints,os.path.getsize(fileName))
+      self.runStage("write_%s" % outputFormat,writeCube,"points")
+
+#---------------------------------------------------------------------------------------------------
+# Returns the stages of the report which are slower than the baseline (more than the tolerance,
+# i.e. 0.1 is 10%).
+def compareReports(report: dict,baseline: dict,tolerance: float) -> list:
+  baselineStages = dict([(stage["name"],stage) for stage in baseline["stages"]])
+  regressions = []
+  for stage in report["stages"]:
+    baselineStage = baselineStages.get(stage["name"])
+    if baselineStage is None:
+      continue
+    if stage["wallTime"] > baselineStage["wallTime"] * (1 + tolerance):
+      regressions.append({"name": stage["name"],"wallTime": stage["wallTime"],
+                          "baselineWallTime": baselineStage["wallTime"]})
+  return regressions
+
+#---------------------------------------------------------------------------------------------------
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark of the conversion of the chloride and suit_extraction rasters.")
+  parser.add_argument("--cols",type=int,default=1000,help="Nr. of columns of the rasters.")
+  parser.add_argument("--rows",type=int,default=1000,help="Nr. of rows of the rasters.")
+  parser.add_argument("--levels",type=int,default=10,help="Nr. of z-levels.")
+  parser.add_argument("--cellsize",type=float,default=50.0,help="Cell size (m).")
+  parser.add_argument("--nodata",type=float,default=0.5,help="Fraction of nodata cells.")
+  parser.add_argument("--seed",type=int,default=0)
+  parser.add_argument("--repeat",type=int,default=1,help="Nr. of runs per stage (the fastest run is reported).")
+  parser.add_argument("--formats",default="csv",help="Output formats, i.e. csv,parquet,gpkg,pgcopy.")
+  parser.add_argument("--dir",default=None,help="Directory for the rasters and output (default a temporary directory).")
+  parser.add_argument("--keep",action="store_true",help="Keep the rasters and output.")
+  parser.add_argument("--report",default="benchmark_report.json",help="Report file.")
+  parser.add_argument("--baseline",default=None,help="Baseline report to compare with.")
+  parser.add_argument("--tolerance",type=float,default=0.1,help="Allowed slowdown compared with the baseline.")
+  args = parser.parse_args()
+
+  outputFormats = args.formats.split(",")
+  for outputFormat in outputFormats:
+    if not outputFormat in PW.outputFormats:
+      raise Exception("Invalid output format: %s" % outputFormat)
+
+  dirName = args.dir
+  if dirName is None:
+    dirName = tempfile.mkdtemp(prefix="freshem_benchmark_")
+  os.makedirs(dirName,exist_ok=True)
+
+  try:
+    zValues = DataToCsv().getZValues()[:args.levels]
+    t0 = time.perf_counter()
+    chlorideDir,suitDir = generateData(dirName,zValues,args.cols,args.rows,args.cellsize,args.nodata,args.seed)
+    generateTime = time.perf_counter() - t0
+
+    benchmark = Benchmark(args.repeat)
+    benchmark.run(chlorideDir,suitDir,zValues,outputFormats,dirName)
+  finally:
+    if not args.keep and (args.dir is None):
+      shutil.rmtree(dirName,ignore_errors=True)
+
+  report = dict()
+  report["version"] = 1
+  report["date"] = datetime.datetime.now().isoformat(timespec="seconds")
+  report["platform"] = platform.platform()
+  report["python"] = platform.python_version()
+  report["numpy"] = np.__version__
+  report["gdal"] = gd.__version__ if hasattr(gd,"__version__") else None
+  report["params"] = {"cols": args.cols,"rows": args.rows,"levels": args.levels,"cellSize": args.cellsize,
+                      "noDataFraction": args.nodata,"suitFactor": suitFactor,"seed": args.seed,"repeat": args.repeat,
+                      "formats": outputFormats}
+  report["generateTime"] = round(generateTime,4)
+  report["stages"] = benchmark.stages
+
+  exitCode = 0
+  if args.baseline is not None:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    if baseline.get("params") != report["params"]:
+      print("WARNING: The parameters of the baseline are different.")
+    report["regressions"] = compareReports(report,baseline,args.tolerance)
+    for regression in report["regressions"]:
+      print("REGRESSION: %s %.3f s (baseline %.3f s)" % (regression["name"],regression["wallTime"],
+                                                         regression["baselineWallTime"]))
+    if len(report["regressions"]) > 0:
+      exitCode = 1
+
+  with open(args.report,"w") as f:
+    json.dump(report,f,indent=2)
+  print("Report: %s" % args.report)
+  return exitCode
+
+#---------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+  sys.exit(main())
@@ -1,7 +1,9 @@
 #---------------------------------------------------------------------------------------------------
 # Converts the 100m .asc files with suitable for extraction to 100m and 50m tifs.
 #
-# 50m tifs are needed for combining with the chloride data.
+# The 50m tifs are no longer needed for combining with the chloride data, data_to_csv.py joins
+# the 100m tifs directly with the 50m chloride grid (see VoxelCube.calcWindow). They are still
+# written by default (RESAMPLE50M) for other applications.
 #
 # Run unther Ubuntu because of compression.
 #
@@ -14,8 +16,15 @@
 import glob
 import os
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor,as_completed
 
+import numpy as np
+import osgeo.gdal as gd
+
+import Instrumentation as IN
 import RasterUtils as RU
+from Manifest import Manifest
 
 #---------------------------------------------------------------------------------------------------
 def main():
@@ -29,6 +38,24 @@ def main():
   #VRT = True
   VRT = False
   CLEANUP = True
+  # If True, the conversion is done with the GDAL Python bindings instead of the GDAL tools.
+  INPROCESS = False
+  #INPROCESS = True
+  # Nr. of files which are converted at the same time.
+  NRWORKERS = 1
+  # Total GDAL cache size (MB), divided over the workers.
+  CACHEMAX = 2048
+  # If True, files which are unchanged since the last run are skipped.
+  INCREMENTAL = False
+  # If True, the time and memory per step are measured and shown. If TRACEFILE is set (.json or
+  # .csv), the measurements are also written to this file.
+  INSTRUMENT = False
+  TRACEFILE = None
+  # If True, also the resampled 50m tifs are written. data_to_csv.py no longer needs them, but
+  # other applications may.
+  RESAMPLE50M = True
+  # If True, the written tifs are compared block by block with the .asc file.
+  VERIFY = False
 
   if UX:
     fromDir = r"/Data/freshem/suitextraction"
@@ -41,7 +68,9 @@ def main():
     print("Directory not found: %s" % fromDir)
   if not os.path.isdir(toDir100m):
     print("Directory not found: %s" % toDir100m)
-  if not os.path.isdir(toDir50m):
+  if not RESAMPLE50M:
+    toDir50m = None
+  elif not os.path.isdir(toDir50m):
     print("Directory not found: %s" % toDir50m)
 
   print("fromDir  : %s" % fromDir)
@@ -56,130 +85,32 @@ def main():
     print("No files found.")
     return
 
-  maxFileNames = -1
-  cntFileNames = 0
-  for fileName in fileNames:
+  manifest = None
+  if INCREMENTAL:
+    manifest = Manifest(os.path.join(toDir100m,"conv_suit_extraction_manifest.json"))
 
-    fromFileName = os.path.basename(fileName)
-    print("Processing: %s" % fromFileName)
-
-    # Use new filenames:
-    #   From:
-    #     ASC_Suitability_extraction_boven_25cm.asc
-    #     ASC_Suitability_extraction_onder_75cm
-    #   To:
-    #     suit_extracttion_25.asc
-    #     suit_extracttion_-75.asc
-    newFileName = "suit_extracttion_"
-    if fromFileName.find("_boven_") > 0:
-      postfix = RU.strAfter(fromFileName,"_boven_")
-    elif fromFileName.find("_onder_") > 0:
-      postfix = "-" + RU.strAfter(fromFileName,"_onder_")
-    else:
-      print("Invalid filename: %s" % fromFileName)
-      return
-    postfix = postfix.replace("cm.",".")
-    newFileName = newFileName + postfix
-
-    # Set (temporary) filenames.
-    srsFileName = newFileName.replace(".asc","_srs.tif")
-    extentFileName = newFileName.replace(".asc","_ext.tif")
-    compressFileName = newFileName.replace(".asc",".tif")
-    resampFileName = newFileName.replace(".asc","_resamp.tif")
-    compressFileName2 = newFileName.replace(".asc",".tif")
-
-    # Set full filenames.
-    fromFileName = os.path.join(fromDir,fromFileName)
-    srsFileName = os.path.join(toDir100m,srsFileName)
-    extentFileName = os.path.join(toDir100m,extentFileName)
-    compressFileName = os.path.join(toDir100m,compressFileName)
+  maxFileNames = -1
 
-    resampFileName = os.path.join(toDir50m,resampFileName)
-    compressFileName2 = os.path.join(toDir50m,compressFileName2)
+  if INSTRUMENT:
+    IN.start(TRACEFILE)
 
-    if VRT:
-      # For testing.
-      srsFileName = srsFileName.replace(".tif",".vrt")
-      extentFileName = extentFileName.replace(".tif",".vrt")
-      compressFileName = compressFileName.replace(".tif",".vrt")
-      resampFileName = resampFileName.replace(".tif",".vrt")
-      compressFileName2 = compressFileName2.replace(".tif",".vrt")
+  if NRWORKERS > 1:
+    if maxFileNames > 0:
+      fileNames = fileNames[:maxFileNames]
+    setGdalThreads(NRWORKERS,CACHEMAX)
+    convertFiles(fileNames,toDir100m,toDir50m,VRT,INPROCESS,NRWORKERS,manifest,VERIFY)
+    fileNames = []
 
-    #--------------------------------------------------------
-    # Set SRS.
-    #--------------------------------------------------------
-    if (os.path.isfile(srsFileName)):
-      os.remove(srsFileName)
-    setSRS(fromFileName,srsFileName)
+  cntFileNames = 0
+  for fileName in fileNames:
 
-    #--------------------------------------------------------
-    # Align extent.
-    #--------------------------------------------------------
-    raster = RU.readRaster(srsFileName)
-    newExtent = RU.alignExtent(raster.extent,raster.cellSize)
-    if maxFileNames == 1:
-      print("  cellSize     : %s" % raster.cellSize)
-      print("  extent       : %s" % raster.extent)
-      print("  new extent   : %s" % newExtent)
-
-    if (os.path.isfile(extentFileName)):
-      os.remove(extentFileName)
-    alignExtent(srsFileName,extentFileName,newExtent)
-
-    #--------------------------------------------------------
-    # Compress.
-    #--------------------------------------------------------
-    if (os.path.isfile(compressFileName)):
-      os.remove(compressFileName)
-    compress(extentFileName,compressFileName)
-
-    #--------------------------------------------------------
-    # Add overview.
-    #--------------------------------------------------------
-    addOverview(compressFileName)
-
-    #--------------------------------------------------------
-    # Check.
-    #--------------------------------------------------------
-    if maxFileNames == 1:
-      print()
-      print("####### %s" % compressFileName)
-      print()
-      rasterInfo(compressFileName)
-      print()
-
-    #--------------------------------------------------------
-    # Resample 50m.
-    #--------------------------------------------------------
-
-    if (os.path.isfile(resampFileName)):
-      os.remove(resampFileName)
-    resample(compressFileName,resampFileName,50)
-
-    #--------------------------------------------------------
-    # Compress.
-    #--------------------------------------------------------
-    if (os.path.isfile(compressFileName2)):
-      os.remove(compressFileName2)
-    compress(resampFileName,compressFileName2)
-
-    #--------------------------------------------------------
-    # Add overview.
-    #--------------------------------------------------------
-    addOverview(compressFileName2)
-
-    #--------------------------------------------------------
-    # Check.
-    #--------------------------------------------------------
-    if maxFileNames == 1:
-      print()
-      print("####### %s" % compressFileName2)
-      print()
-      rasterInfo(compressFileName2)
-      print()
+    if not convertFile(fileName,toDir100m,toDir50m,VRT,INPROCESS,maxFileNames == 1,manifest,VERIFY):
+      IN.stop()
+      return
 
     # Early stop?
     cntFileNames += 1
+    IN.progress("files",cntFileNames,len(fileNames))
     if (maxFileNames > 0) and (maxFileNames == cntFileNames):
       print("### Early stop!")
       break
@@ -189,13 +120,332 @@ def main():
     patterns = ["*_srs.tif","*_ext.tif"]
     cleanup(toDir100m,patterns,VRT)
 
-    patterns = ["*_resamp.tif"]
-    cleanup(toDir50m,patterns,VRT)
+    if toDir50m is not None:
+      patterns = ["*_resamp.tif"]
+      cleanup(toDir50m,patterns,VRT)
+
+  IN.stop()
+
+
+#---------------------------------------------------------------------------------------------------
+# Divides the cores and the GDAL cache over the workers, so the workers do not oversubscribe the
+# cores. Used for the GDAL tools (environment) and the GDAL Python bindings (config options).
+def setGdalThreads(nrWorkers,cacheMax):
+  global gdalEnv
+  nrThreads = max((os.cpu_count() or 1) // nrWorkers,1)
+  cacheMaxWorker = max(cacheMax // nrWorkers,16)
+  print("GDAL threads per worker: %s" % nrThreads)
+  print("GDAL cache per worker  : %s MB" % cacheMaxWorker)
+  print()
+  gdalEnv = os.environ.copy()
+  gdalEnv["GDAL_NUM_THREADS"] = str(nrThreads)
+  gdalEnv["GDAL_CACHEMAX"] = str(cacheMaxWorker)
+  # The bindings share the cache of the process.
+  gd.SetConfigOption("GDAL_NUM_THREADS",str(nrThreads))
+  gd.SetCacheMax(cacheMax * 1024 * 1024)
+
+#---------------------------------------------------------------------------------------------------
+# Converts the files with nrWorkers files at the same time.
+def convertFiles(fileNames,toDir100m,toDir50m,VRT,INPROCESS,nrWorkers,manifest=None,verify=False):
+
+  #---------------------------------------------------------------------------------------------------
+  def convert(fileName):
+    startTime = time.time()
+    try:
+      if convertFile(fileName,toDir100m,toDir50m,VRT,INPROCESS,False,manifest,verify):
+        status = "Ready"
+      else:
+        status = "Skipped"
+    except Exception as ex:
+      status = "Failed (%s)" % ex
+    return (fileName,status,time.time() - startTime)
+
+  cnt = 0
+  with ThreadPoolExecutor(max_workers=nrWorkers) as executor:
+    futures = [executor.submit(convert,fileName) for fileName in fileNames]
+    for future in as_completed(futures):
+      fileName,status,duration = future.result()
+      cnt += 1
+      print("[%s/%s] %s: %s (%.1f s)" % (cnt,len(fileNames),status,os.path.basename(fileName),duration))
+      IN.progress("files",cnt,len(fileNames))
+
+#---------------------------------------------------------------------------------------------------
+# Converts a .asc file to a 100m and 50m tif. If toDir50m is None, only the 100m tif is written.
+# Returns False if the filename is invalid. If a manifest is given, the file is skipped when it is unchanged since the last conversion.
+# If verify, the written tifs are compared with the .asc file (see verifyFile).
+def convertFile(fileName,toDir100m,toDir50m,VRT,INPROCESS,showInfo,manifest=None,verify=False) -> bool:
+
+  fromFileName = os.path.basename(fileName)
+  print("Processing: %s" % fromFileName)
+
+  # Use new filenames:
+  #   From:
+  #     ASC_Suitability_extraction_boven_25cm.asc
+  #     ASC_Suitability_extraction_onder_75cm
+  #   To:
+  #     suit_extracttion_25.asc
+  #     suit_extracttion_-75.asc
+  newFileName = "suit_extracttion_"
+  if fromFileName.find("_boven_") > 0:
+    postfix = RU.strAfter(fromFileName,"_boven_")
+  elif fromFileName.find("_onder_") > 0:
+    postfix = "-" + RU.strAfter(fromFileName,"_onder_")
+  else:
+    print("Invalid filename: %s" % fromFileName)
+    return False
+  postfix = postfix.replace("cm.",".")
+  newFileName = newFileName + postfix
+
+  # Set (temporary) filenames.
+  srsFileName = newFileName.replace(".asc","_srs.tif")
+  extentFileName = newFileName.replace(".asc","_ext.tif")
+  compressFileName = newFileName.replace(".asc",".tif")
+  resampFileName = newFileName.replace(".asc","_resamp.tif")
+  compressFileName2 = newFileName.replace(".asc",".tif")
+
+  # Set full filenames.
+  fromFileName = fileName
+  srsFileName = os.path.join(toDir100m,srsFileName)
+  extentFileName = os.path.join(toDir100m,extentFileName)
+  compressFileName = os.path.join(toDir100m,compressFileName)
+
+  if toDir50m is not None:
+    resampFileName = os.path.join(toDir50m,resampFileName)
+    compressFileName2 = os.path.join(toDir50m,compressFileName2)
+  else:
+    resampFileName = None
+    compressFileName2 = None
+
+  if VRT:
+    # For testing.
+    srsFileName = srsFileName.replace(".tif",".vrt")
+    extentFileName = extentFileName.replace(".tif",".vrt")
+    compressFileName = compressFileName.replace(".tif",".vrt")
+    if toDir50m is not None:
+      resampFileName = resampFileName.replace(".tif",".vrt")
+      compressFileName2 = compressFileName2.replace(".tif",".vrt")
+
+  # Unchanged?
+  outputs = [compressFileName]
+  if toDir50m is not None:
+    outputs.append(compressFileName2)
+  params = {"inprocess": INPROCESS and not VRT,"vrt": VRT,"resample50m": toDir50m is not None}
+  if manifest is not None:
+    if manifest.isUpToDate(fromFileName,[fromFileName],outputs,params):
+      print("Up to date: %s" % os.path.basename(fromFileName))
+      return True
+
+  IN.count("files")
+  IN.count("inputBytes",os.path.getsize(fromFileName))
+
+  if INPROCESS and not VRT:
+    with IN.span("convert",file=os.path.basename(fromFileName)):
+      convertFileInProcess(fromFileName,compressFileName,compressFileName2)
+    if verify:
+      verifyFiles(fromFileName,outputs)
+    if showInfo:
+      for fileName in outputs:
+        rasterInfo(fileName)
+    if manifest is not None:
+      manifest.record(fromFileName,[fromFileName],outputs,params)
+    return True
+
+  #--------------------------------------------------------
+  # Set SRS.
+  #--------------------------------------------------------
+  if (os.path.isfile(srsFileName)):
+    os.remove(srsFileName)
+  setSRS(fromFileName,srsFileName)
+
+  #--------------------------------------------------------
+  # Align extent.
+  #--------------------------------------------------------
+  raster = RU.readRaster(srsFileName)
+  newExtent = RU.alignExtent(raster.extent,raster.cellSize)
+  if showInfo:
+    print("  cellSize     : %s" % raster.cellSize)
+    print("  extent       : %s" % raster.extent)
+    print("  new extent   : %s" % newExtent)
+
+  if (os.path.isfile(extentFileName)):
+    os.remove(extentFileName)
+  alignExtent(srsFileName,extentFileName,newExtent)
+
+  #--------------------------------------------------------
+  # Compress.
+  #--------------------------------------------------------
+  if (os.path.isfile(compressFileName)):
+    os.remove(compressFileName)
+  compress(extentFileName,compressFileName)
+
+  #--------------------------------------------------------
+  # Add overview.
+  #--------------------------------------------------------
+  addOverview(compressFileName)
+
+  #--------------------------------------------------------
+  # Check.
+  #--------------------------------------------------------
+  if showInfo:
+    print()
+    print("####### %s" % compressFileName)
+    print()
+    rasterInfo(compressFileName)
+    print()
+
+  if toDir50m is None:
+    if verify and not VRT:
+      verifyFiles(fromFileName,outputs)
+    if (manifest is not None) and all([os.path.isfile(fileName) for fileName in outputs]):
+      manifest.record(fromFileName,[fromFileName],outputs,params)
+    return True
+
+  #--------------------------------------------------------
+  # Resample 50m.
+  #--------------------------------------------------------
+
+  if (os.path.isfile(resampFileName)):
+    os.remove(resampFileName)
+  resample(compressFileName,resampFileName,50)
+
+  #--------------------------------------------------------
+  # Compress.
+  #--------------------------------------------------------
+  if (os.path.isfile(compressFileName2)):
+    os.remove(compressFileName2)
+  compress(resampFileName,compressFileName2)
+
+  #--------------------------------------------------------
+  # Add overview.
+  #--------------------------------------------------------
+  addOverview(compressFileName2)
+
+  #--------------------------------------------------------
+  # Check.
+  #--------------------------------------------------------
+  if showInfo:
+    print()
+    print("####### %s" % compressFileName2)
+    print()
+    rasterInfo(compressFileName2)
+    print()
+
+  if verify and not VRT:
+    verifyFiles(fromFileName,outputs)
+
+  if (manifest is not None) and all([os.path.isfile(fileName) for fileName in outputs]):
+    manifest.record(fromFileName,[fromFileName],outputs,params)
+
+  return True
 
+#---------------------------------------------------------------------------------------------------
+# Runs gd.Translate and returns the dataset. Without gd.UseExceptions (not enabled, because it
+# would change the other scripts in the same process) GDAL returns None on an error.
+def translate(toFileName,fromDataset,**options) -> any:
+  dataset = gd.Translate(toFileName,fromDataset,**options)
+  if dataset is None:
+    raise Exception("Translate failed: %s (%s)" % (toFileName,gd.GetLastErrorMsg()))
+  return dataset
+
+#---------------------------------------------------------------------------------------------------
+# Runs gd.Warp and returns the dataset (see translate).
+def warp(toFileName,fromDataset,**options) -> any:
+  dataset = gd.Warp(toFileName,fromDataset,**options)
+  if dataset is None:
+    raise Exception("Warp failed: %s (%s)" % (toFileName,gd.GetLastErrorMsg()))
+  return dataset
+
+#---------------------------------------------------------------------------------------------------
+# Converts a .asc file to a 100m and 50m tif with the GDAL Python bindings. The steps are the
+# same as those of the GDAL tools (gdalwarp, gdal_translate -a_ullr, gdal_translate -tr and
+# gdaladdo), so the tifs are the same. The intermediate (SRS and extent) rasters are in-memory
+# VRTs, only the compressed tifs are written to disk. If compressFileName2 is None, the 50m tif is
+# not written. After an error the written tifs are removed.
+def convertFileInProcess(fromFileName,compressFileName,compressFileName2):
+  memName = "/vsimem/%s" % os.path.basename(compressFileName)
+  srsFileName = memName.replace(".tif","_srs.vrt")
+  extentFileName = memName.replace(".tif","_ext.vrt")
+  creationOptions = ["TILED=YES","BLOCKXSIZE=512","BLOCKYSIZE=512","COMPRESS=DEFLATE"]
+  overviewLevels = [2,4,8,16,32,64,128]
+
+  srsDataset = None
+  extentDataset = None
+  fileNames = []
+  try:
+    # Set SRS.
+    with IN.span("setSRS"):
+      srsDataset = warp(srsFileName,fromFileName,format="VRT",srcSRS="EPSG:28992",dstSRS="EPSG:28992")
+
+    # Align extent.
+    extent = RU.calcExtentFromGT(srsDataset.GetGeoTransform(),srsDataset.RasterXSize,srsDataset.RasterYSize)
+    cellSize = srsDataset.GetGeoTransform()[1]
+    x1,y1,x2,y2 = RU.alignExtent(extent,cellSize)
+    extentDataset = translate(extentFileName,srsDataset,format="VRT",outputBounds=[x1,y2,x2,y1])
+
+    # Compress and add overview.
+    for fileName,newCellSize in [(compressFileName,None),(compressFileName2,50)]:
+      if fileName is None:
+        continue
+      if os.path.isfile(fileName):
+        os.remove(fileName)
+      fileNames.append(fileName)
+      with IN.span("compress"):
+        if newCellSize is None:
+          dataset = translate(fileName,extentDataset,format="GTiff",creationOptions=creationOptions)
+        else:
+          # Resample.
+          dataset = translate(fileName,extentDataset,format="GTiff",creationOptions=creationOptions,
+                              xRes=newCellSize,yRes=newCellSize)
+      with IN.span("addOverview"):
+        if dataset.BuildOverviews("NEAREST",overviewLevels) != 0:
+          raise Exception("BuildOverviews failed: %s (%s)" % (fileName,gd.GetLastErrorMsg()))
+        dataset.FlushCache()
+      del dataset
+      IN.count("outputBytes",os.path.getsize(fileName))
+    fileNames = []
+  finally:
+    # Remove the (partly) written tifs after an error.
+    for fileName in fileNames:
+      if os.path.isfile(fileName):
+        os.remove(fileName)
+    del extentDataset
+    del srsDataset
+    gd.Unlink(extentFileName)
+    gd.Unlink(srsFileName)
+
+#---------------------------------------------------------------------------------------------------
+# Compares the converted tifs block by block with the .asc file. The extent is only moved to the
+# grid (the cells are not changed) and the 50m tif is resampled with nearest, so each cell must
+# equal the .asc cell which contains it. Raises if a tif differs.
+def verifyFiles(fromFileName,fileNames):
+  source = RU.readRaster(fromFileName)
+  if source is None:
+    raise Exception("Raster not found: %s" % fromFileName)
+  for fileName in fileNames:
+    with IN.span("verify"):
+      info = RU.readRasterInfo(fileName)
+      if info is None:
+        raise Exception("Raster not found: %s" % fileName)
+      factor = int(round(source.cellSize / info.cellSize))
+      if (info.nrCols != source.nrCols * factor) or (info.nrRows != source.nrRows * factor):
+        raise Exception("Verification failed: %s (size %sx%s)" % (fileName,info.nrCols,info.nrRows))
+      for col,row,values in RU.iterRasterBlocks(fileName):
+        rows = np.arange(row,row + values.shape[0]) // factor
+        cols = np.arange(col,col + values.shape[1]) // factor
+        expected = source.raster[np.ix_(rows,cols)]
+        if not np.array_equal(values,expected,equal_nan=(values.dtype.kind == "f")):
+          raise Exception("Verification failed: %s (block %s,%s)" % (fileName,col,row))
+  print("Verified: %s" % os.path.basename(fromFileName))
+
+#---------------------------------------------------------------------------------------------------
+# Environment of the GDAL tools (None is the current environment).
+gdalEnv = None
 
 #---------------------------------------------------------------------------------------------------
 def execCmd(cmd: str,cwd=None) -> str:
-  result = subprocess.Popen(cmd,shell=True,stdout=subprocess.PIPE,cwd=cwd).stdout.read()
+  # The span is named after the GDAL tool.
+  with IN.span(cmd.split()[0]):
+    result = subprocess.Popen(cmd,shell=True,stdout=subprocess.PIPE,cwd=cwd,env=gdalEnv).stdout.read()
   if not result is None:
     result = result.decode("utf-8")
   else:
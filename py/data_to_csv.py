@@ -1,7 +1,8 @@
 #---------------------------------------------------------------------------------------------------
-# Converts chloride and suit_extraction points to a csv file.
+# Converts chloride and suit_extraction points to a csv file (or parquet, GeoPackage or
+# PostgreSQL binary COPY file).
 #
-# Needs 16-28 GB memory!
+# Needs about 4-5 GB memory.
 #
 # Run:
 #   activate <conda env>
@@ -14,32 +15,36 @@
 #---------------------------------------------------------------------------------------------------
 
 import os
+import shutil
 
 import numpy as np
 import traceback
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor,ThreadPoolExecutor
 
+import Instrumentation as IN
 import RasterUtils as RU
+from RasterCatalog import RasterCatalog
+import PointWriters as PW
+from Manifest import Manifest
+from ProfilePyramid import writeProfilePyramid
+from ProfileStore import writeProfileStore
+from VoxelCube import VoxelCube
+from VoxelStore import writeVoxelStore
 
 #---------------------------------------------------------------------------------------------------
-class Data():
-  #---------------------------------------------------------------------------------------------------
-  def __init__(self,x: float,y: float,z: float):
-    self.x = x
-    self.y = y
-    self.z = z
-    self.laag = 0.0
-    self.midden = 0.0
-    self.hoog = 0.0
-    self.suit_extraction = 0.0
-
-#---------------------------------------------------------------------------------------------------
-class Point():
-  #---------------------------------------------------------------------------------------------------
-  def __init__(self,x: float,y: float,z: float, value: float):
-    self.x = x
-    self.y = y
-    self.z = z
-    self.value = value
+# Reads a raster and returns its codes within the cube (see VoxelCube.encodeRaster) or None. Job is
+# a tuple of rasterName, extent, valueName and the extent and cell size of the cube. Used by the
+# worker processes, which return the compact codes instead of the raster.
+def encodeRasterJob(job: tuple) -> any:
+  rasterName,extent,valueName,cubeExtent,cellSize = job
+  raster = RU.readRasterJob((rasterName,extent))
+  if raster is None:
+    return None
+  # A cube without z-levels, only for the grid and the encodings.
+  return VoxelCube(cubeExtent,cellSize,[]).encodeRaster(raster,valueName)
 
 #---------------------------------------------------------------------------------------------------
 #---------------------------------------------------------------------------------------------------
@@ -47,45 +52,54 @@ class DataToCsv():
 
   test = False
 
-  #---------------------------------------------------------------------------------------------------
-  def convertRasterToPoint(self,raster: RU.Raster,z: float) -> dict:
-    pointDict = dict()
-    hCellSize = int(raster.cellSize / 2)
-    y = int(raster.extent[3]) - hCellSize
-    for r in np.arange(0,raster.nrRows):
-      x = int(raster.extent[0]) + hCellSize
-      for c in np.arange(0,raster.nrCols):
-        v = raster.raster[r,c]
-        if v != raster.noDataValue:
-          key = "%.0f_%.0f_%.2f" % (x,y,z)
-          pointDict[key] = Point(x,y,z,v)
-        x += raster.cellSize
-      y -= raster.cellSize
-    return pointDict
-
-  #---------------------------------------------------------------------------------------------------
-  # Voegt ook nieuwe punten toe.
-  def mergeRasterData(self,dataDict: dict,pointDict: dict,valueName: str):
-    for key,pointData in pointDict.items():
-      if not key in dataDict:
-        data = Data(pointData.x,pointData.y,pointData.z)
-        dataDict[key] = data
-      setattr(dataDict[key],valueName,pointData.value)
+  # If > 0, the rasters are read and written in bands of bandRows rows (streaming mode).
+  bandRows = 0
+
+  # If > 1, the rasters are read and encoded by a pool of nrWorkers processes. At most 2 rasters
+  # per worker are pending, to limit the memory.
+  nrWorkers = 1
+
+  # If True, every z-level is written to a separate part file and the parts are concatenated.
+  # A manifest keeps track of the parts, so a rerun only rebuilds the z-levels of which the
+  # rasters are changed (or which were not ready when a previous run crashed). Only for the
+  # export mode "points" and the output format "csv".
+  resume = False
+
+  # Export mode: "points" (one row per voxel), "profiles" (one row per cell column, csv only),
+  # "store" (memory-mapped profile store, see ProfileStore.py; not in the band mode) or "voxels"
+  # (chunked 3D voxel store, see VoxelStore.py; not in the band mode).
+  exportMode = "points"
+
+  # Coarser levels (factor,zFactor) which are written next to the profile store (export mode
+  # "store", see ProfilePyramid.py), [] is no pyramid. Chloride is aggregated with pyramidMethod
+  # ("max" or "mode").
+  pyramidLevels = [(2,2),(4,4),(8,4)]
+  pyramidMethod = "max"
+
+  # Output format: "csv", "parquet", "gpkg" or "pgcopy" (PostgreSQL binary COPY).
+  outputFormat = "csv"
+
+  # Compression of the csv or parquet file: None, "gzip" or "zstd".
+  compression = None
+
+  # If True, the time and memory per stage (read, merge, join, write) are measured and shown
+  # together with the progress. If traceFileName is set (.json or .csv), the measurements are
+  # also written to this file.
+  instrument = False
+  traceFileName = None
+
+  # If True, the rasters are read, converted and written in a pipeline: nrReaders threads read the
+  # rasters (GDAL releases the GIL), the main thread merges them and converts them to columns and
+  # one writer thread writes the columns. The stages are connected by bounded queues of
+  # pipelineDepth units (a z-level of a band or, for the export mode "profiles", all z-levels of a
+  # band), so the reading, conversion and writing overlap while the memory stays limited. The
+  # output is the same as without the pipeline. Only for the export modes "points" and "profiles".
+  pipeline = False
+  nrReaders = 4
+  pipelineDepth = 2
 
   #---------------------------------------------------------------------------------------------------
-  # Voegt geen nieuwe punten toe.
-  def joinRasterData(self,dataDict: dict,pointDict: dict,valueName: str):
-    for key,pointData in pointDict.items():
-      if not key in dataDict:
-        continue
-      setattr(dataDict[key],valueName,pointData.value)
-
-  #---------------------------------------------------------------------------------------------------
-  def readRasters(self,chlorideDir,suit_extractionDir) -> any:
-    dataDict = dict()
-    skipped = []
-
-    # Fill z values.
+  def getZValues(self) -> list:
     zValues = []
     zDelta = 0.5
     zStart = -49.75
@@ -104,9 +118,42 @@ class DataToCsv():
       if len(zValues) > 1000:
         print("Early stop")
         break
+    return zValues
 
-    print("Z-values: ")
-    print(zValues)
+  #---------------------------------------------------------------------------------------------------
+  # Returns the z value as used in the raster names, i.e. -12.25 -> -1225.
+  def getZName(self,zValue) -> str:
+    if abs(zValue) < 1:
+      return str(zValue).replace("0.","")
+    else:
+      return str(zValue).replace(".","")
+
+  #---------------------------------------------------------------------------------------------------
+  # chloride_midden_-1225.asc
+  def getChlorideRasterName(self,chlorideType,zValue) -> str:
+    return "chloride_%s_%s.asc" % (chlorideType,self.getZName(zValue))
+
+  #---------------------------------------------------------------------------------------------------
+  # ASC_Suitability_extraction_boven_2375cm.tif
+  def getSuitRasterName(self,zValue) -> str:
+    zName = self.getZName(zValue)
+    if zValue < 0:
+      zName = zName.replace("-","")
+      zName = "onder_%scm" % zName
+    else:
+      zName = "boven_%scm" % zName
+    return "ASC_Suitability_extraction_%s.tif" % zName
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns a list of (valueName,zIndex,rasterName) per raster and the list of skipped rasters.
+  # The directories are scanned once with a raster catalog, which also keeps the raster headers.
+  def findRasters(self,chlorideDir,suit_extractionDir,zValues) -> any:
+    chlorideRasters = []
+    suitRasters = []
+    skipped = []
+
+    self.chlorideCatalog = RasterCatalog(chlorideDir)
+    self.suitCatalog = RasterCatalog(suit_extractionDir)
 
     #-----------------------------------------------------------------
     # Chloridegehalte
@@ -116,73 +163,353 @@ class DataToCsv():
     for chlorideType in chlorideTypes:
       for i in range(len(zValues)):
         zValue = zValues[i]
-        print("Processing %s,%s..." % (chlorideType,zValue))
-        if abs(zValue) < 1:
-          zName = str(zValue).replace("0.","")
-        else:
-          zName = str(zValue).replace(".","")
-        rasterName = "chloride_%s_%s.asc" % (chlorideType,zName)
-        rasterName = os.path.join(chlorideDir,rasterName)
-        if not os.path.isfile(rasterName):
+        rasterName = self.chlorideCatalog.find("chloride",chlorideType,zValue)
+        if rasterName is None:
+          rasterName = os.path.join(chlorideDir,self.getChlorideRasterName(chlorideType,zValue))
           print("Raster not found: %s" % rasterName)
           skipped.append(rasterName)
           continue
-
-        # Read raster.
-        raster = RU.readRaster(rasterName)
-        # Convert to points.
-        rasterDict = self.convertRasterToPoint(raster,zValue)
-        # Merge with data.
-        self.mergeRasterData(dataDict,rasterDict,chlorideType)
+        chlorideRasters.append((chlorideType,i,rasterName))
 
     #-----------------------------------------------------------------
     # Doorlatendheid
     #-----------------------------------------------------------------
 
-    # ASC_Suitability_extraction_boven_2375cm.tif
     for i in range(len(zValues)):
       zValue = zValues[i]
-      print("Processing %s..." % zValue)
-      if abs(zValue) < 1:
-        zName = str(zValue).replace("0.","")
-      else:
-        zName = str(zValue).replace(".","")
-      if zValue < 0:
-        zName = zName.replace("-","")
-        zName = "onder_%scm" % zName
-      else:
-        zName = "boven_%scm" % zName
-      rasterName = "ASC_Suitability_extraction_%s.tif" % zName
-      rasterName = os.path.join(suit_extractionDir,rasterName)
-      if not os.path.isfile(rasterName):
+      rasterName = self.suitCatalog.find("suit_extraction","",zValue)
+      if rasterName is None:
+        rasterName = os.path.join(suit_extractionDir,self.getSuitRasterName(zValue))
         print("Raster not found: %s" % rasterName)
         skipped.append(rasterName)
         continue
-      # Read raster.
-      raster = RU.readRaster(rasterName)
-      # Convert to points.
-      rasterDict = self.convertRasterToPoint(raster,zValue)
-      # Join with data.
-      self.joinRasterData(dataDict,rasterDict,"suit_extraction")
+      suitRasters.append(("suit_extraction",i,rasterName))
+
+    return (chlorideRasters,suitRasters,skipped)
+
+  #---------------------------------------------------------------------------------------------------
+  def createExecutor(self) -> any:
+    if self.nrWorkers > 1:
+      return ProcessPoolExecutor(max_workers=self.nrWorkers)
+    return None
+
+  #---------------------------------------------------------------------------------------------------
+  # Reads the rasters (or the part within the extent) and merges/joins them with the cube.
+  # The rasters are processed in the given order, also when read by the worker processes. The
+  # workers return the codes of the rasters (see encodeRasterJob).
+  # If rasters is given (an iterable with the rasters in the same order), the rasters are not read.
+  def loadRasters(self,cube: VoxelCube,executor,chlorideRasters,suitRasters,extent=None,rasters=None):
+    rasterList = chlorideRasters + suitRasters
+    if rasters is None:
+      if executor is None:
+        rasters = map(RU.readRasterJob,[(rasterName,extent) for _,_,rasterName in rasterList])
+      else:
+        jobs = [(rasterName,extent,valueName,cube.extent,cube.cellSize) for valueName,_,rasterName in rasterList]
+        rasters = self.iterSubmitted(executor,encodeRasterJob,jobs)
+
+    rasters = iter(rasters)
+    for i in range(len(rasterList)):
+      valueName,zIndex,rasterName = rasterList[i]
+      # With worker processes this is the time waiting for the codes of the raster.
+      with IN.span("read"):
+        raster = next(rasters)
+      if i < len(chlorideRasters):
+        if extent is None:
+          print("Processing %s,%s..." % (valueName,cube.zValues[zIndex]))
+        if raster is not None:
+          # Merge with data.
+          with IN.span("merge"):
+            if executor is None:
+              cube.mergeRasterData(raster,zIndex,valueName)
+            else:
+              cube.mergeCodes(raster,zIndex,valueName)
+      else:
+        if extent is None:
+          print("Processing %s..." % cube.zValues[zIndex])
+        if raster is not None:
+          # Join with data.
+          with IN.span("join"):
+            if executor is None:
+              cube.joinRasterData(raster,zIndex,valueName)
+            else:
+              cube.joinCodes(raster,zIndex,valueName)
+      IN.count("rasters")
+      if extent is None:
+        IN.progress("rasters",i + 1,len(rasterList))
+
+  #---------------------------------------------------------------------------------------------------
+  # Yields the results of the jobs in order. At most 2 jobs per worker are pending, so the results
+  # do not pile up when the merging is slower than the workers.
+  def iterSubmitted(self,executor,func,jobs: list):
+    pending = deque()
+    nextJob = 0
+    while (nextJob < len(jobs)) or (len(pending) > 0):
+      while (nextJob < len(jobs)) and (len(pending) < 2 * self.nrWorkers):
+        pending.append(executor.submit(func,jobs[nextJob]))
+        nextJob += 1
+      yield pending.popleft().result()
+
+  #---------------------------------------------------------------------------------------------------
+  def readRasters(self,chlorideDir,suit_extractionDir) -> any:
+
+    # Fill z values.
+    zValues = self.getZValues()
+
+    print("Z-values: ")
+    print(zValues)
+
+    chlorideRasters,suitRasters,skipped = self.findRasters(chlorideDir,suit_extractionDir,zValues)
+
+    # Create the cube with the extent of all chloride rasters.
+    rasterInfos = [self.chlorideCatalog.getInfo(rasterName) for _,_,rasterName in chlorideRasters]
+    cube = VoxelCube.fromRasters(rasterInfos,zValues)
+
+    executor = self.createExecutor()
+    try:
+      self.loadRasters(cube,executor,chlorideRasters,suitRasters)
+    finally:
+      if executor is not None:
+        executor.shutdown()
+
+    return (cube,skipped)
+
+  #---------------------------------------------------------------------------------------------------
+  # Reads the rasters and writes the output band by band, so only one band is kept in memory.
+  # Returns the number of points, the number of points with all data and the skipped rasters.
+  def exportBands(self,chlorideDir,suit_extractionDir,fileName) -> any:
+
+    # Fill z values.
+    zValues = self.getZValues()
+
+    print("Z-values: ")
+    print(zValues)
+
+    chlorideRasters,suitRasters,skipped = self.findRasters(chlorideDir,suit_extractionDir,zValues)
+
+    # Get the extent of all chloride rasters.
+    rasterInfos = [self.chlorideCatalog.getInfo(rasterName) for _,_,rasterName in chlorideRasters]
+    extent,cellSize = VoxelCube.calcExtent(rasterInfos)
+    bandExtents = VoxelCube.calcBandExtents(extent,cellSize,self.bandRows)
+
+    nrPoints = 0
+    nrPointsAllData = 0
+    executor = self.createExecutor()
+    try:
+      with self.createWriter(fileName) as writer:
+        for i in range(len(bandExtents)):
+          bandExtent = bandExtents[i]
+          print("Processing band %s of %s..." % (i+1,len(bandExtents)))
+          cube = VoxelCube(bandExtent,cellSize,zValues)
+          self.loadRasters(cube,executor,chlorideRasters,suitRasters,bandExtent)
+          self.writeCube(writer,cube)
+          nrPoints += cube.getNrPoints()
+          nrPointsAllData += self.countPointsWithAllData(cube)
+          del cube
+          IN.progress("bands",i + 1,len(bandExtents))
+    finally:
+      if executor is not None:
+        executor.shutdown()
+
+    return (nrPoints,nrPointsAllData,skipped)
+
+  #---------------------------------------------------------------------------------------------------
+  # Reads the rasters and writes the output z-level by z-level to part files, which are
+  # concatenated to the output file. Unchanged z-levels are skipped.
+  # Returns the number of points, the number of points with all data and the skipped rasters.
+  def exportLevels(self,chlorideDir,suit_extractionDir,fileName) -> any:
+
+    # Fill z values.
+    zValues = self.getZValues()
+
+    print("Z-values: ")
+    print(zValues)
+
+    chlorideRasters,suitRasters,skipped = self.findRasters(chlorideDir,suit_extractionDir,zValues)
+
+    # Get the extent of all chloride rasters.
+    rasterInfos = [self.chlorideCatalog.getInfo(rasterName) for _,_,rasterName in chlorideRasters]
+    extent,cellSize = VoxelCube.calcExtent(rasterInfos)
+
+    partDir = fileName + "_parts"
+    if not os.path.isdir(partDir):
+      os.makedirs(partDir)
+    manifest = Manifest(os.path.join(partDir,"manifest.json"))
+    params = {"extent": extent,"cellSize": cellSize,"compression": self.compression}
+
+    nrPoints = 0
+    nrPointsAllData = 0
+    partFileNames = []
+    executor = self.createExecutor()
+    try:
+      for zIndex in range(len(zValues)):
+        zValue = zValues[zIndex]
+        key = "z_%.2f" % zValue
+        partFileName = os.path.join(partDir,"%s.part" % key)
+        partFileNames.append(partFileName)
+
+        # Rasters of this z-level.
+        levelChlorideRasters = [(valueName,0,rasterName) for valueName,i,rasterName in chlorideRasters if i == zIndex]
+        levelSuitRasters = [(valueName,0,rasterName) for valueName,i,rasterName in suitRasters if i == zIndex]
+        inputs = [rasterName for _,_,rasterName in levelChlorideRasters + levelSuitRasters]
+
+        if manifest.isUpToDate(key,inputs,[partFileName],params):
+          print("Up to date: %s" % zValue)
+          info = manifest.getInfo(key)
+        else:
+          cube = VoxelCube(extent,cellSize,[zValue])
+          self.loadRasters(cube,executor,levelChlorideRasters,levelSuitRasters)
+          with PW.CsvPointWriter(partFileName,self.compression,writeHeader=False) as writer:
+            self.writeCube(writer,cube)
+          info = {"nrPoints": cube.getNrPoints(),"nrPointsAllData": self.countPointsWithAllData(cube)}
+          manifest.record(key,inputs,[partFileName],params,info)
+          del cube
+        nrPoints += info["nrPoints"]
+        nrPointsAllData += info["nrPointsAllData"]
+        IN.progress("levels",zIndex + 1,len(zValues))
+    finally:
+      if executor is not None:
+        executor.shutdown()
+
+    # Concatenate the parts (also valid for gzip and zstd, which allow multiple members/frames).
+    print("Concatenating parts...")
+    with PW.CsvPointWriter(fileName,self.compression):
+      pass
+    with open(fileName,"ab") as f:
+      for partFileName in partFileNames:
+        with open(partFileName,"rb") as fPart:
+          shutil.copyfileobj(fPart,f)
+
+    return (nrPoints,nrPointsAllData,skipped)
+
+  #---------------------------------------------------------------------------------------------------
+  # Writes the items of the queue until None is received. Used by the writer thread of the
+  # pipeline. After an error the remaining items are skipped, so the producer never blocks.
+  def writeQueued(self,fileName,writeQueue: queue.Queue,errors: list):
+    try:
+      with self.createWriter(fileName) as writer:
+        while True:
+          item = writeQueue.get()
+          if item is None:
+            return
+          with IN.span("write"):
+            writer.write(item)
+    except Exception as ex:
+      errors.append(ex)
+      while writeQueue.get() is not None:
+        pass
+
+  #---------------------------------------------------------------------------------------------------
+  # Reads the rasters, converts them and writes the output in a pipeline (see pipeline).
+  # Returns the number of points, the number of points with all data and the skipped rasters.
+  def exportPipelined(self,chlorideDir,suit_extractionDir,fileName) -> any:
+
+    # Fill z values.
+    zValues = self.getZValues()
+
+    print("Z-values: ")
+    print(zValues)
+
+    chlorideRasters,suitRasters,skipped = self.findRasters(chlorideDir,suit_extractionDir,zValues)
+
+    # Get the extent of all chloride rasters.
+    rasterInfos = [self.chlorideCatalog.getInfo(rasterName) for _,_,rasterName in chlorideRasters]
+    extent,cellSize = VoxelCube.calcExtent(rasterInfos)
+    if self.bandRows > 0:
+      bandExtents = VoxelCube.calcBandExtents(extent,cellSize,self.bandRows)
+    else:
+      bandExtents = [extent]
+
+    # The units (extent,zValues,chlorideRasters,suitRasters) of the pipeline, in the output order.
+    units = []
+    for bandExtent in bandExtents:
+      if self.exportMode == "profiles":
+        units.append((bandExtent,zValues,chlorideRasters,suitRasters))
+        continue
+      for zIndex in range(len(zValues)):
+        levelChlorideRasters = [(valueName,0,rasterName) for valueName,i,rasterName in chlorideRasters if i == zIndex]
+        levelSuitRasters = [(valueName,0,rasterName) for valueName,i,rasterName in suitRasters if i == zIndex]
+        units.append((bandExtent,[zValues[zIndex]],levelChlorideRasters,levelSuitRasters))
+
+    nrPoints = 0
+    nrPointsAllData = 0
+    readers = ThreadPoolExecutor(max_workers=self.nrReaders)
+    writeQueue = queue.Queue(maxsize=self.pipelineDepth)
+    writeErrors = []
+    writer = threading.Thread(target=self.writeQueued,args=(fileName,writeQueue,writeErrors),name="writer")
+    writer.start()
+    try:
+      # The rasters of at most pipelineDepth units are read ahead.
+      pending = deque()
+      nextUnit = 0
+      for i in range(len(units)):
+        while (nextUnit < len(units)) and (len(pending) < self.pipelineDepth):
+          unitExtent,_,unitChlorideRasters,unitSuitRasters = units[nextUnit]
+          jobs = [(rasterName,unitExtent) for _,_,rasterName in unitChlorideRasters + unitSuitRasters]
+          pending.append([readers.submit(RU.readRasterJob,job) for job in jobs])
+          nextUnit += 1
+
+        unitExtent,unitZValues,unitChlorideRasters,unitSuitRasters = units[i]
+        print("Processing %s of %s..." % (i + 1,len(units)))
+        cube = VoxelCube(unitExtent,cellSize,unitZValues)
+        rasters = (future.result() for future in pending.popleft())
+        self.loadRasters(cube,None,unitChlorideRasters,unitSuitRasters,unitExtent,rasters)
+        nrPoints += cube.getNrPoints()
+        nrPointsAllData += self.countPointsWithAllData(cube)
+        IN.count("points",cube.getNrPoints())
+        for item in self.iterCubeItems(cube):
+          if len(writeErrors) > 0:
+            raise writeErrors[0]
+          # Blocks when the writer is behind.
+          with IN.span("queue"):
+            writeQueue.put(item)
+        del cube
+        IN.progress("units",i + 1,len(units))
+    finally:
+      writeQueue.put(None)
+      writer.join()
+      readers.shutdown(cancel_futures=True)
+    if len(writeErrors) > 0:
+      raise writeErrors[0]
+
+    return (nrPoints,nrPointsAllData,skipped)
+
+  #---------------------------------------------------------------------------------------------------
+  def countPointsWithAllData(self,cube: VoxelCube) -> int:
+    return int(np.count_nonzero(cube.valid & (cube.getValues("midden") > 0) & (cube.getValues("suit_extraction") > 0)))
 
-    return (dataDict,skipped)
+  #---------------------------------------------------------------------------------------------------
+  def createWriter(self,fileName) -> PW.PointWriter:
+    if self.exportMode == "profiles":
+      return PW.CsvProfileWriter(fileName,self.compression)
+    return PW.createPointWriter(fileName,self.outputFormat,self.compression)
+
+  #---------------------------------------------------------------------------------------------------
+  # Yields the items for the writer: the profiles per 100 rows (export mode "profiles") or the
+  # columns per z-level.
+  def iterCubeItems(self,cube: VoxelCube):
+    if self.exportMode == "profiles":
+      nrRows = 100
+      for row in range(0,cube.nrRows,nrRows):
+        with IN.span("convert"):
+          item = cube.getProfiles(row,min(row + nrRows,cube.nrRows))
+        yield item
+    else:
+      for zIndex in range(len(cube.zValues)):
+        with IN.span("convert"):
+          item = cube.getColumns(zIndex)
+        yield item
 
   #---------------------------------------------------------------------------------------------------
-  def writeToCSV(self,fileName,dataDict):
-    with open(fileName,"w") as f:
-      line = "x,y,z,chloride_laag,chloride_midden,chloride_hoog,suit_extraction\n"
-      f.write(line)
-      datas = dataDict.values()
-      for data in datas:
-        x = data.x
-        y = data.y
-        z = data.z
-        laag = data.laag
-        midden = data.midden
-        hoog = data.hoog
-        suit_extraction = data.suit_extraction
-        line = "%.0f,%.0f,%.2f,%.0f,%.0f,%.0f,%.3f\n" % (x,y,z,laag,midden,hoog,suit_extraction)
-        f.write(line)
+  def writeCube(self,writer: PW.PointWriter,cube: VoxelCube):
+    for item in self.iterCubeItems(cube):
+      with IN.span("write"):
+        writer.write(item)
+    IN.count("points",cube.getNrPoints())
+
+  #---------------------------------------------------------------------------------------------------
+  def writeToFile(self,fileName,cube: VoxelCube):
+    with self.createWriter(fileName) as writer:
+      self.writeCube(writer,cube)
 
   #---------------------------------------------------------------------------------------------------
   def run(self):
@@ -192,8 +519,13 @@ class DataToCsv():
     if (self.test):
       print("### Mode: TEST")
 
+    if self.instrument:
+      IN.start(self.traceFileName)
+
     fromChlorideDir = r"C:\Freshem\3D\asc"
-    fromSuitDir = r"C:\Freshem\SuitExtraction50m"
+    # The 100m suit_extraction rasters are joined directly with the 50m chloride grid, the 50m
+    # (resampled) rasters give the same result.
+    fromSuitDir = r"C:\Freshem\SuitExtraction100m"
     toDir = r"C:\Freshem\PointData_CSV"
 
     try:
@@ -205,31 +537,85 @@ class DataToCsv():
       if not os.path.isdir(fromSuitDir):
         raise Exception("Directory not found: %s" % fromSuitDir)
 
-      # Check csv file.
-      csvFileName = os.path.join(toDir,"point_data.csv")
-      if self.test:
-        if os.path.isfile(csvFileName):
-          os.remove(csvFileName)
+      # Check output file.
+      if self.exportMode == "profiles":
+        outFileName = os.path.join(toDir,"profile_data.csv")
+      elif self.exportMode == "store":
+        if self.bandRows > 0:
+          raise Exception("Export mode store is not supported in the band mode.")
+        if self.pipeline:
+          raise Exception("Export mode store is not supported in the pipeline mode.")
+        outFileName = os.path.join(toDir,"profile_store")
+      elif self.exportMode == "voxels":
+        if self.bandRows > 0:
+          raise Exception("Export mode voxels is not supported in the band mode.")
+        if self.pipeline:
+          raise Exception("Export mode voxels is not supported in the pipeline mode.")
+        outFileName = os.path.join(toDir,"voxel_store.zarr")
+      elif self.exportMode == "points":
+        if not self.outputFormat in PW.outputFormats:
+          raise Exception("Invalid output format: %s" % self.outputFormat)
+        outFileName = os.path.join(toDir,"point_data" + PW.outputFormats[self.outputFormat])
       else:
-        if os.path.isfile(csvFileName):
-          raise Exception("File already exist: %s" % csvFileName)
+        raise Exception("Invalid export mode: %s" % self.exportMode)
+      if outFileName.endswith(".csv"):
+        if self.compression == "gzip":
+          outFileName += ".gz"
+        elif self.compression == "zstd":
+          outFileName += ".zst"
+      if self.test or self.resume:
+        if os.path.isfile(outFileName):
+          os.remove(outFileName)
+      else:
+        if os.path.exists(outFileName):
+          raise Exception("File already exist: %s" % outFileName)
 
       print("From directory: %s" % fromChlorideDir)
       print("From directory: %s" % fromSuitDir)
       print("To directory  : %s" % toDir)
 
-      # Read the input rasters.
-      print("Reading rasters...")
-      dataDict,skipped = self.readRasters(fromChlorideDir,fromSuitDir)
+      if self.resume:
+        # Read the input rasters and write the output per z-level.
+        if (self.exportMode != "points") or (self.outputFormat != "csv"):
+          raise Exception("Resume is only supported for the export mode points and the output format csv.")
+        print("Reading rasters and writing per z-level: %s" % outFileName)
+        nrPoints,nrPointsAllData,skipped = self.exportLevels(fromChlorideDir,fromSuitDir,outFileName)
+      elif self.pipeline:
+        # Read, convert and write the output at the same time.
+        print("Reading rasters and writing in a pipeline (%s readers): %s" % (self.nrReaders,outFileName))
+        nrPoints,nrPointsAllData,skipped = self.exportPipelined(fromChlorideDir,fromSuitDir,outFileName)
+      elif self.bandRows > 0:
+        # Read the input rasters and write the output per band.
+        print("Reading rasters and writing in bands of %s rows: %s" % (self.bandRows,outFileName))
+        nrPoints,nrPointsAllData,skipped = self.exportBands(fromChlorideDir,fromSuitDir,outFileName)
+      else:
+        # Read the input rasters.
+        print("Reading rasters...")
+        cube,skipped = self.readRasters(fromChlorideDir,fromSuitDir)
+        nrPoints = cube.getNrPoints()
+        nrPointsAllData = self.countPointsWithAllData(cube)
+
+        # Write the output.
+        print("Writing to: %s" % outFileName)
+        if self.exportMode == "store":
+          with IN.span("write"):
+            writeProfileStore(outFileName,cube)
+          if len(self.pyramidLevels) > 0:
+            with IN.span("pyramid"):
+              writeProfilePyramid(outFileName,cube,self.pyramidLevels,self.pyramidMethod)
+        elif self.exportMode == "voxels":
+          with IN.span("write"):
+            writeVoxelStore(outFileName,cube)
+        else:
+          self.writeToFile(outFileName,cube)
+
+      if os.path.isfile(outFileName):
+        IN.count("outputBytes",os.path.getsize(outFileName))
 
       # Show info.
-      print("Data points found: %s" % len(dataDict.keys()))
+      print("Data points found: %s" % nrPoints)
       print("Rasters skipped  : %s" % len(skipped))
 
-      # Write the csv.
-      print("Writing to csv: %s" % csvFileName)
-      self.writeToCSV(csvFileName,dataDict)
-
       # Show skipped files.
       if len(skipped) > 0:
         print("Rasters skipped:")
@@ -241,16 +627,9 @@ class DataToCsv():
       print("To directory  : %s" % toDir)
 
       # Show points with chloride data and also suit_extraction data.
-      USE = True
-      if USE:
-        cnt = 0
-        datas = dataDict.values()
-        for data in datas:
-          if (data.midden > 0) and (data.suit_extraction > 0):
-            cnt += 1
-        print("")
-        print("Nr. of points with all data: %s" % cnt)
-        print("")
+      print("")
+      print("Nr. of points with all data: %s" % nrPointsAllData)
+      print("")
 
     except Exception as ex:
       if self.test:
@@ -258,6 +637,8 @@ class DataToCsv():
       else:
         print(ex)
 
+    IN.stop()
+
     if (self.test):
       print("### Mode: TEST")
 
@@ -0,0 +1,237 @@
+#---------------------------------------------------------------------------------------------------
+# Derives the interface (grensvlak) rasters from the chloride rasters.
+#
+# For every cell column, threshold and scenario (laag, midden, hoog) the depth (m below surface)
+# is calculated at which the chloride content for the first time (from the top) is at least the
+# threshold. The surface is the top of the column with data (the top of the model) or, if a
+# surface raster (m NAP) is given, the surface of that raster.
+#
+# Values (as used in the GetFeatureInfo template of the grensvlak layers):
+#   >= 0  : depth of the interface (m below surface).
+#   99    : the interface is below the deepest data ("Grensvlak beneden meetdiepte").
+#   -9999 : no data ("Geen meetwaarde").
+#
+# The depths are calculated for the whole z-stack at once with numpy (no loops per column), in
+# bands of bandRows rows to limit the memory. The output is a tiled GeoTIFF (or a Cloud-Optimized
+# GeoTIFF) per scenario and threshold: <toDir>/<scenario>/grensvlak_<scenario>_<threshold>_mv.tif.
+#
+# Run:
+#   activate <conda env>
+#   python grensvlak.py
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import Instrumentation as IN
+import RasterUtils as RU
+from RasterCatalog import RasterCatalog
+from VoxelCube import VoxelCube
+
+belowDataValue = 99.0
+noDataValue = -9999.0
+
+#---------------------------------------------------------------------------------------------------
+# Returns the depths (nrThresholds,nrRows,nrCols) of the interfaces. Values and valid are
+# (nrZ,nrRows,nrCols) arrays with the z values from low to high. If surface (nrRows,nrCols, m NAP)
+# is None, the depth is relative to the top of the highest voxel with data.
+def calcInterfaceDepths(values: np.ndarray,valid: np.ndarray,zValues,thresholds,
+                        surface: np.ndarray = None) -> np.ndarray:
+  zValues = np.asarray(zValues,dtype=np.float64)
+  nrZ = len(zValues)
+  zDelta = np.abs(np.diff(zValues)).min() if nrZ > 1 else 0.0
+
+  # From top to bottom.
+  values = values[::-1]
+  valid = valid[::-1]
+  zTopDown = zValues[::-1]
+
+  hasData = valid.any(axis=0)
+  if surface is None:
+    # Top of the highest voxel with data.
+    topIndex = np.argmax(valid,axis=0)
+    surface = zTopDown[topIndex] + zDelta / 2
+  else:
+    hasData &= ~np.isnan(surface)
+
+  # Running maximum from the top, so the index of the first voxel with a value >= threshold is
+  # the number of voxels with a running maximum < threshold.
+  maxFromTop = np.maximum.accumulate(np.where(valid,values,-np.inf),axis=0)
+
+  depths = np.empty((len(thresholds),) + hasData.shape,dtype=np.float32)
+  for i,threshold in enumerate(thresholds):
+    firstIndex = np.count_nonzero(maxFromTop < threshold,axis=0)
+    found = firstIndex < nrZ
+    zInterface = zTopDown[np.minimum(firstIndex,nrZ - 1)] + zDelta / 2
+    depth = np.maximum(surface - zInterface,0.0)
+    depths[i] = np.where(found,depth,belowDataValue)
+    depths[i][~hasData] = noDataValue
+  return depths
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+class Grensvlak():
+
+  test = False
+
+  scenarios = ["laag","midden","hoog"]
+
+  # Chloride thresholds (mg/l), the ELEVATION values of the grensvlak layers.
+  thresholds = [150,300,1000,1500,3000,10000]
+
+  # Nr. of rows per band.
+  bandRows = 500
+
+  # If > 1, the rasters are read by a pool of nrWorkers processes.
+  nrWorkers = 1
+
+  # Optional surface raster (m NAP) with the same cell size as the chloride rasters.
+  surfaceFileName = None
+
+  # Output rasters: compression ("DEFLATE" or "ZSTD", with the floating point predictor), a
+  # Cloud-Optimized GeoTIFF (cog) or a tiled GeoTIFF with the overview levels.
+  compress = "DEFLATE"
+  cog = False
+  overviewLevels = RU.defaultOverviewLevels
+
+  #---------------------------------------------------------------------------------------------------
+  def getFileName(self,toDir,scenario,threshold) -> str:
+    return os.path.join(toDir,scenario,"grensvlak_%s_%s_mv.tif" % (scenario,threshold))
+
+  #---------------------------------------------------------------------------------------------------
+  def createRaster(self,fileName,extent,cellSize) -> RU.RasterWriter:
+    writer = RU.RasterWriter(fileName,extent,cellSize,np.float32,noDataValue,compress=self.compress,
+                             predictor=3,overviewLevels=self.overviewLevels,cog=self.cog)
+    writer.open()
+    return writer
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the surface of the band (nan is no data).
+  def readSurface(self,cube: VoxelCube) -> np.ndarray:
+    surface = np.full((cube.nrRows,cube.nrCols),np.nan)
+    raster = RU.readRasterExtent(self.surfaceFileName,cube.extent)
+    if raster is None:
+      return surface
+    window = cube.calcWindow(raster)
+    if window is not None:
+      rows,cols,rasterRows,rasterCols = window
+      values = raster.raster[rasterRows,rasterCols].astype(np.float64)
+      if raster.noDataValue is not None:
+        values[values == raster.noDataValue] = np.nan
+      surface[rows,cols] = values
+    return surface
+
+  #---------------------------------------------------------------------------------------------------
+  # Calculates the interfaces of all scenarios and thresholds. Returns the written filenames.
+  def createInterfaces(self,chlorideDir,toDir) -> list:
+    catalog = RasterCatalog(chlorideDir)
+
+    # Rasters per scenario, ordered from low to high z.
+    scenarioRasters = dict()
+    rasterInfos = []
+    for scenario in self.scenarios:
+      zValues = catalog.getZValues("chloride",scenario)
+      rasterNames = [catalog.find("chloride",scenario,zValue) for zValue in zValues]
+      scenarioRasters[scenario] = (zValues,rasterNames)
+      rasterInfos.extend([catalog.getInfo(rasterName) for rasterName in rasterNames])
+      print("Scenario %s: %s z-levels" % (scenario,len(zValues)))
+    extent,cellSize = VoxelCube.calcExtent(rasterInfos)
+
+    writers = dict()
+    executor = None
+    try:
+      # Create the output rasters.
+      for scenario in self.scenarios:
+        for threshold in self.thresholds:
+          fileName = self.getFileName(toDir,scenario,threshold)
+          writers[(scenario,threshold)] = self.createRaster(fileName,extent,cellSize)
+
+      if self.nrWorkers > 1:
+        executor = ProcessPoolExecutor(max_workers=self.nrWorkers)
+      bandExtents = VoxelCube.calcBandExtents(extent,cellSize,self.bandRows)
+      for i,bandExtent in enumerate(bandExtents):
+        print("Processing band %s of %s..." % (i + 1,len(bandExtents)))
+        rowOffset = int(round((extent[3] - bandExtent[3]) / cellSize))
+        surface = None
+        for scenario in self.scenarios:
+          zValues,rasterNames = scenarioRasters[scenario]
+          # Only the values of the scenario.
+          cube = VoxelCube(bandExtent,cellSize,zValues,[scenario])
+          if (surface is None) and (self.surfaceFileName is not None):
+            surface = self.readSurface(cube)
+          jobs = [(rasterName,bandExtent) for rasterName in rasterNames]
+          rasters = map(RU.readRasterJob,jobs) if executor is None else executor.map(RU.readRasterJob,jobs)
+          for zIndex,raster in enumerate(rasters):
+            if raster is not None:
+              with IN.span("merge"):
+                cube.mergeRasterData(raster,zIndex,scenario)
+          with IN.span("calc"):
+            depths = calcInterfaceDepths(cube.getValues(scenario),cube.valid,zValues,self.thresholds,surface)
+          with IN.span("write"):
+            for j,threshold in enumerate(self.thresholds):
+              writers[(scenario,threshold)].write(depths[j],0,rowOffset)
+          del cube
+        IN.progress("bands",i + 1,len(bandExtents))
+
+      # Add overviews and close.
+      fileNames = []
+      for writer in writers.values():
+        writer.close()
+        fileNames.append(writer.fileName)
+    finally:
+      if executor is not None:
+        executor.shutdown()
+      # After an error the unfinished rasters are removed.
+      for writer in writers.values():
+        writer.abort()
+      writers.clear()
+    return fileNames
+
+  #---------------------------------------------------------------------------------------------------
+  def run(self):
+
+    #self.test = True
+
+    if (self.test):
+      print("### Mode: TEST")
+
+    fromChlorideDir = r"C:\Freshem\3D\asc"
+    toDir = r"C:\Freshem\raster_grensvlakken"
+
+    try:
+      if not os.path.isdir(fromChlorideDir):
+        raise Exception("Directory not found: %s" % fromChlorideDir)
+      if not os.path.isdir(toDir):
+        raise Exception("Directory not found: %s" % toDir)
+      if (self.surfaceFileName is not None) and not os.path.isfile(self.surfaceFileName):
+        raise Exception("File not found: %s" % self.surfaceFileName)
+
+      print("From directory: %s" % fromChlorideDir)
+      print("To directory  : %s" % toDir)
+      print("Thresholds    : %s" % self.thresholds)
+
+      fileNames = self.createInterfaces(fromChlorideDir,toDir)
+      print("Rasters written: %s" % len(fileNames))
+
+    except Exception as ex:
+      if self.test:
+        traceback.print_exc()
+      else:
+        print(ex)
+
+    if (self.test):
+      print("### Mode: TEST")
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+  gv = Grensvlak()
+  gv.run()
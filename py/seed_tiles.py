@@ -0,0 +1,299 @@
+#---------------------------------------------------------------------------------------------------
+# Seeds the GeoWebCache tile cache of the chloride layers offline.
+#
+# The chloride rasters (chloride_<type>_<z>.asc) are rendered with the class colors of the viewer
+# (js/ColorTable.js) to 256x256 png tiles in the tile grid of the viewer (js/App.js, EPSG:28992)
+# and written in the file layout of the GeoWebCache file blob store:
+#
+#   <cacheDir>/<layer>/<gridset>_<zoom>_<parametersId>/<x/half>_<y/half>/<x>_<y>.png
+#
+# with one parametersId (sha1 of "ELEVATION=<z>") per z-level. The tiles are rendered with a pool
+# of processes, one job per raster and zoom level. Tiles without data are not written.
+#
+# By default the layer group freshem:chloride is seeded, which is the layer the viewer requests
+# (js/App.js). In the group chloride_midden is drawn on top and the laag and hoog layers are
+# transparent, so the group is rendered from the midden rasters. The layers per scenario can be
+# seeded with i.e. --layer freshem:chloride_{scenario} --scenarios laag,midden,hoog.
+#
+# Note: the ELEVATION value is formatted like the GeoWebCache parameter filter formats it (i.e.
+# "-9.75"). Check the parametersId directories of an existing cache if the filter is changed.
+#
+# Run:
+#   activate <conda env>
+#   python seed_tiles.py --chloride-dir C:\Freshem\3D\asc --cache-dir D:\gwc --zoom 0-8
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import argparse
+import hashlib
+import os
+import struct
+import time
+import urllib.parse
+import zlib
+from concurrent.futures import ProcessPoolExecutor,as_completed
+
+import numpy as np
+
+import RasterUtils as RU
+from RasterCatalog import RasterCatalog
+
+# Tile grid of the viewer (js/App.js).
+tileOrigin = (-285401.92,22598.08)
+tileSize = 256
+tileResolutions = [3440.640,1720.320,860.160,430.080,215.040,107.520,53.760,26.880,
+                   13.440,6.720,3.360,1.680,0.840,0.420]
+
+# Classes and colors of the viewer (js/ColorTable.js), from low to high.
+chlorideClasses = [0,150,300,500,750,1000,1250,1500,2000,3000,5000,7500,10000,15000]
+chlorideColors = [(0,0,127),(0,0,250),(0,88,255),(0,196,255),(30,226,221),(60,255,186),
+                  (104,255,143),(147,255,99),(190,255,56),(233,254,12),(255,159,0),(255,134,0),
+                  (255,109,0),(182,0,0)]
+
+# Palette index of the transparent pixels.
+noDataIndex = len(chlorideClasses)
+
+# Layer group of the viewer (js/App.js) and the scenario which is drawn on top in the group.
+groupLayerName = "freshem:chloride"
+groupScenario = "midden"
+
+#---------------------------------------------------------------------------------------------------
+# Returns the palette indices of the values, as in ColorTable.getValueIndex (values below the
+# first class get the first class).
+def classifyValues(values: np.ndarray) -> np.ndarray:
+  indices = np.searchsorted(np.array(chlorideClasses,dtype=np.float64),values,side="right") - 1
+  return np.clip(indices,0,len(chlorideClasses) - 1).astype(np.uint8)
+
+#---------------------------------------------------------------------------------------------------
+# Returns a paletted png (with transparency) of the palette indices.
+def encodePng(indices: np.ndarray,compressLevel: int = 6) -> bytes:
+
+  def chunk(tag: bytes,data: bytes) -> bytes:
+    return struct.pack(">I",len(data)) + tag + data + struct.pack(">I",zlib.crc32(tag + data) & 0xffffffff)
+
+  nrRows,nrCols = indices.shape
+  palette = b"".join([bytes(color) for color in chlorideColors]) + bytes((255,255,255))
+  transparency = bytes([255] * len(chlorideColors) + [0])
+  # Every row starts with filter type 0.
+  rows = np.zeros((nrRows,nrCols + 1),dtype=np.uint8)
+  rows[:,1:] = indices
+  png = b"\x89PNG\r\n\x1a\n"
+  png += chunk(b"IHDR",struct.pack(">IIBBBBB",nrCols,nrRows,8,3,0,0,0))
+  png += chunk(b"PLTE",palette)
+  png += chunk(b"tRNS",transparency)
+  png += chunk(b"IDAT",zlib.compress(rows.tobytes(),compressLevel))
+  png += chunk(b"IEND",b"")
+  return png
+
+#---------------------------------------------------------------------------------------------------
+# Returns the GeoWebCache parametersId of the parameters (sha1 of the sorted key=value pairs).
+def getParametersId(parameters: dict) -> str:
+  kvp = "&".join(["%s=%s" % (urllib.parse.quote(key,safe=""),urllib.parse.quote(parameters[key],safe=""))
+                  for key in sorted(parameters.keys())])
+  return hashlib.sha1(kvp.encode("utf-8")).hexdigest()
+
+#---------------------------------------------------------------------------------------------------
+# Replaces the characters which GeoWebCache does not use in directory names (i.e. "freshem:chloride"
+# -> "freshem_chloride").
+def filterName(name: str) -> str:
+  for c in ["/","\\",":"," ","*","?","\"","<",">","|"]:
+    name = name.replace(c,"_")
+  return name
+
+#---------------------------------------------------------------------------------------------------
+def zeroPad(number: int,order: int) -> str:
+  return str(number).zfill(order)
+
+#---------------------------------------------------------------------------------------------------
+# Returns the filename of the tile in the GeoWebCache file blob store layout (FilePathGenerator).
+def getTileFileName(cacheDir: str,layerName: str,gridSetId: str,zoom: int,x: int,y: int,
+                    parametersId: str,extension: str = "png") -> str:
+  half = 2 << (zoom // 2)
+  digits = 1
+  if half > 10:
+    digits = int(np.log10(half)) + 1
+  zoomDir = "%s_%s" % (filterName(gridSetId),zeroPad(zoom,2))
+  if parametersId is not None:
+    zoomDir += "_" + parametersId
+  tileDir = "%s_%s" % (zeroPad(x // half,digits),zeroPad(y // half,digits))
+  tileName = "%s_%s.%s" % (zeroPad(x,2 * digits),zeroPad(y,2 * digits),extension)
+  return os.path.join(cacheDir,filterName(layerName),zoomDir,tileDir,tileName)
+
+#---------------------------------------------------------------------------------------------------
+# Returns the range of tile columns and rows (x1,y1,x2,y2, inclusive) which overlap with the
+# extent. The tile rows are counted from the bottom (origin lower left).
+def calcTileRange(extent,zoom: int) -> tuple:
+  tileWidth = tileSize * tileResolutions[zoom]
+  eps = 1e-6
+  x1 = int(np.floor((extent[0] - tileOrigin[0]) / tileWidth))
+  y1 = int(np.floor((extent[1] - tileOrigin[1]) / tileWidth))
+  x2 = int(np.floor((extent[2] - tileOrigin[0]) / tileWidth - eps))
+  y2 = int(np.floor((extent[3] - tileOrigin[1]) / tileWidth - eps))
+  return (max(x1,0),max(y1,0),x2,y2)
+
+#---------------------------------------------------------------------------------------------------
+# Returns the palette indices of the tile (nearest neighbour at the pixel centres) and whether
+# the tile has data.
+def renderTile(raster: RU.Raster,indices: np.ndarray,zoom: int,x: int,y: int) -> tuple:
+  resolution = tileResolutions[zoom]
+  minx = tileOrigin[0] + x * tileSize * resolution
+  maxy = tileOrigin[1] + (y + 1) * tileSize * resolution
+  centres = (np.arange(tileSize) + 0.5) * resolution
+  cols = np.floor((minx + centres - raster.extent[0]) / raster.cellSize).astype(np.int64)
+  rows = np.floor((raster.extent[3] - (maxy - centres)) / raster.cellSize).astype(np.int64)
+  validCols = (cols >= 0) & (cols < raster.nrCols)
+  validRows = (rows >= 0) & (rows < raster.nrRows)
+  tile = np.full((tileSize,tileSize),noDataIndex,dtype=np.uint8)
+  if not validCols.any() or not validRows.any():
+    return (tile,False)
+  tile[np.ix_(validRows,validCols)] = indices[np.ix_(rows[validRows],cols[validCols])]
+  return (tile,bool((tile != noDataIndex).any()))
+
+#---------------------------------------------------------------------------------------------------
+# Renders and writes the tiles of a raster on a zoom level. Used by the worker processes.
+# Returns the number of tiles written and skipped (existing or without data).
+def seedJob(job: tuple) -> tuple:
+  rasterName,zoom,cacheDir,layerName,gridSetId,parametersId,overwrite = job
+  # The data is read (and classified once) for the first tile which is rendered, so the raster is
+  # not read if all tiles exist.
+  raster = RU.readRaster(rasterName,lazy=True)
+  if raster is None:
+    return (0,0)
+  indices = None
+
+  nrWritten = 0
+  nrSkipped = 0
+  x1,y1,x2,y2 = calcTileRange(raster.extent,zoom)
+  for y in range(y1,y2 + 1):
+    for x in range(x1,x2 + 1):
+      fileName = getTileFileName(cacheDir,layerName,gridSetId,zoom,x,y,parametersId)
+      if not overwrite and os.path.isfile(fileName):
+        nrSkipped += 1
+        continue
+      if indices is None:
+        indices = classifyValues(raster.raster)
+        if raster.noDataValue is not None:
+          indices[raster.raster == raster.noDataValue] = noDataIndex
+      tile,hasData = renderTile(raster,indices,zoom,x,y)
+      if not hasData:
+        nrSkipped += 1
+        continue
+      os.makedirs(os.path.dirname(fileName),exist_ok=True)
+      with open(fileName,"wb") as f:
+        f.write(encodePng(tile))
+      nrWritten += 1
+  return (nrWritten,nrSkipped)
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+class TileSeeder():
+
+  #---------------------------------------------------------------------------------------------------
+  # The layerName may contain "{scenario}", i.e. "freshem:chloride_{scenario}". Otherwise (i.e. the
+  # layer group "freshem:chloride") the tiles are rendered from one scenario.
+  def __init__(self,chlorideDir: str,cacheDir: str,layerName: str,gridSetId: str = "NL_EPSG_28992",
+               nrWorkers: int = 1,overwrite: bool = False):
+    self.chlorideDir = chlorideDir
+    self.cacheDir = cacheDir
+    self.layerName = layerName
+    self.gridSetId = gridSetId
+    self.nrWorkers = nrWorkers
+    self.overwrite = overwrite
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the value of the ELEVATION parameter as formatted by the parameter filter.
+  def formatElevation(self,zValue) -> str:
+    return repr(float(zValue))
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the jobs for the scenarios, z-levels (None is all) and zoom levels.
+  def createJobs(self,scenarios: list,zValues,zooms: list) -> list:
+    if (not "{scenario}" in self.layerName) and (len(scenarios) != 1):
+      raise Exception("Layer %s is rendered from one scenario (i.e. %s), found: %s" %
+                      (self.layerName,groupScenario,",".join(scenarios)))
+    catalog = RasterCatalog(self.chlorideDir)
+    jobs = []
+    for scenario in scenarios:
+      layerName = self.layerName.replace("{scenario}",scenario)
+      scenarioZValues = zValues
+      if scenarioZValues is None:
+        scenarioZValues = catalog.getZValues("chloride",scenario)
+      for zValue in scenarioZValues:
+        rasterName = catalog.find("chloride",scenario,zValue)
+        if rasterName is None:
+          print("Raster not found: %s,%s" % (scenario,zValue))
+          continue
+        parametersId = getParametersId({"ELEVATION": self.formatElevation(zValue)})
+        for zoom in zooms:
+          jobs.append((rasterName,zoom,self.cacheDir,layerName,self.gridSetId,parametersId,self.overwrite))
+    return jobs
+
+  #---------------------------------------------------------------------------------------------------
+  def run(self,scenarios: list,zValues,zooms: list):
+    jobs = self.createJobs(scenarios,zValues,zooms)
+    print("Jobs: %s" % len(jobs))
+    startTime = time.time()
+    nrWritten = 0
+    nrSkipped = 0
+    if self.nrWorkers > 1:
+      with ProcessPoolExecutor(max_workers=self.nrWorkers) as executor:
+        futures = dict([(executor.submit(seedJob,job),job) for job in jobs])
+        for cnt,future in enumerate(as_completed(futures)):
+          written,skipped = future.result()
+          nrWritten += written
+          nrSkipped += skipped
+          job = futures[future]
+          print("[%s/%s] %s zoom %s: %s tiles" % (cnt + 1,len(jobs),os.path.basename(job[0]),job[1],written))
+    else:
+      for cnt,job in enumerate(jobs):
+        written,skipped = seedJob(job)
+        nrWritten += written
+        nrSkipped += skipped
+        print("[%s/%s] %s zoom %s: %s tiles" % (cnt + 1,len(jobs),os.path.basename(job[0]),job[1],written))
+    print("Tiles written: %s" % nrWritten)
+    print("Tiles skipped: %s" % nrSkipped)
+    print("Time         : %.1f s" % (time.time() - startTime))
+    return (nrWritten,nrSkipped)
+
+#---------------------------------------------------------------------------------------------------
+# Returns the zoom levels of a range like "0-8" or a list like "4,6,8".
+def parseZooms(text: str) -> list:
+  if "-" in text:
+    zoom1,zoom2 = text.split("-")
+    return list(range(int(zoom1),int(zoom2) + 1))
+  return [int(zoom) for zoom in text.split(",")]
+
+#---------------------------------------------------------------------------------------------------
+def main():
+  parser = argparse.ArgumentParser(description="Seeds the GeoWebCache tiles of the chloride layers.")
+  parser.add_argument("--chloride-dir",default=r"C:\Freshem\3D\asc",help="Directory with the chloride .asc files.")
+  parser.add_argument("--cache-dir",required=True,help="Directory of the GeoWebCache file blob store.")
+  parser.add_argument("--layer",default=groupLayerName,help="Layer name, may contain {scenario} (default the layer group of the viewer).")
+  parser.add_argument("--gridset",default="NL_EPSG_28992",help="Gridset id.")
+  parser.add_argument("--scenarios",default=groupScenario,help="Scenarios, i.e. laag,midden,hoog (only with {scenario} in the layer name).")
+  parser.add_argument("--z",default=None,help="Z-levels (m NAP), i.e. -9.75,-9.25 (default all).")
+  parser.add_argument("--zoom",default="0-8",help="Zoom levels, i.e. 0-8 or 4,6,8.")
+  parser.add_argument("--workers",type=int,default=os.cpu_count() or 1,help="Nr. of processes.")
+  parser.add_argument("--overwrite",action="store_true",help="Overwrite existing tiles.")
+  args = parser.parse_args()
+
+  if not os.path.isdir(args.chloride_dir):
+    raise Exception("Directory not found: %s" % args.chloride_dir)
+  zooms = parseZooms(args.zoom)
+  for zoom in zooms:
+    if (zoom < 0) or (zoom >= len(tileResolutions)):
+      raise Exception("Invalid zoom level: %s" % zoom)
+  zValues = None
+  if args.z is not None:
+    zValues = [float(z) for z in args.z.split(",")]
+
+  seeder = TileSeeder(args.chloride_dir,args.cache_dir,args.layer,args.gridset,args.workers,args.overwrite)
+  seeder.run(args.scenarios.split(","),zValues,zooms)
+
+#---------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+  main()
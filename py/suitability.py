@@ -0,0 +1,396 @@
+#---------------------------------------------------------------------------------------------------
+# Computes the suitability for groundwater extraction (geschiktheid) rasters from the factor
+# stacks.
+#
+# The suitability per z-level and cell is the weighted sum of the factors of FRESHEM, GeoTOP and
+# the relative infiltration (default weights 0.5, 0.4 and 0.1). Every factor is derived from the
+# values of its raster stack with a lookup:
+#   "values"                             : the values are the factors (0..1).
+#   {"breaks": [..],"factors": [..]}     : step function, the factor of the highest break <= value
+#                                          (values below the first break get the first factor).
+#   {"classes": {"<value>": factor,..}}  : class values, other values are no data.
+# The lookups of FRESHEM (chloride in mg/l) and GeoTOP (lithoclasses) have no default and must be
+# given in the config file. The suitability must be between 0 and 1, otherwise an exception is
+# raised (the suit_extraction values of data_to_csv.py are 0..1).
+#
+# The rasters of a factor are found with a filename pattern in which {z} is replaced by the z
+# value in cm (as in the chloride rasters, i.e. chloride_midden_{z}.asc -> chloride_midden_-1225.asc).
+# A pattern without {z} is a single raster which is used for all z-levels.
+#
+# The grid is processed in blocks of blockSize x blockSize cells, the z-levels of a block at once
+# (at most nrOpenRasters z-levels, so at most nrOpenRasters output rasters are open). The blocks
+# are computed by a pool of nrWorkers processes. The factors may have another cell size than the
+# output: a factor raster which is finer than the output is aggregated per output cell with the
+# method of the factor ("max" for chloride, "mode" for the lithoclasses, "mean"), otherwise it is
+# sampled at the cell centres (nearest neighbour).
+# Output: <toDir>/suit_extracttion_<z in cm>.tif (tiled GeoTIFF with overviews or Cloud-Optimized
+# GeoTIFF). The names are the same as the output of conv_suit_extraction.py, so toDir may not be one
+# of its output directories (conversionDirs), which are read by data_to_csv.py.
+#
+# Run:
+#   activate <conda env>
+#   python suitability.py [config.json]
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import json
+import os
+import sys
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import Instrumentation as IN
+import RasterUtils as RU
+from data_to_csv import DataToCsv
+from VoxelCube import VoxelCube
+
+noDataValue = -9999.0
+
+#---------------------------------------------------------------------------------------------------
+# Returns the factors of the values (nan is no data).
+def applyLookup(values: np.ndarray,lookup) -> np.ndarray:
+  if lookup == "values":
+    return values
+  if lookup is None:
+    raise Exception("No lookup.")
+  if "breaks" in lookup:
+    breaks = np.array(lookup["breaks"],dtype=np.float64)
+    factors = np.array(lookup["factors"],dtype=np.float64)
+    if len(breaks) != len(factors):
+      raise Exception("Invalid lookup, the nr. of breaks and factors differ.")
+    indices = np.clip(np.searchsorted(breaks,values,side="right") - 1,0,len(breaks) - 1)
+    return np.where(np.isnan(values),np.nan,factors[indices])
+  if "classes" in lookup:
+    keys = np.array([float(key) for key in lookup["classes"].keys()])
+    factors = np.array(list(lookup["classes"].values()),dtype=np.float64)
+    order = np.argsort(keys)
+    keys = keys[order]
+    factors = factors[order]
+    indices = np.clip(np.searchsorted(keys,values),0,len(keys) - 1)
+    return np.where(keys[indices] == values,factors[indices],np.nan)
+  raise Exception("Invalid lookup: %s" % lookup)
+
+#---------------------------------------------------------------------------------------------------
+# Returns the values of the raster on the grid (nrRows,nrCols) with the extent and cell size.
+# Nodata and cells outside the raster are nan. With method "nearest", or if the raster is not
+# finer than the grid, the value at the cell centre is used. Otherwise the raster cells within
+# the grid cell (sampled at factor x factor points, factor is the ratio of the cell sizes) are
+# aggregated with the rules of VoxelCube.aggregate: "max", "mode" or "mean" (see aggregateValues).
+def sampleRaster(raster: RU.Raster,extent,cellSize,nrRows: int,nrCols: int,method: str = "nearest") -> np.ndarray:
+  if (raster is None) or (method == "nearest"):
+    return sampleCentres(raster,extent,cellSize,nrRows,nrCols)
+  factor = max(int(round(cellSize / raster.cellSize)),1)
+  if factor == 1:
+    return sampleCentres(raster,extent,cellSize,nrRows,nrCols)
+  values = sampleCentres(raster,extent,cellSize / factor,nrRows * factor,nrCols * factor)
+  blocks = values.reshape(nrRows,factor,nrCols,factor).transpose(0,2,1,3).reshape(nrRows,nrCols,-1)
+  return VoxelCube.aggregateValues(blocks,~np.isnan(blocks),method)
+
+#---------------------------------------------------------------------------------------------------
+# Returns the values of the raster at the cell centres of the grid (nearest neighbour).
+def sampleCentres(raster: RU.Raster,extent,cellSize,nrRows: int,nrCols: int) -> np.ndarray:
+  values = np.full((nrRows,nrCols),np.nan)
+  if raster is None:
+    return values
+  centres = (np.arange(max(nrRows,nrCols)) + 0.5) * cellSize
+  cols = np.floor((extent[0] + centres[:nrCols] - raster.extent[0]) / raster.cellSize).astype(np.int64)
+  rows = np.floor((raster.extent[3] - (extent[3] - centres[:nrRows])) / raster.cellSize).astype(np.int64)
+  validCols = (cols >= 0) & (cols < raster.nrCols)
+  validRows = (rows >= 0) & (rows < raster.nrRows)
+  if not validCols.any() or not validRows.any():
+    return values
+  data = raster.raster[np.ix_(rows[validRows],cols[validCols])].astype(np.float64)
+  if raster.noDataValue is not None:
+    data[data == raster.noDataValue] = np.nan
+  values[np.ix_(validRows,validCols)] = data
+  return values
+
+#---------------------------------------------------------------------------------------------------
+# Computes the suitability of a block for all z-levels. Used by the worker processes.
+# Job is a tuple (blockExtent,cellSize,factorRasters,factors) with factorRasters a list per
+# z-level of a dict with the raster filename per factor. Returns a (nrZ,nrRows,nrCols) array.
+def computeBlock(job: tuple) -> np.ndarray:
+  blockExtent,cellSize,factorRasters,factors = job
+  nrCols,nrRows = RU.calcNrColsRowsFromExtent(blockExtent,cellSize)
+  nrZ = len(factorRasters)
+
+  # Read the factor stacks, (nrZ,nrRows,nrCols) per factor. Single rasters are read once.
+  stacks = dict()
+  with IN.span("read"):
+    for name in factors:
+      stack = np.empty((nrZ,nrRows,nrCols))
+      cache = dict()
+      for zIndex in range(nrZ):
+        rasterName = factorRasters[zIndex][name]
+        if rasterName not in cache:
+          raster = RU.readRasterExtent(rasterName,blockExtent)
+          cache[rasterName] = sampleRaster(raster,blockExtent,cellSize,nrRows,nrCols,factors[name].get("method","nearest"))
+        stack[zIndex] = cache[rasterName]
+      stacks[name] = stack
+
+  # Weighted sum over all z-levels at once.
+  with IN.span("calc"):
+    suitability = np.zeros((nrZ,nrRows,nrCols))
+    for name,factor in factors.items():
+      suitability += factor["weight"] * applyLookup(stacks[name],factor.get("lookup"))
+    valid = ~np.isnan(suitability)
+    if valid.any():
+      minValue = suitability[valid].min()
+      maxValue = suitability[valid].max()
+      if (minValue < -1e-9) or (maxValue > 1 + 1e-9):
+        raise Exception("Suitability out of range 0..1 (%s to %s), check the lookups and weights." % (minValue,maxValue))
+    suitability = np.where(valid,suitability,noDataValue)
+  return suitability.astype(np.float32)
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+class Suitability():
+
+  test = False
+
+  # Factors with the directory, the filename pattern, the weight, the lookup and the method for
+  # rasters which are finer than the output (see sampleRaster, default "nearest"). Can be changed
+  # with a config file (see loadConfig). The lookups of freshem and geotop (None) must be given.
+  # The chloride of a 100m cell is the maximum of its 50m cells (as in the pyramid of
+  # data_to_csv.py) and the lithoclass the most frequent one.
+  factors = {
+    "freshem": {"dir": r"C:\Freshem\3D\asc","pattern": "chloride_midden_{z}.asc","weight": 0.5,"lookup": None,"method": "max"},
+    "geotop": {"dir": r"C:\Freshem\GeoTOP","pattern": "geotop_{z}.tif","weight": 0.4,"lookup": None,"method": "mode"},
+    "infiltration": {"dir": r"C:\Freshem\Infiltratie","pattern": "relatieve_infiltratie.tif","weight": 0.1,"lookup": "values","method": "mean"},
+  }
+
+  # Output directory. Not one of the conversionDirs.
+  toDir = r"C:\Freshem\SuitExtractionComputed"
+
+  # Output directories of conv_suit_extraction.py, with the official suitability rasters.
+  conversionDirs = [r"C:\Freshem\SuitExtraction100m",r"C:\Freshem\SuitExtraction50m"]
+
+  # Cell size of the output (m).
+  cellSize = 100.0
+
+  # Extent of the output or None (the extent of the first factor).
+  extent = None
+
+  # Z values or None (the z values of data_to_csv).
+  zValues = None
+
+  # Nr. of cells per block.
+  blockSize = 256
+
+  # If > 1, the blocks are computed by a pool of nrWorkers processes.
+  nrWorkers = 1
+
+  # Max. nr. of z-levels which are computed (and output rasters which are open) at the same time.
+  nrOpenRasters = 16
+
+  # Output rasters: compression ("DEFLATE" or "ZSTD", with the floating point predictor), a
+  # Cloud-Optimized GeoTIFF (cog) or a tiled GeoTIFF with the overview levels.
+  compress = "DEFLATE"
+  cog = False
+  overviewLevels = RU.defaultOverviewLevels
+
+  #---------------------------------------------------------------------------------------------------
+  # Reads the settings (factors, weights, lookups, toDir, cellSize, extent, zValues, blockSize,
+  # nrWorkers, nrOpenRasters) from a json file. The factors in the file are merged with the default
+  # factors.
+  def loadConfig(self,fileName: str):
+    with open(fileName) as f:
+      config = json.load(f)
+    factors = dict([(name,dict(factor)) for name,factor in self.factors.items()])
+    for name,factor in config.get("factors",{}).items():
+      factors.setdefault(name,{}).update(factor)
+    for name,weight in config.get("weights",{}).items():
+      if name not in factors:
+        raise Exception("Unknown factor: %s" % name)
+      factors[name]["weight"] = weight
+    for name,factor in factors.items():
+      for key in ["dir","pattern","weight"]:
+        if key not in factor:
+          raise Exception("Missing %s for factor: %s" % (key,name))
+    self.factors = factors
+    for key in ["toDir","cellSize","extent","zValues","blockSize","nrWorkers","nrOpenRasters"]:
+      if key in config:
+        setattr(self,key,config[key])
+
+  #---------------------------------------------------------------------------------------------------
+  def getRasterName(self,factor: dict,zValue) -> str:
+    return os.path.join(factor["dir"],factor["pattern"].replace("{z}",DataToCsv().getZName(zValue)))
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the z values and per z value a dict with the raster per factor. Z values with a
+  # missing raster are skipped.
+  def findRasters(self,zValues) -> tuple:
+    foundZValues = []
+    factorRasters = []
+    for zValue in zValues:
+      rasterNames = dict()
+      for name,factor in self.factors.items():
+        rasterName = self.getRasterName(factor,zValue)
+        if not os.path.isfile(rasterName):
+          print("Raster not found: %s" % rasterName)
+          break
+        rasterNames[name] = rasterName
+      else:
+        foundZValues.append(zValue)
+        factorRasters.append(rasterNames)
+    return (foundZValues,factorRasters)
+
+  #---------------------------------------------------------------------------------------------------
+  def createRaster(self,fileName,extent) -> RU.RasterWriter:
+    writer = RU.RasterWriter(fileName,extent,self.cellSize,np.float32,noDataValue,compress=self.compress,
+                             predictor=3,overviewLevels=self.overviewLevels,cog=self.cog)
+    writer.open()
+    return writer
+
+  #---------------------------------------------------------------------------------------------------
+  # Returns the blocks (extent,col,row) of the grid.
+  def calcBlocks(self,extent) -> list:
+    nrCols,nrRows = RU.calcNrColsRowsFromExtent(extent,self.cellSize)
+    blocks = []
+    for row in range(0,nrRows,self.blockSize):
+      for col in range(0,nrCols,self.blockSize):
+        blockCols = min(self.blockSize,nrCols - col)
+        blockRows = min(self.blockSize,nrRows - row)
+        minx = extent[0] + col * self.cellSize
+        maxy = extent[3] - row * self.cellSize
+        blockExtent = [minx,maxy - blockRows * self.cellSize,minx + blockCols * self.cellSize,maxy]
+        blocks.append((blockExtent,col,row))
+    return blocks
+
+  #---------------------------------------------------------------------------------------------------
+  # Raises an exception if the output directory is one of the conversionDirs.
+  def checkToDir(self,toDir):
+    dirNames = [os.path.normcase(os.path.abspath(dirName)) for dirName in self.conversionDirs]
+    if os.path.normcase(os.path.abspath(toDir)) in dirNames:
+      raise Exception("Invalid directory: %s (output of conv_suit_extraction.py)" % toDir)
+
+  #---------------------------------------------------------------------------------------------------
+  # Raises an exception if a factor has no lookup, i.e. the chloride values (mg/l) of FRESHEM would
+  # be used as factors, or an invalid method.
+  def checkFactors(self):
+    for name,factor in self.factors.items():
+      if factor.get("lookup") is None:
+        raise Exception("No lookup for factor %s, give a lookup in the config file (\"values\" if the values are factors)." % name)
+      if factor.get("method","nearest") not in ["nearest","max","mode","mean"]:
+        raise Exception("Invalid method for factor %s: %s" % (name,factor["method"]))
+
+  #---------------------------------------------------------------------------------------------------
+  # Computes and writes the suitability rasters. Returns the written filenames.
+  def computeSuitability(self,toDir) -> list:
+    self.checkToDir(toDir)
+    self.checkFactors()
+    zValues = self.zValues
+    if zValues is None:
+      zValues = DataToCsv().getZValues()
+    zValues,factorRasters = self.findRasters(zValues)
+    if len(zValues) == 0:
+      raise Exception("No rasters found.")
+    print("Z-levels: %s" % len(zValues))
+
+    # Extent of the first factor, aligned with the cell size.
+    extent = self.extent
+    if extent is None:
+      name = list(self.factors.keys())[0]
+      rasterInfos = [RU.readRasterInfo(rasterName) for rasterName in set([rasters[name] for rasters in factorRasters])]
+      extent,_ = VoxelCube.calcExtent(rasterInfos)
+      extent = RU.alignExtent(extent,self.cellSize)
+
+    fileNames = [os.path.join(toDir,"suit_extracttion_%s.tif" % DataToCsv().getZName(zValue)) for zValue in zValues]
+    blocks = self.calcBlocks(extent)
+
+    # At most nrOpenRasters z-levels at the same time, to limit the open rasters.
+    for z1 in range(0,len(zValues),self.nrOpenRasters):
+      z2 = min(z1 + self.nrOpenRasters,len(zValues))
+      if z2 - z1 < len(zValues):
+        print("Z-levels %s to %s of %s..." % (z1 + 1,z2,len(zValues)))
+      self.computeZLevels(fileNames[z1:z2],factorRasters[z1:z2],extent,blocks)
+    return fileNames
+
+  #---------------------------------------------------------------------------------------------------
+  # Computes and writes the suitability rasters (fileNames) of the z-levels with the factorRasters.
+  # After an error the unfinished rasters are removed.
+  def computeZLevels(self,fileNames,factorRasters,extent,blocks):
+    jobs = [(blockExtent,self.cellSize,factorRasters,self.factors) for blockExtent,_,_ in blocks]
+    writers = []
+
+    #---------------------------------------------------------------------------------------------------
+    def writeBlock(i,suitability):
+      _,col,row = blocks[i]
+      with IN.span("write"):
+        for zIndex in range(len(fileNames)):
+          writers[zIndex].write(suitability[zIndex],col,row)
+      IN.progress("blocks",i + 1,len(blocks))
+
+    try:
+      # Create the output rasters.
+      for fileName in fileNames:
+        writers.append(self.createRaster(fileName,extent))
+
+      if self.nrWorkers > 1:
+        # At most 2 blocks per worker are pending, to limit the memory.
+        with ProcessPoolExecutor(max_workers=self.nrWorkers) as executor:
+          pending = deque()
+          for i,job in enumerate(jobs):
+            pending.append(executor.submit(computeBlock,job))
+            if len(pending) >= 2 * self.nrWorkers:
+              writeBlock(i - len(pending) + 1,pending.popleft().result())
+          while len(pending) > 0:
+            writeBlock(len(jobs) - len(pending),pending.popleft().result())
+      else:
+        for i,job in enumerate(jobs):
+          writeBlock(i,computeBlock(job))
+
+      # Add overviews and close.
+      for writer in writers:
+        writer.close()
+    finally:
+      for writer in writers:
+        writer.abort()
+      writers.clear()
+
+  #---------------------------------------------------------------------------------------------------
+  def run(self,configFileName=None):
+
+    #self.test = True
+
+    if (self.test):
+      print("### Mode: TEST")
+
+    try:
+      if configFileName is not None:
+        self.loadConfig(configFileName)
+      toDir = self.toDir
+      self.checkToDir(toDir)
+      self.checkFactors()
+      if not os.path.isdir(toDir):
+        raise Exception("Directory not found: %s" % toDir)
+      for name,factor in self.factors.items():
+        if not os.path.isdir(factor["dir"]):
+          raise Exception("Directory not found: %s" % factor["dir"])
+        print("Factor %s: %s (weight %s)" % (name,os.path.join(factor["dir"],factor["pattern"]),factor["weight"]))
+      print("To directory: %s" % toDir)
+
+      fileNames = self.computeSuitability(toDir)
+      print("Rasters written: %s" % len(fileNames))
+
+    except Exception as ex:
+      if self.test:
+        traceback.print_exc()
+      else:
+        print(ex)
+
+    if (self.test):
+      print("### Mode: TEST")
+
+#---------------------------------------------------------------------------------------------------
+#---------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+  su = Suitability()
+  su.run(sys.argv[1] if len(sys.argv) > 1 else None)
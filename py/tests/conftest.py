@@ -0,0 +1,18 @@
+#---------------------------------------------------------------------------------------------------
+# Behaviour checks of the numpy logic of the scripts. Run from the py directory:
+#
+#   python -m pytest -q tests
+#
+# The checks of modules which import RasterUtils are skipped if GDAL (osgeo) is not installed.
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import os
+import sys
+
+# The scripts are not a package, they import each other from the py directory.
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,42 @@
+#---------------------------------------------------------------------------------------------------
+# Checks of the cells crossed by a line (CrossSection.py).
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo")
+
+from CrossSection import calcLineCells
+
+extent = [0,0,200,200]
+
+#---------------------------------------------------------------------------------------------------
+def test_diagonal():
+  # A diagonal through the corners crosses the cells on the diagonal, a segment of zero length
+  # is skipped.
+  rows,cols,distFrom,distTo = calcLineCells([(0,200),(200,0),(200,0)],extent,50.0,4,4)
+  assert rows.tolist() == [0,1,2,3]
+  assert cols.tolist() == [0,1,2,3]
+  assert np.allclose(distFrom,np.arange(4) * 50 * np.sqrt(2))
+  assert np.allclose(distTo,np.arange(1,5) * 50 * np.sqrt(2))
+
+#---------------------------------------------------------------------------------------------------
+def test_polyline():
+  # Along row 1 to the right and back up column 3, the cell at the vertex is merged; the part
+  # outside the grid is skipped.
+  rows,cols,distFrom,distTo = calcLineCells([(10,140),(190,140),(190,260)],extent,50.0,4,4)
+  assert rows.tolist() == [1,1,1,1,0]
+  assert cols.tolist() == [0,1,2,3,3]
+  assert distFrom.tolist() == [0,40,90,140,190]
+  assert distTo.tolist() == [40,90,140,190,240]
+
+#---------------------------------------------------------------------------------------------------
+def test_outside():
+  rows,cols,distFrom,distTo = calcLineCells([(300,300),(400,400)],extent,50.0,4,4)
+  assert len(rows) == 0
@@ -0,0 +1,39 @@
+#---------------------------------------------------------------------------------------------------
+# Checks of the manifest of the incremental and resumable runs (Manifest.py).
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import os
+
+import pytest
+
+from Manifest import Manifest
+
+#---------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize("useHash",[False,True])
+def test_resume(tmp_path,useHash):
+  inputName = str(tmp_path / "input.asc")
+  outputName = str(tmp_path / "output.tif")
+  fileName = str(tmp_path / "manifest.json")
+  for name in [inputName,outputName]:
+    with open(name,"w") as f:
+      f.write("1")
+  manifest = Manifest(fileName,useHash)
+  assert not manifest.isUpToDate("a",[inputName],[outputName],{"cellSize": 100})
+  manifest.record("a",[inputName],[outputName],{"cellSize": 100},{"nrRows": 5})
+  # A new run reads the saved manifest.
+  manifest = Manifest(fileName,useHash)
+  assert manifest.isUpToDate("a",[inputName],[outputName],{"cellSize": 100})
+  assert manifest.getInfo("a") == {"nrRows": 5}
+  assert not manifest.isUpToDate("a",[inputName],[outputName],{"cellSize": 50})
+  # A changed input or a removed output.
+  with open(inputName,"w") as f:
+    f.write("22")
+  assert not manifest.isUpToDate("a",[inputName],[outputName],{"cellSize": 100})
+  manifest.record("a",[inputName],[outputName],{"cellSize": 100})
+  os.remove(outputName)
+  assert not manifest.isUpToDate("a",[inputName],[outputName],{"cellSize": 100})
@@ -0,0 +1,47 @@
+#---------------------------------------------------------------------------------------------------
+# Checks of the profile store queries (ProfileStore.py).
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo")
+
+from ProfileStore import ProfileStore,writeProfileStore
+from VoxelCube import VoxelCube
+
+#---------------------------------------------------------------------------------------------------
+# A store of 4x4 cells of 50m (origin 0,0) with chloride 150 * (row * 4 + col) at z 0.
+@pytest.fixture
+def store(tmp_path) -> ProfileStore:
+  cube = VoxelCube([0,0,200,200],50.0,[0.0])
+  cube.valid[:] = True
+  values = (np.arange(16,dtype=np.float32) * 150).reshape(1,4,4)
+  for valueName in ["laag","midden","hoog"]:
+    cube.data[valueName][:] = cube.encodings[valueName].encode(values)
+  writeProfileStore(str(tmp_path),cube)
+  return ProfileStore(str(tmp_path))
+
+#---------------------------------------------------------------------------------------------------
+def test_queryLine(store):
+  features = store.queryLine([(25,175),(175,175)],10)
+  assert [feature["x"] for feature in features] == [25,75,125,175]
+  assert [feature["chloride_midden"] for feature in features] == [[0],[150],[300],[450]]
+
+#---------------------------------------------------------------------------------------------------
+# A point, a line of zero length and a short line within one cell return the profile of the cell.
+@pytest.mark.parametrize("coords",[[(110,60)],[(110,60),(110,60)],[(105,55),(115,65)]])
+def test_queryLineInCell(store,coords):
+  features = store.queryLine(coords,5)
+  assert [(feature["x"],feature["y"]) for feature in features] == [(125,75)]
+  assert features[0]["chloride_midden"] == [150 * 10]
+
+#---------------------------------------------------------------------------------------------------
+def test_queryLineOutside(store):
+  assert store.queryLine([(500,500)],5) == []
+  assert store.queryLine([(105,55),(160,65)],1) == []
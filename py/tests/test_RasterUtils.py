@@ -0,0 +1,31 @@
+#---------------------------------------------------------------------------------------------------
+# Checks of the raster utilities without files (RasterUtils.py).
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo")
+
+import RasterUtils as RU
+
+#---------------------------------------------------------------------------------------------------
+def test_rasterToArrays():
+  values = np.array([[1,-9999,3],[np.nan,5,6]],dtype=np.float32)
+  raster = RU.Raster(values,50.0,3,2,[1000,2000,1150,2100],np.float32,-9999.0)
+  xs,ys,result = RU.rasterToArrays(raster)
+  assert xs.tolist() == [1025,1125,1075,1125]
+  assert ys.tolist() == [2075,2075,2025,2025]
+  assert result.tolist() == [1,3,5,6]
+
+#---------------------------------------------------------------------------------------------------
+def test_calcWindowFromExtent():
+  raster = RU.Raster(None,100.0,10,5,[0,0,1000,500],np.float32,None)
+  # A 50m extent which partly overlaps cells, and an extent outside the raster.
+  assert RU.calcWindowFromExtent(raster,[150,150,350,450]) == (1,0,3,4)
+  assert RU.calcWindowFromExtent(raster,[-200,0,-100,500])[2] == 0
@@ -0,0 +1,85 @@
+#---------------------------------------------------------------------------------------------------
+# Checks of the voxel cube (VoxelCube.py).
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo")
+
+import RasterUtils as RU
+from VoxelCube import VoxelCube
+from VoxelEncoding import ChlorideEncoding,SuitEncoding
+
+#---------------------------------------------------------------------------------------------------
+def createRaster(values,cellSize,x1,y2,noDataValue) -> RU.Raster:
+  values = np.asarray(values)
+  nrRows,nrCols = values.shape
+  extent = [x1,y2 - nrRows * cellSize,x1 + nrCols * cellSize,y2]
+  return RU.Raster(values,cellSize,nrCols,nrRows,extent,values.dtype,noDataValue)
+
+#---------------------------------------------------------------------------------------------------
+# Nan is no data, also if the no data value is nan or not set.
+@pytest.mark.parametrize("noDataValue",[np.nan,None,-9999.0])
+def test_nanIsNoData(noDataValue):
+  cube = VoxelCube([0,0,100,100],50,[0.0])
+  chloride = createRaster(np.array([[np.nan,300],[150,0]],dtype=np.float32),50,0,100,noDataValue)
+  suitability = createRaster(np.array([[0.2,np.nan],[np.nan,0.5]],dtype=np.float32),50,0,100,noDataValue)
+  assert cube.encodeRaster(chloride,"midden")[2].tolist() == [[ChlorideEncoding.noDataCode,2],[1,0]]
+  assert cube.encodeRaster(suitability,"suit_extraction")[2].tolist() == [[200,SuitEncoding.noDataCode],[SuitEncoding.noDataCode,500]]
+  cube.mergeRasterData(chloride,0,"midden")
+  cube.joinRasterData(suitability,0,"suit_extraction")
+  assert cube.valid[0].tolist() == [[False,True],[True,True]]
+  columns = cube.getColumns(0)
+  assert columns["midden"].tolist() == [300,150,0]
+  # Voxels without a joined suitability keep 0.
+  assert columns["suit_extraction"].tolist() == [0,0,0.5]
+
+#---------------------------------------------------------------------------------------------------
+# Only the arrays of the given value names are allocated.
+def test_valueNames():
+  cube = VoxelCube([0,0,100,100],50,[0.0,1.0],["midden"])
+  assert list(cube.data.keys()) == ["midden"]
+  cube.mergeRasterData(createRaster(np.array([[300,150],[0,0]],dtype=np.float32),50,0,100,None),1,"midden")
+  assert cube.getColumns(1)["midden"].tolist() == [300,150,0,0]
+  coarse = cube.aggregate(2,2)
+  assert list(coarse.data.keys()) == ["midden"]
+  assert coarse.getValues("midden")[0,0,0] == 300
+  with pytest.raises(Exception):
+    VoxelCube([0,0,100,100],50,[0.0],["unknown"])
+
+#---------------------------------------------------------------------------------------------------
+# The mean suitability leaves out the voxels without a joined suitability, a block without any is
+# no data.
+def test_aggregateSuitMean():
+  cube = VoxelCube([0,0,200,100],50,[0.0])
+  cube.mergeRasterData(createRaster(np.zeros((2,4),dtype=np.float32),50,0,100,None),0,"midden")
+  suitability = np.array([[0.2,np.nan,np.nan,np.nan],[0.6,np.nan,np.nan,np.nan]],dtype=np.float32)
+  cube.joinRasterData(createRaster(suitability,50,0,100,None),0,"suit_extraction")
+  coarse = cube.aggregate(2,1)
+  assert coarse.valid[0].tolist() == [[True,True]]
+  values = coarse.getValues("suit_extraction")[0,0]
+  assert values[0] == pytest.approx(0.4)
+  assert np.isnan(values[1])
+  assert coarse.getColumns(0)["suit_extraction"].tolist() == [pytest.approx(0.4),0]
+
+#---------------------------------------------------------------------------------------------------
+# A 100m raster on the 50m cube, shifted one cube cell to the right and down: every cube cell gets
+# the value of its parent raster cell, the cells outside the raster are not joined.
+def test_calcWindowCoarser():
+  cube = VoxelCube([0,0,200,200],50,[0.0])
+  raster = createRaster(np.array([[1,2],[3,4]],dtype=np.float32),100,50,150,None)
+  rows,cols,rasterRows,rasterCols = cube.calcWindow(raster)
+  assert (rows,cols) == (slice(1,4),slice(1,4))
+  assert raster.raster[rasterRows,rasterCols].tolist() == [[1,1,2],[1,1,2],[3,3,4]]
+  # Not aligned with the 50m grid, and not a multiple of the cell size.
+  with pytest.raises(Exception):
+    cube.calcWindow(createRaster(np.zeros((2,2),dtype=np.float32),100,25,150,None))
+  with pytest.raises(Exception):
+    cube.calcWindow(createRaster(np.zeros((2,2),dtype=np.float32),75,0,150,None))
+  assert cube.calcWindow(createRaster(np.zeros((2,2),dtype=np.float32),100,400,200,None)) is None
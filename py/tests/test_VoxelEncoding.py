@@ -0,0 +1,79 @@
+#---------------------------------------------------------------------------------------------------
+# Checks of the chloride and suit_extraction encodings (VoxelEncoding.py).
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import numpy as np
+import pytest
+
+from VoxelEncoding import ChlorideEncoding,SuitEncoding,chlorideClasses
+
+#---------------------------------------------------------------------------------------------------
+def test_chlorideRoundTrip():
+  encoding = ChlorideEncoding()
+  values = np.array(chlorideClasses + [15000,0,150],dtype=np.float32)
+  codes = encoding.encode(values)
+  assert codes.dtype == np.uint8
+  assert np.array_equal(encoding.decode(codes),values)
+  # The classes keep their codes.
+  assert codes[:len(chlorideClasses)].tolist() == list(range(len(chlorideClasses)))
+
+#---------------------------------------------------------------------------------------------------
+def test_chlorideOtherValues():
+  encoding = ChlorideEncoding()
+  values = np.array([0,123.5,150,99999,123.5],dtype=np.float32)
+  codes = encoding.encode(values)
+  assert np.array_equal(encoding.decode(codes),values)
+  assert len(encoding.table) == len(chlorideClasses) + 2
+
+#---------------------------------------------------------------------------------------------------
+def test_chlorideNoData():
+  encoding = ChlorideEncoding()
+  values = encoding.decode(np.array([0,ChlorideEncoding.noDataCode],dtype=np.uint8))
+  assert values[0] == 0
+  assert np.isnan(values[1])
+  with pytest.raises(Exception):
+    encoding.encode(np.array([np.nan]))
+
+#---------------------------------------------------------------------------------------------------
+def test_chlorideRecode():
+  # A worker encoding with other added values than the cube.
+  cube = ChlorideEncoding()
+  cube.encode(np.array([11.0]))
+  worker = ChlorideEncoding()
+  values = np.array([22.0,11.0,150.0],dtype=np.float32)
+  codes = np.append(worker.encode(values),ChlorideEncoding.noDataCode).astype(np.uint8)
+  recoded = cube.recode(codes,worker.toDict())
+  assert np.array_equal(cube.decode(recoded)[:3],values)
+  assert recoded[3] == ChlorideEncoding.noDataCode
+  # Same table: unchanged.
+  assert cube.recode(recoded,cube.toDict()) is recoded
+
+#---------------------------------------------------------------------------------------------------
+def test_suitRoundTrip():
+  encoding = SuitEncoding()
+  values = np.array([0,0.001,0.5,0.771,1.0],dtype=np.float32)
+  codes = encoding.encode(values)
+  assert codes.dtype == np.uint16
+  assert codes.tolist() == [0,1,500,771,1000]
+  assert np.allclose(encoding.decode(codes),values,atol=0.0005)
+  assert np.isnan(encoding.decode(np.array([SuitEncoding.noDataCode],dtype=np.uint16))[0])
+
+#---------------------------------------------------------------------------------------------------
+def test_suitInvalid():
+  encoding = SuitEncoding()
+  for value in [-0.1,np.nan,70.0]:
+    with pytest.raises(Exception):
+      encoding.encode(np.array([value]))
+
+#---------------------------------------------------------------------------------------------------
+def test_suitRecode():
+  encoding = SuitEncoding(1000)
+  codes = np.array([5,10,SuitEncoding.noDataCode],dtype=np.uint16)
+  recoded = encoding.recode(codes,SuitEncoding(10).toDict())
+  assert recoded.tolist() == [500,1000,SuitEncoding.noDataCode]
+  assert encoding.recode(codes,encoding.toDict()) is codes
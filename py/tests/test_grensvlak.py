@@ -0,0 +1,47 @@
+#---------------------------------------------------------------------------------------------------
+# Checks of the interface depths (grensvlak.py).
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo")
+
+from grensvlak import calcInterfaceDepths,belowDataValue,noDataValue
+
+# Three z-levels (low to high) and three cells: increasing with depth, no data and a fresh lens
+# below salt water.
+zValues = [-3.0,-2.0,-1.0]
+values = np.array([[5000,0,5000],[1000,0,100],[100,0,2000]],dtype=np.float32).reshape(3,1,3)
+valid = np.array([[True,False,True],[True,False,True],[True,False,True]]).reshape(3,1,3)
+
+#---------------------------------------------------------------------------------------------------
+def test_depthsFromTop():
+  depths = calcInterfaceDepths(values,valid,zValues,[150,1000,10000])
+  # The top is the top of the highest voxel (-0.5), the interface the top of the first voxel
+  # from the top with a value >= threshold.
+  assert depths[:,0,0].tolist() == [1.0,1.0,belowDataValue]
+  assert depths[:,0,1].tolist() == [noDataValue] * 3
+  assert depths[:,0,2].tolist() == [0.0,0.0,belowDataValue]
+
+#---------------------------------------------------------------------------------------------------
+def test_depthsFromSurface():
+  surface = np.array([[0.5,0.5,np.nan]])
+  depths = calcInterfaceDepths(values,valid,zValues,[150,3000],surface)
+  assert depths[:,0,0].tolist() == [2.0,3.0]
+  assert depths[:,0,1].tolist() == [noDataValue] * 2
+  assert depths[:,0,2].tolist() == [noDataValue] * 2
+
+#---------------------------------------------------------------------------------------------------
+def test_depthsInvalidVoxels():
+  # A voxel without data is skipped, also if its value is above the threshold.
+  masked = valid.copy()
+  masked[2,0,0] = False
+  depths = calcInterfaceDepths(np.where(masked,values,20000),masked,zValues,[150])
+  # The top is now -1.5, the interface is the top of z-level -2 (-1.5).
+  assert depths[0,0,0] == 0.0
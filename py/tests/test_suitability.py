@@ -0,0 +1,55 @@
+#---------------------------------------------------------------------------------------------------
+# Checks of the lookups and the sampling of the factors (suitability.py).
+#
+# European Union Public Licence V. 1.2
+# EUPL © the European Union 2007, 2016
+#
+# Modified: 2024, Eddy Scheper, OpenGeoGroep/ARIS BV
+#---------------------------------------------------------------------------------------------------
+
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo")
+
+import RasterUtils as RU
+from suitability import applyLookup,sampleRaster
+
+#---------------------------------------------------------------------------------------------------
+def test_lookupBreaks():
+  lookup = {"breaks": [0,300,1000],"factors": [1.0,0.5,0.0]}
+  values = np.array([-5,0,299,300,999,1000,20000,np.nan])
+  result = applyLookup(values,lookup)
+  assert result[:7].tolist() == [1.0,1.0,1.0,0.5,0.5,0.0,0.0]
+  assert np.isnan(result[7])
+
+#---------------------------------------------------------------------------------------------------
+def test_lookupClasses():
+  lookup = {"classes": {"1": 0.2,"5": 1.0,"3": 0.6}}
+  result = applyLookup(np.array([1,3,5,2,np.nan]),lookup)
+  assert result[:3].tolist() == [0.2,0.6,1.0]
+  assert np.isnan(result[3:]).all()
+
+#---------------------------------------------------------------------------------------------------
+def test_lookupValuesAndNone():
+  values = np.array([0.1,0.9])
+  assert applyLookup(values,"values") is values
+  with pytest.raises(Exception):
+    applyLookup(values,None)
+
+#---------------------------------------------------------------------------------------------------
+# A 50m raster (2x4 cells) on a 100m grid (1x2 cells), the second 100m cell has no data.
+@pytest.mark.parametrize("method,expected",[("nearest",0),("max",1000),("mode",0),("mean",325)])
+def test_sampleFiner(method,expected):
+  values = np.array([[0,300,-9999,-9999],[1000,0,-9999,-9999]],dtype=np.float32)
+  raster = RU.Raster(values,50.0,4,2,[0,0,200,100],np.float32,-9999.0)
+  result = sampleRaster(raster,[0,0,200,100],100.0,1,2,method)
+  assert result[0,0] == expected
+  assert np.isnan(result[0,1])
+
+#---------------------------------------------------------------------------------------------------
+# A 100m raster on a 50m grid: every cell gets the value of the raster cell which contains it.
+def test_sampleCoarser():
+  raster = RU.Raster(np.array([[1,2]],dtype=np.float32),100.0,2,1,[0,0,200,100],np.float32,None)
+  result = sampleRaster(raster,[50,0,250,100],50.0,2,4,"max")
+  assert np.array_equal(result[0],[1,2,2,np.nan],equal_nan=True)